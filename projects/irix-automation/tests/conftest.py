@@ -1,7 +1,15 @@
 import sys
 from pathlib import Path
 
+import pytest
+
 PROJECT_DIR = Path(__file__).resolve().parents[1]
 TOOLS_DIR = PROJECT_DIR / "tools"
 if str(TOOLS_DIR) not in sys.path:
     sys.path.insert(0, str(TOOLS_DIR))
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_home(tmp_path, monkeypatch):
+    """Keep the compiled config cache out of the real ``~/.cache``."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache-home"))
@@ -0,0 +1,163 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from irix_build import agent, build, config, ssh
+
+
+@pytest.fixture()
+def fake_ssh(tmp_path: Path, monkeypatch):
+    """An ``ssh`` on PATH that runs its remote command with the local ``sh`` in a fake home."""
+    home = tmp_path / "remote"
+    home.mkdir()
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log = tmp_path / "ssh.log"
+    script = bin_dir / "ssh"
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo call >> '{log}'\n"
+        'for arg; do last="$arg"; done\n'
+        f"cd '{home}' && HOME='{home}' exec sh -c \"$last\"\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    return home, log
+
+
+def _calls(log: Path) -> int:
+    return len(log.read_text().splitlines()) if log.exists() else 0
+
+
+def test_agent_answers_pipelined_requests_in_order(fake_ssh):
+    home, log = fake_ssh
+    (home / "data.txt").write_text("12345")
+
+    async def scenario():
+        remote = agent.RemoteAgent("irix")
+        try:
+            results = await asyncio.gather(
+                *(
+                    remote.run(f"printf 'out {index}'; echo err {index} >&2", on_line=None)
+                    for index in range(5)
+                )
+            )
+            sizes = await remote.stat(["data.txt", "missing.txt"])
+        finally:
+            await remote.close()
+        return results, sizes
+
+    results, sizes = asyncio.run(scenario())
+
+    assert [result.stdout for result in results] == [f"out {index}" for index in range(5)]
+    assert [result.stderr for result in results] == [f"err {index}\n" for index in range(5)]
+    assert sizes == [5, None]
+    assert _calls(log) == 1
+
+
+def test_agent_failure_raises_and_agent_survives(fake_ssh):
+    lines = []
+
+    async def scenario():
+        remote = agent.RemoteAgent("irix")
+        try:
+            with pytest.raises(ssh.RemoteCommandError) as excinfo:
+                await remote.run(
+                    "echo 'x.c:1: error' >&2; exit 2",
+                    on_line=lambda stream, line: lines.append((stream, line)),
+                )
+            after = await remote.run("echo still here", on_line=None)
+        finally:
+            await remote.close()
+        return excinfo.value, after
+
+    error, after = asyncio.run(scenario())
+
+    assert error.returncode == 2
+    assert error.stderr == "x.c:1: error\n"
+    assert lines == [("stderr", "x.c:1: error\n")]
+    assert after.stdout == "still here\n"
+
+
+def test_agent_start_failure_is_reported(tmp_path: Path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "ssh"
+    script.write_text("#!/bin/sh\necho 'Connection refused' >&2\nexit 255\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+
+    with pytest.raises(agent.AgentError) as excinfo:
+        asyncio.run(agent.RemoteAgent("irix").run("true"))
+
+    assert excinfo.value.returncode == 255
+    assert "Connection refused" in excinfo.value.stderr
+
+
+def test_agent_script_goes_to_sh_on_stdin():
+    command = agent.RemoteAgent("irix").command
+
+    # tcsh cannot take the multi-line loop as a quoted argument.
+    assert command[-2:] == ["irix", "/bin/sh -s"]
+    assert agent.AGENT_SCRIPT.startswith("{") and agent.AGENT_SCRIPT.rstrip().endswith("}")
+
+
+def test_agent_rejects_other_protocol_version(tmp_path: Path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "ssh"
+    script.write_text(
+        "#!/bin/sh\necho 'irix-agent ready 99'\ncat > /dev/null\necho 'old agent' >&2\n"
+    )
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+
+    with pytest.raises(agent.AgentError) as excinfo:
+        asyncio.run(agent.RemoteAgent("irix").run("true"))
+
+    assert excinfo.value.stdout == "irix-agent ready 99\n"
+    assert "old agent" in excinfo.value.stderr
+
+
+def test_compiles_share_one_agent_per_job_slot(fake_ssh, tmp_path: Path):
+    home, log = fake_ssh
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    units = [f"u{index}.c" for index in range(6)]
+    for unit in units:
+        (local_dir / unit).write_text("int x;\n")
+    cfg = config.BuildConfig(
+        local_source_dir=local_dir,
+        remote_source_dir=str(home / "src"),
+        remote_obj_dir=str(home / "obj"),
+        jobs=2,
+        remote_agent=True,
+        connection_persist=0,
+    )
+    (home / "src").mkdir()
+    (home / "obj").mkdir()
+    for unit in units:
+        (home / "src" / unit).write_text("int x;\n")
+    cc = tmp_path / "bin" / "fake-cc"
+    cc.write_text(
+        "#!/bin/sh\n"
+        'for arg; do case "$previous" in -c) src="$arg" ;; -o) out="$arg" ;; esac; '
+        'previous="$arg"; done\n'
+        'cp "$src" "$out"\n'
+    )
+    cc.chmod(0o755)
+    cfg.compiler = str(cc)
+    objects = {}
+
+    asyncio.run(
+        build.compile_units(
+            cfg, units, {unit: f"k{unit}" for unit in units}, objects, host="irix"
+        )
+    )
+
+    assert objects == {unit: f"k{unit}" for unit in units}
+    assert sorted(path.name for path in (home / "obj").iterdir()) == [
+        f"u{index}.o" for index in range(6)
+    ]
+    assert _calls(log) == 2
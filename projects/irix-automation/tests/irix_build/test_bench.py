@@ -0,0 +1,23 @@
+from irix_build import bench
+
+
+def test_generate_tree_includes_every_header(tmp_path):
+    units = bench.generate_tree(tmp_path, 20)
+
+    assert len(units) == 5
+    included = "".join((tmp_path / unit).read_text() for unit in units)
+    assert all(f'"{path.name}"' in included for path in tmp_path.glob("*.h"))
+
+
+def test_scenario_smoke():
+    results = {
+        result.phase: result for result in bench.run_scenario(12, "tar", bench.LinkModel())
+    }
+
+    assert not any(result.error for result in results.values())
+    assert results["sync.cold"].bytes_up > 0
+    assert results["sync.cold"].handshakes == 1
+    assert results["sync.noop"].round_trips == 0
+    assert results["build.cold"].round_trips == 4
+    assert results["build.noop"].round_trips == 0
+    assert results["build.header"].round_trips >= 2
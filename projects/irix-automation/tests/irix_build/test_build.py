@@ -1,21 +1,142 @@
-from unittest import mock
+from pathlib import Path
 
-from irix_build import build, config
+import pytest
 
+from irix_build import build, config, ssh
 
-def test_build_target_constructs_remote_command(monkeypatch):
-    cfg = config.BuildConfig()
-    executed = {}
 
+@pytest.fixture()
+def cfg(tmp_path: Path) -> config.BuildConfig:
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    (local_dir / "hello.c").write_text('#include "demo.h"\nint main() {return 0;}\n')
+    (local_dir / "util.c").write_text("int util(void) {return 1;}\n")
+    (local_dir / "demo.h").write_text("#define DEMO 1\n")
+    return config.BuildConfig(local_source_dir=local_dir, cache_max_mb=0)
+
+
+def _patch_remote(monkeypatch, record, fail_on=None):
     def fake_run_remote(host, remote_command, **kwargs):
-        executed["host"] = host
-        executed["remote_command"] = remote_command
-        executed["kwargs"] = kwargs
+        record(host, remote_command, kwargs)
+        if fail_on and fail_on in remote_command:
+            raise ssh.RemoteCommandError(["ssh"], 1, "", "")
+
+    async def fake_run_remote_async(host, remote_command, **kwargs):
+        fake_run_remote(host, remote_command, **kwargs)
+        return ssh.CommandResult(["ssh"], 0, "", "")
 
     monkeypatch.setattr(build, "run_remote", fake_run_remote)
+    monkeypatch.setattr(build, "run_remote_async", fake_run_remote_async)
+
+
+@pytest.fixture()
+def executed(monkeypatch):
+    commands = []
+    _patch_remote(monkeypatch, lambda host, command, kwargs: commands.append(command))
+    return commands
+
+
+def test_build_target_constructs_remote_command(monkeypatch):
+    cfg = config.BuildConfig()
+    executed = []
+
+    def record(host, remote_command, kwargs):
+        executed.append({"host": host, "remote_command": remote_command, "kwargs": kwargs})
+
+    _patch_remote(monkeypatch, record)
+
+    build.build_target(cfg, ["hello.c"], "hello", dry_run=True)
+
+    compile_call, link_call = executed
+    assert compile_call["host"] == cfg.remote_host
+    assert "-c hello.c -o ~/src/irix_demo/obj/hello.o" in compile_call["remote_command"]
+    assert compile_call["kwargs"]["dry_run"] is True
+    assert link_call["remote_command"].endswith(
+        "cc -o ~/src/irix_demo/bin/hello ~/src/irix_demo/obj/hello.o"
+    )
+
+
+def test_build_target_skips_unchanged_units(cfg: config.BuildConfig, executed):
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+    assert len(executed) == 3
+
+    executed.clear()
+    (cfg.local_source_dir / "util.c").write_text("int util(void) {return 2;}\n")
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+
+    assert len(executed) == 2
+    assert "-c util.c" in executed[0]
+    assert "cc -o" in executed[1]
+
+    executed.clear()
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+    assert executed == []
 
+
+def test_header_change_rebuilds_units(cfg: config.BuildConfig, executed):
+    build.build_target(cfg, ["hello.c"], "hello")
+    executed.clear()
+
+    (cfg.local_source_dir / "demo.h").write_text("#define DEMO 2\n")
+    build.build_target(cfg, ["hello.c"], "hello")
+
+    assert "-c hello.c" in executed[0]
+
+
+def test_unrelated_header_change_keeps_objects(cfg: config.BuildConfig, executed):
+    (cfg.local_source_dir / "other.h").write_text("#define OTHER 1\n")
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+    executed.clear()
+
+    (cfg.local_source_dir / "other.h").write_text("#define OTHER 2\n")
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+
+    assert executed == []
+
+
+def test_failed_unit_is_retried_and_blocks_link(cfg: config.BuildConfig, monkeypatch):
+    commands = []
+    record = lambda host, command, kwargs: commands.append(command)  # noqa: E731
+
+    _patch_remote(monkeypatch, record, fail_on="-c util.c")
+    with pytest.raises(ssh.RemoteCommandError):
+        build.build_target(cfg, ["hello.c", "util.c"], "hello")
+    assert not any("cc -o" in command for command in commands)
+
+    commands.clear()
+    _patch_remote(monkeypatch, record)
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+
+    assert len(commands) == 2
+    assert "-c util.c" in commands[0]
+
+
+def test_dry_run_does_not_record_objects(cfg: config.BuildConfig, executed):
     build.build_target(cfg, ["hello.c"], "hello", dry_run=True)
+    build.build_target(cfg, ["hello.c"], "hello", dry_run=True)
+
+    assert len(executed) == 4
+
+
+def test_pool_objects_are_gathered_for_link(cfg: config.BuildConfig, monkeypatch):
+    cfg.hosts = ["o2"]
+    compiled = []
+    relayed = []
+    _patch_remote(monkeypatch, lambda host, command, kwargs: compiled.append((host, command)))
+
+    async def fake_relay(source, sink, **kwargs):
+        relayed.append((source, sink))
+
+    monkeypatch.setattr(build, "relay_async", fake_relay)
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+
+    hosts = {host for host, command in compiled if " -c " in command}
+    assert hosts == {"mario@octane", "mario@o2"}
+    assert len(relayed) == 1
+    assert "mario@o2" in relayed[0][0] and "tar cf -" in relayed[0][0][-1]
+    assert "mario@octane" in relayed[0][1] and "tar xf -" in relayed[0][1][-1]
+    assert "cc -o" in compiled[-1][1]
 
-    assert executed["host"] == cfg.remote_host
-    assert "hello.c" in executed["remote_command"]
-    assert executed["kwargs"]["dry_run"] is True
+    compiled.clear()
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+    assert compiled == []
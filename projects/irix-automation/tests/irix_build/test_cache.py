@@ -0,0 +1,142 @@
+import re
+import shlex
+from pathlib import Path
+
+import pytest
+
+from irix_build import build, cache, config, ssh
+
+LISTING = """total 24
+-rw-r--r--    1 mario    user        4096 Oct  3 10:12 newest
+-rw-r--r--    1 mario    user        8192 Oct  3 10:11 middle
+-rw-r--r--    1 mario    user        4096 Oct  2 09:00 oldest
+"""
+
+
+class FakeCacheHost:
+    """Just enough of the remote shell to model the cache directory."""
+
+    def __init__(self):
+        self.entries = set()
+        self.commands = []
+
+    def capture(self, host, command, **kwargs):
+        self.commands.append(command)
+        if command.startswith("/bin/sh -c "):
+            command = shlex.split(command)[2]
+        if "-version" in command:
+            return "MIPSpro Compilers: Version 7.4.4m\n"
+        if command.startswith("if [ -f"):
+            wanted = re.findall(r"echo ([0-9a-f]{64})", command)
+            return "".join(f"{key}\n" for key in wanted if key in self.entries)
+        self.entries.update(re.findall(r"mv \S+ \S+/([0-9a-f]{64})", command))
+        return "total 0\n"
+
+
+@pytest.fixture()
+def cfg(tmp_path: Path) -> config.BuildConfig:
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    (local_dir / "hello.c").write_text("int main() {return 0;}\n")
+    (local_dir / "util.c").write_text("int util(void) {return 1;}\n")
+    return config.BuildConfig(local_source_dir=local_dir)
+
+
+@pytest.fixture()
+def remote(monkeypatch):
+    fake = FakeCacheHost()
+    executed = []
+
+    def fake_run_remote(host, command, **kwargs):
+        executed.append(command)
+
+    async def fake_run_remote_async(host, command, **kwargs):
+        executed.append(command)
+        return ssh.CommandResult(["ssh"], 0, "", "")
+
+    monkeypatch.setattr(cache, "capture_remote", fake.capture)
+    monkeypatch.setattr(build, "run_remote", fake_run_remote)
+    monkeypatch.setattr(build, "run_remote_async", fake_run_remote_async)
+    fake.executed = executed
+    return fake
+
+
+def test_parse_listing_keeps_regular_files_newest_first():
+    entries = cache.parse_listing(LISTING + "drwxr-xr-x 2 mario user 9 Oct 1 08:00 dir\n")
+
+    assert [entry.name for entry in entries] == ["newest", "middle", "oldest"]
+    assert entries[1].size == 8192
+
+
+def test_evictions_drop_least_recently_used():
+    dropped = cache.evictions(cache.parse_listing(LISTING), 12 * 1024)
+
+    assert [entry.name for entry in dropped] == ["oldest"]
+
+
+def test_entry_key_depends_on_toolchain():
+    assert cache.entry_key("MIPSpro 7.4.4m", "abc") != cache.entry_key("MIPSpro 7.3", "abc")
+
+
+def test_bourne_shell_commands_run_under_sh(cfg, remote):
+    cache.toolchain_id(cfg)
+    cache.restore(cfg, {"0" * 64: "~/src/'hello world'"})
+
+    # The IRIX login shell is tcsh; `if [ ... ]` and `2>&1` only work under /bin/sh.
+    for command in remote.commands:
+        argv = shlex.split(command)
+        assert argv[:2] == ["/bin/sh", "-c"] and len(argv) == 3
+    assert shlex.split(remote.commands[1])[2].startswith("if [ -f ")
+
+
+def test_failed_cache_store_does_not_fail_the_build(cfg, remote, monkeypatch, capsys):
+    def capture(host, command, **kwargs):
+        if " mv " in command:
+            raise ssh.RemoteCommandError(["ssh", command], 1, "", "cp: No space left on device\n")
+        return remote.capture(host, command, **kwargs)
+
+    monkeypatch.setattr(cache, "capture_remote", capture)
+
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+
+    assert len(remote.executed) == 3
+    assert "hello" in config.load_state(cfg)["links"][cfg.remote_host]
+    err = capsys.readouterr().err
+    assert "could not update the build cache" in err
+    assert "No space left on device" in err
+
+
+def test_store_keeps_copying_after_one_failure(cfg, remote):
+    cache.store(cfg, {"a" * 64: "~/obj/a.o", "b" * 64: "~/obj/b.o"})
+
+    script = remote.commands[-1]
+    assert script.count("; ") == 2
+    assert script.endswith("&& ls -lt")
+
+
+def test_switching_back_restores_binary_without_compiling(cfg, remote):
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+    assert len(remote.executed) == 3
+    assert len(remote.entries) == 3
+
+    util = cfg.local_source_dir / "util.c"
+    util.write_text("int util(void) {return 2;}\n")
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+
+    remote.executed.clear()
+    util.write_text("int util(void) {return 1;}\n")
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+
+    assert remote.executed == []
+    state = config.load_state(cfg)
+    assert state["cache"][cfg.remote_host]["hits"] >= 2
+
+
+def test_cached_objects_skip_compiles_but_still_link(cfg, remote):
+    build.build_target(cfg, ["hello.c", "util.c"], "hello")
+    remote.executed.clear()
+
+    build.build_target(cfg, ["hello.c", "util.c"], "other")
+
+    assert len(remote.executed) == 1
+    assert "cc -o" in remote.executed[0]
@@ -1,3 +1,6 @@
+import subprocess
+import sys
+from pathlib import Path
 from unittest import mock
 
 import pytest
@@ -48,5 +51,47 @@ def test_cli_all_runs_both(monkeypatch, sample_config):
     monkeypatch.setattr(cli, "handle_sync", lambda *args, **kwargs: sequence.append("sync"))
     monkeypatch.setattr(cli, "handle_build", lambda *args, **kwargs: sequence.append("build"))
 
-    cli.main(["--config", str(sample_config), "all"])
+    cli.main(["--config", str(sample_config), "--dry-run", "all"])
     assert sequence == ["sync", "build"]
+
+
+def test_cli_all_pipelines_real_runs(monkeypatch, sample_config):
+    from irix_build import pipeline
+
+    calls = []
+    monkeypatch.setattr(cli, "load_config", lambda path: config.load_config(sample_config))
+    monkeypatch.setattr(
+        pipeline, "run_all", lambda cfg, sources, target, **kwargs: calls.append((sources, target))
+    )
+
+    cli.main(["--config", str(sample_config), "all", "--target", "demo"])
+    assert calls == [(["alpha.c"], "demo")]
+
+
+def test_cli_disconnect_closes_every_build_host(tmp_path, capsys):
+    cfg_path = tmp_path / "config.yml"
+    cfg_path.write_text(
+        "local_source_dir: {local}\nuser: mario\nhost: octane\nhosts:\n  - fuel\n".format(
+            local=str(tmp_path)
+        ),
+        encoding="utf-8",
+    )
+
+    cli.main(["--config", str(cfg_path), "--dry-run", "disconnect"])
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split()[-1] for line in lines] == ["mario@octane", "mario@fuel"]
+    assert all("-O exit" in line for line in lines)
+
+
+def test_cli_import_stays_light():
+    tools_dir = Path(cli.__file__).resolve().parents[1]
+    probe = (
+        "import sys, irix_build.cli; "
+        "print(sorted(m for m in ('yaml', 'asyncio', 'sqlite3', 'ctypes') if m in sys.modules))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", probe], cwd=tools_dir, capture_output=True, text=True, check=True
+    ).stdout
+
+    assert output.strip() == "[]"
@@ -1,5 +1,9 @@
+import os
+import sys
 from pathlib import Path
 
+import pytest
+
 from irix_build import config
 
 
@@ -24,3 +28,64 @@ def test_discover_sources(tmp_path: Path):
 
     discovered = config._discover_sources(tmp_path)
     assert discovered == ["bar.c", "foo.c"]
+
+
+def test_load_config_serves_repeat_loads_from_cache(tmp_path: Path, monkeypatch):
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    (local_dir / "a.c").write_text("int a;", encoding="utf-8")
+    cfg_path = tmp_path / "config.yml"
+    cfg_path.write_text(f"host: demo\nlocal_source_dir: {local_dir}\n", encoding="utf-8")
+    first = config.load_config(cfg_path)
+
+    # With a warm cache neither PyYAML nor a directory scan is needed.
+    monkeypatch.setitem(sys.modules, "yaml", None)
+    monkeypatch.setattr(config, "_discover_sources", lambda local: pytest.fail("rescanned"))
+    second = config.load_config(cfg_path)
+
+    assert config.config_cache_file(cfg_path).exists()
+    assert second == first
+    assert second.default_sources == ["a.c"]
+
+
+def test_config_cache_follows_edits_and_new_sources(tmp_path: Path):
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    (local_dir / "a.c").write_text("int a;", encoding="utf-8")
+    cfg_path = tmp_path / "config.yml"
+    cfg_path.write_text(f"host: demo\nlocal_source_dir: {local_dir}\n", encoding="utf-8")
+    config.load_config(cfg_path)
+
+    cfg_path.write_text(f"host: other\nlocal_source_dir: {local_dir}\n", encoding="utf-8")
+    (local_dir / "b.c").write_text("int b;", encoding="utf-8")
+    # Make sure both stamps move even on filesystems with coarse timestamps.
+    os.utime(cfg_path, ns=(0, 10**9))
+    os.utime(local_dir, ns=(0, 10**9))
+    reloaded = config.load_config(cfg_path)
+
+    assert reloaded.host == "other"
+    assert reloaded.default_sources == ["a.c", "b.c"]
+
+
+def test_retained_state_is_reused_until_the_store_changes(tmp_path: Path):
+    from irix_build import state as state_store
+
+    cfg = config.BuildConfig(local_source_dir=tmp_path)
+    config.retain_state()
+    try:
+        state = config.load_state(cfg)
+        state.setdefault("digests", {})["a.c"] = {"digest": "1"}
+        config.save_state(cfg, state)
+        assert config.load_state(cfg) is state
+
+        # Another process writes the store; the retained copy must not be served any more.
+        other = state_store.load(cfg.state_file, config.STATE_VERSION)
+        other["digests"]["b.c"] = {"digest": "2"}
+        state_store.save(cfg.state_file, other, config.STATE_VERSION)
+        os.utime(cfg.state_file, ns=(0, 10**9))
+
+        reloaded = config.load_state(cfg)
+        assert reloaded is not state
+        assert set(reloaded["digests"]) == {"a.c", "b.c"}
+    finally:
+        config.retain_state(False)
@@ -0,0 +1,119 @@
+import os
+import random
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from irix_build import config, delta, sync
+
+
+def _payload(size: int, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+
+def test_block_size_tracks_square_root():
+    assert delta.block_size_for(1000) == delta.MIN_BLOCK
+    assert delta.block_size_for(16 * 1024 * 1024) == 4096
+    assert delta.block_size_for(1 << 40) == delta.MAX_BLOCK
+
+
+def test_delta_handles_insertions_and_edits():
+    old = _payload(200_000)
+    new = old[:50_000] + b"inserted line\n" + old[50_000:120_000] + b"X" + old[120_001:]
+    sig = delta.signature(old, "digest")
+
+    ops = delta.compute_delta(new, sig)
+
+    assert delta.apply_delta(old, sig["block"], ops) == new
+    assert delta.literal_size(ops) < 3 * sig["block"]
+    assert delta.worthwhile(ops, len(new))
+
+
+def test_unrelated_content_is_all_literal():
+    sig = delta.signature(_payload(10_000, seed=1), "digest")
+    ops = delta.compute_delta(_payload(10_000, seed=2), sig)
+
+    assert delta.literal_size(ops) == 10_000
+    assert not delta.worthwhile(ops, 10_000)
+
+
+@pytest.fixture()
+def remote(tmp_path: Path, monkeypatch):
+    """Run streamed remote commands with the local ``sh`` against a fake home directory."""
+    home = tmp_path / "remote"
+    home.mkdir()
+    sent = []
+
+    def fake_stream_to_remote(host, command, producer, **kwargs):
+        # The IRIX login shell is tcsh, so `status=$?` only works wrapped in /bin/sh -c.
+        assert "status=" not in command or command.startswith("/bin/sh -c ")
+        reader, writer = os.pipe()
+        process = subprocess.Popen(
+            ["sh", "-c", command], cwd=home, env=dict(os.environ, HOME=str(home)), stdin=reader
+        )
+        os.close(reader)
+        with os.fdopen(writer, "wb") as stream:
+            counting = _Counting(stream)
+            producer(counting)
+        sent.append(counting.count)
+        if process.wait() != 0:
+            raise sync.RemoteCommandError(["ssh", command], process.returncode, "", "")
+
+    monkeypatch.setattr(sync, "stream_to_remote", fake_stream_to_remote)
+    return home, sent
+
+
+class _Counting:
+    def __init__(self, stream):
+        self.stream = stream
+        self.count = 0
+
+    def write(self, data):
+        self.count += len(data)
+        return self.stream.write(data)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def test_delta_sync_patches_large_file_on_host(tmp_path: Path, remote):
+    remote_home, sent = remote
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    cfg = config.BuildConfig(local_source_dir=local_dir, transfer_mode="delta")
+    big = local_dir / "table.c"
+    original = _payload(300_000)
+    big.write_bytes(original)
+
+    sync.sync_files(cfg, [big])
+    updated = original[:150_000] + b"/* edit */" + original[150_000:]
+    big.write_bytes(updated)
+    sync.sync_files(cfg, sync.determine_files_to_sync(cfg, ["table.c"]))
+
+    remote_dir = remote_home / "src" / "irix_demo"
+    assert (remote_dir / "table.c").read_bytes() == updated
+    assert not (remote_dir / sync.DELTA_DIR).exists()
+    manifest = sync.parse_manifest((remote_dir / sync.MANIFEST_NAME).read_text())
+    assert manifest["table.c"] == config.load_state(cfg)["synced"][cfg.remote_host]["table.c"]
+    first, second = sent
+    assert second < first / 10
+
+
+def test_delta_rejected_by_host_falls_back_to_whole_file(tmp_path: Path, remote):
+    remote_home, _ = remote
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    cfg = config.BuildConfig(local_source_dir=local_dir, transfer_mode="delta")
+    big = local_dir / "table.c"
+    big.write_bytes(_payload(100_000))
+    sync.sync_files(cfg, [big])
+
+    remote_copy = remote_home / "src" / "irix_demo" / "table.c"
+    remote_copy.write_bytes(b"edited on the host")
+    updated = big.read_bytes() + b"tail"
+    big.write_bytes(updated)
+    sync.sync_files(cfg, [big])
+
+    assert remote_copy.read_bytes() == updated
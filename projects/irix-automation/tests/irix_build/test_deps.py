@@ -0,0 +1,57 @@
+from pathlib import Path
+
+import pytest
+
+from irix_build import config, deps
+
+
+@pytest.fixture()
+def cfg(tmp_path: Path) -> config.BuildConfig:
+    local_dir = tmp_path / "src"
+    (local_dir / "include").mkdir(parents=True)
+    (local_dir / "main.c").write_text('#include "app.h"\n#include <stdio.h>\nint main() {}\n')
+    (local_dir / "util.c").write_text('#include "include/util.h"\n')
+    (local_dir / "app.h").write_text('#include "util.h"\n')
+    (local_dir / "include" / "util.h").write_text('# include "missing.h"\n')
+    return config.BuildConfig(local_source_dir=local_dir, cflags=["-Iinclude"])
+
+
+def test_update_graph_resolves_local_includes(cfg: config.BuildConfig):
+    graph = deps.update_graph(cfg, {})
+
+    assert graph["main.c"] == ["app.h"]
+    assert graph["app.h"] == ["include/util.h"]
+    assert graph["util.c"] == ["include/util.h"]
+    assert graph["include/util.h"] == []
+
+
+def test_header_closure_and_affected_sources(cfg: config.BuildConfig):
+    graph = deps.update_graph(cfg, {})
+
+    assert deps.header_closure(graph, "main.c") == ["app.h", "include/util.h"]
+    assert deps.affected_sources(graph, ["app.h"], ["main.c", "util.c"]) == ["main.c"]
+    assert deps.affected_sources(graph, ["include/util.h"], ["main.c", "util.c"]) == [
+        "main.c",
+        "util.c",
+    ]
+    assert deps.with_headers(graph, ["util.c"]) == ["util.c", "include/util.h"]
+
+
+def test_update_graph_only_rescans_changed_files(cfg: config.BuildConfig, monkeypatch):
+    state: dict = {}
+    deps.update_graph(cfg, state)
+    scanned = []
+    real_findall = deps.INCLUDE_RE.findall
+
+    class CountingPattern:
+        def findall(self, data):
+            scanned.append(data)
+            return real_findall(data)
+
+    monkeypatch.setattr(deps, "INCLUDE_RE", CountingPattern())
+    (cfg.local_source_dir / "util.c").write_text('#include "app.h"\n')
+
+    graph = deps.update_graph(cfg, state)
+
+    assert scanned == [b'#include "app.h"\n']
+    assert graph["util.c"] == ["app.h"]
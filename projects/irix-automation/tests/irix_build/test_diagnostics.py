@@ -0,0 +1,117 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from irix_build import build, config, diagnostics, ssh
+
+MIPSPRO_OUTPUT = """\
+cc-1020 cc: ERROR File = hello.c, Line = 3
+  The identifier "x" is undefined.
+
+    return x;
+           ^
+
+cc-1552 cc: WARNING File = /usr/people/mario/src/irix_demo/include/demo.h, Line = 7
+  The variable "unused" is set but never used.
+
+      int unused = 0;
+          ^
+
+1 error detected in the compilation of "hello.c".
+"""
+
+GCC_OUTPUT = """\
+In file included from util.c:1:
+util.h:4:12: warning: 'helper' defined but not used [-Wunused-function]
+util.c: In function 'main':
+util.c:9: error: expected ';' before '}' token
+/usr/include/stdio.h:42:1: note: declared here
+"""
+
+
+@pytest.fixture()
+def cfg(tmp_path: Path) -> config.BuildConfig:
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    (local_dir / "hello.c").write_text("int main() {return 0;}\n")
+    (local_dir / "util.c").write_text("int util(void) {return 1;}\n")
+    return config.BuildConfig(local_source_dir=local_dir, cache_max_mb=0)
+
+
+def test_mipspro_blocks_become_diagnostics(cfg: config.BuildConfig):
+    found = diagnostics.parse(cfg, MIPSPRO_OUTPUT.splitlines(keepends=True))
+
+    error, warning = found
+    assert error == diagnostics.Diagnostic(
+        file=str(cfg.local_source_dir / "hello.c"),
+        line=3,
+        severity="error",
+        message='The identifier "x" is undefined.',
+        column=8,
+        code="cc-1020",
+    )
+    assert warning.file == str(cfg.local_source_dir / "include/demo.h")
+    assert (warning.line, warning.column, warning.severity) == (7, 7, "warning")
+
+
+def test_gcc_lines_become_diagnostics(cfg: config.BuildConfig):
+    found = diagnostics.parse(cfg, GCC_OUTPUT.splitlines(keepends=True))
+
+    assert [(Path(item.file).name, item.line, item.column, item.severity) for item in found] == [
+        ("util.h", 4, 12, "warning"),
+        ("util.c", 9, None, "error"),
+        ("stdio.h", 42, 1, "note"),
+    ]
+    assert found[2].file == "/usr/include/stdio.h"
+    assert found[0].format().endswith(
+        "util.h:4:12: warning: 'helper' defined but not used [-Wunused-function]"
+    )
+
+
+def _fake_compiler(monkeypatch, outputs, compiled):
+    async def fake_run_remote_async(host, remote_command, *, on_line=None, **kwargs):
+        unit = next(name for name in outputs if f"-c {name}" in remote_command)
+        compiled.append(unit)
+        for line in outputs[unit].splitlines(keepends=True):
+            on_line("stderr", line)
+        if "ERROR" in outputs[unit]:
+            raise ssh.RemoteCommandError(["ssh"], 2, "", outputs[unit])
+        return ssh.CommandResult(["ssh"], 0, "", outputs[unit])
+
+    monkeypatch.setattr(build, "run_remote_async", fake_run_remote_async)
+    monkeypatch.setattr(build, "run_remote", lambda *args, **kwargs: None)
+
+
+def test_unchanged_units_replay_cached_warnings(cfg, monkeypatch, tmp_path, capsys):
+    warning = "cc-1552 cc: WARNING File = util.c, Line = 1\n  Unused.\n\n"
+    compiled = []
+    _fake_compiler(monkeypatch, {"hello.c": "", "util.c": warning}, compiled)
+    report = tmp_path / "diagnostics.json"
+
+    build.build_target(cfg, ["hello.c", "util.c"], "hello", diagnostics_file=report)
+    capsys.readouterr()
+    (cfg.local_source_dir / "hello.c").write_text("int main() {return 1;}\n")
+    build.build_target(cfg, ["hello.c", "util.c"], "hello", diagnostics_file=report)
+
+    assert compiled == ["hello.c", "util.c", "hello.c"]
+    assert "[util.c] " in capsys.readouterr().err
+    entries = json.loads(report.read_text())
+    assert [(entry["unit"], entry["replayed"], entry["severity"]) for entry in entries] == [
+        ("util.c", True, "warning")
+    ]
+
+
+def test_failed_unit_diagnostics_are_reported(cfg, monkeypatch, tmp_path):
+    compiled = []
+    _fake_compiler(monkeypatch, {"hello.c": MIPSPRO_OUTPUT, "util.c": ""}, compiled)
+    report = tmp_path / "diagnostics.json"
+
+    with pytest.raises(ssh.RemoteCommandError):
+        build.build_target(cfg, ["hello.c", "util.c"], "hello", diagnostics_file=report)
+
+    entries = json.loads(report.read_text())
+    assert [(entry["unit"], entry["severity"], entry["replayed"]) for entry in entries] == [
+        ("hello.c", "error", False),
+        ("hello.c", "warning", False),
+    ]
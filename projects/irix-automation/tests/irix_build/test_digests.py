@@ -0,0 +1,39 @@
+import hashlib
+
+from irix_build import digests
+
+
+def test_scan_tree_finds_nested_sources(tmp_path):
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "main.c").write_text("int main() {return 0;}\n")
+    (tmp_path / "lib" / "util.h").write_text("#define UTIL 1\n")
+    (tmp_path / "notes.txt").write_text("ignored\n")
+
+    found = digests.scan_tree(tmp_path, (".c", ".h"))
+
+    assert sorted(found) == ["lib/util.h", "main.c"]
+    assert found["main.c"].st_size == len("int main() {return 0;}\n")
+
+
+def test_stat_files_skips_missing(tmp_path):
+    (tmp_path / "a.c").write_text("a")
+
+    assert list(digests.stat_files(tmp_path, ["a.c", "missing.c", "gone/b.c"])) == ["a.c"]
+
+
+def test_digest_files_hashes_misses_in_parallel_and_caches(tmp_path):
+    for index in range(5):
+        (tmp_path / f"f{index}.c").write_text(f"int f{index};\n")
+    stats = digests.stat_files(tmp_path, [f"f{index}.c" for index in range(5)])
+    cache: dict = {}
+
+    result = digests.digest_files(tmp_path, stats, cache, workers=4)
+
+    assert result["f3.c"] == hashlib.sha256(b"int f3;\n").hexdigest()
+    assert set(cache) == set(result)
+
+    (tmp_path / "f0.c").unlink()
+    del stats["f0.c"]
+    assert digests.digest_files(tmp_path, stats, cache, workers=4) == {
+        name: digest for name, digest in result.items() if name != "f0.c"
+    }
@@ -0,0 +1,32 @@
+from irix_build import farm
+
+
+def test_schedule_balances_equal_hosts():
+    weights = {"a.c": 4.0, "b.c": 3.0, "c.c": 2.0, "d.c": 1.0}
+    plan = farm.schedule(weights, weights, ["octane", "o2"], {})
+
+    assert plan == {"octane": ["a.c", "d.c"], "o2": ["b.c", "c.c"]}
+
+
+def test_schedule_favours_faster_host():
+    weights = {f"u{i}.c": 1.0 for i in range(6)}
+    stats = {"octane": {"seconds_per_kib": 0.1}, "indy": {"seconds_per_kib": 0.5}}
+    plan = farm.schedule(weights, weights, ["octane", "indy"], stats)
+
+    assert len(plan["octane"]) == 5
+    assert len(plan["indy"]) == 1
+
+
+def test_unmeasured_host_uses_median_rate():
+    stats = {"octane": {"seconds_per_kib": 0.2}, "o2": {"seconds_per_kib": 0.4}}
+    assert abs(farm.seconds_per_kib(stats, "indy") - 0.3) < 1e-9
+    assert farm.seconds_per_kib({}, "indy") == farm.DEFAULT_SECONDS_PER_KIB
+
+
+def test_record_compile_smooths_rate():
+    stats: dict = {}
+    farm.record_compile(stats, "octane", 2.0, 2.0)
+    farm.record_compile(stats, "octane", 1.0, 2.0)
+
+    assert abs(stats["octane"]["seconds_per_kib"] - 1.3) < 1e-9
+    assert stats["octane"]["units"] == 2
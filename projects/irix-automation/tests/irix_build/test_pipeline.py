@@ -0,0 +1,123 @@
+import asyncio
+import threading
+from pathlib import Path
+
+import pytest
+
+from irix_build import build, config, pipeline, ssh, sync
+
+
+def test_batches_double_and_send_shared_headers_once():
+    needs = {
+        "big.c": {"big.c", "common.h"},
+        "mid.c": {"mid.c", "common.h"},
+        "small.c": {"small.c"},
+        "tiny.c": set(),
+    }
+    sizes = {"big.c": 40, "common.h": 30, "mid.c": 50, "small.c": 20, "orphan.h": 5}
+
+    batches = pipeline.plan_batches(
+        ["big.c", "mid.c", "small.c", "tiny.c"], needs, sizes, first_bytes=60
+    )
+
+    assert batches == [["big.c", "common.h"], ["mid.c", "small.c", "orphan.h"]]
+
+
+def test_arrivals_release_units_as_their_files_land():
+    arrivals = pipeline.Arrivals({"a.c": {"a.c", "x.h"}, "b.c": {"b.c"}, "c.c": set()})
+    released = []
+
+    async def scenario():
+        async def wait(unit):
+            await arrivals.wait(unit)
+            released.append(unit)
+
+        tasks = [asyncio.create_task(wait(unit)) for unit in ("a.c", "b.c", "c.c")]
+        await asyncio.sleep(0)
+        await asyncio.to_thread(arrivals.landed, ["a.c", "b.c"])
+        await asyncio.sleep(0.01)
+        assert released == ["c.c", "b.c"]
+        await asyncio.to_thread(arrivals.landed, ["x.h"])
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert released == ["c.c", "b.c", "a.c"]
+
+
+def test_arrivals_fail_waiting_units():
+    arrivals = pipeline.Arrivals({"a.c": {"a.c"}})
+    error = ssh.RemoteCommandError(["scp"], 1, "", "lost")
+
+    async def scenario():
+        waiter = asyncio.create_task(arrivals.wait("a.c"))
+        await asyncio.sleep(0)
+        arrivals.failed(error)
+        with pytest.raises(ssh.RemoteCommandError):
+            await waiter
+        with pytest.raises(ssh.RemoteCommandError):
+            await arrivals.wait("a.c")
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture()
+def tree(tmp_path: Path) -> config.BuildConfig:
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    (local_dir / "big.c").write_text('#include "big.h"\n' + "int big;\n" * 20000)
+    (local_dir / "big.h").write_text("#define BIG 1\n")
+    for index in range(4):
+        (local_dir / f"u{index}.c").write_text("int u;\n" * 3000)
+    sources = ["big.c"] + [f"u{index}.c" for index in range(4)]
+    return config.BuildConfig(local_source_dir=local_dir, default_sources=sources, cache_max_mb=0)
+
+
+def test_compiles_start_before_the_sync_finishes(tree, monkeypatch):
+    first_compile = threading.Event()
+    batches = []
+    compiled = []
+
+    def fake_sync_files(cfg, files, **kwargs):
+        if batches:
+            # Later batches only go out once a unit is compiling, which a plain
+            # sync-then-build never allows.
+            assert first_compile.wait(5)
+        batches.append(sorted(path.name for path in files))
+
+    async def fake_run_remote_async(host, command, **kwargs):
+        first_compile.set()
+        compiled.append(command.split(" -c ")[1].split()[0])
+        return ssh.CommandResult(["ssh"], 0, "", "")
+
+    monkeypatch.setattr(sync, "reconcile_manifest", lambda cfg, host=None: None)
+    monkeypatch.setattr(sync, "sync_files", fake_sync_files)
+    monkeypatch.setattr(build, "run_remote_async", fake_run_remote_async)
+    monkeypatch.setattr(build, "run_remote", lambda *args, **kwargs: None)
+
+    pipeline.run_all(tree, tree.default_sources, "demo")
+
+    assert len(batches) > 1
+    assert batches[0] == ["big.c", "big.h"]
+    assert sorted(compiled) == sorted(tree.default_sources)
+
+
+def test_failed_batch_fails_waiting_units(tree, monkeypatch):
+    compiled = []
+
+    def fake_sync_files(cfg, files, **kwargs):
+        if any(path.name == "u3.c" for path in files):
+            raise ssh.RemoteCommandError(["scp"], 1, "", "disk full")
+
+    async def fake_run_remote_async(host, command, **kwargs):
+        compiled.append(command.split(" -c ")[1].split()[0])
+        return ssh.CommandResult(["ssh"], 0, "", "")
+
+    monkeypatch.setattr(sync, "reconcile_manifest", lambda cfg, host=None: None)
+    monkeypatch.setattr(sync, "sync_files", fake_sync_files)
+    monkeypatch.setattr(build, "run_remote_async", fake_run_remote_async)
+    monkeypatch.setattr(build, "run_remote", lambda *args, **kwargs: pytest.fail("linked"))
+
+    with pytest.raises(ssh.RemoteCommandError, match="scp"):
+        pipeline.run_all(tree, tree.default_sources, "demo")
+
+    assert "u3.c" not in compiled
@@ -0,0 +1,127 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+from irix_build import cli, config, server
+
+
+@pytest.fixture()
+def running(tmp_path: Path):
+    """Serve on a socket under ``tmp_path`` with a runner the test can swap out."""
+    socket_path = tmp_path / "s.sock"
+    calls = []
+    runner = {"fn": lambda argv: 0}
+    started = threading.Event()
+    handle = {}
+
+    def ready(listening):
+        handle["server"] = listening
+        started.set()
+
+    def run(argv):
+        calls.append(argv)
+        return runner["fn"](argv)
+
+    thread = threading.Thread(
+        target=server.serve, args=(socket_path, run), kwargs={"ready": ready}
+    )
+    thread.start()
+    assert started.wait(5)
+    yield socket_path, calls, runner
+    handle["server"].shutdown()
+    thread.join(5)
+    assert not socket_path.exists()
+
+
+def test_forward_relays_output_and_exit_code(running, tmp_path: Path, monkeypatch, capsys):
+    socket_path, calls, runner = running
+    seen = {}
+
+    def fake(argv):
+        seen["cwd"] = Path.cwd()
+        print("compiling")
+        print("warning: x", file=sys.stderr)
+        return 3
+
+    runner["fn"] = fake
+    monkeypatch.chdir(tmp_path)
+
+    code = server.forward(socket_path, ["build", "--sources", "a.c"])
+
+    assert code == 3
+    assert calls == [["build", "--sources", "a.c"]]
+    assert seen["cwd"] == tmp_path
+    captured = capsys.readouterr()
+    assert captured.out == "compiling\n"
+    assert captured.err == "warning: x\n"
+
+
+def test_forward_without_server_returns_none(tmp_path: Path):
+    assert server.forward(tmp_path / "missing.sock", ["sync"]) is None
+
+
+def test_second_server_on_same_socket_is_refused(running):
+    socket_path, _, _ = running
+
+    with pytest.raises(OSError):
+        server.serve(socket_path, lambda argv: 0)
+
+
+def test_cli_falls_back_to_local_run(monkeypatch, tmp_path: Path, capsys):
+    ran = []
+    monkeypatch.setattr(cli, "_execute", lambda args: ran.append(args.command) or 0)
+
+    code = cli.main(["--server", "--socket", str(tmp_path / "none.sock"), "sync"])
+
+    assert code == 0
+    assert ran == ["sync"]
+    assert "running locally" in capsys.readouterr().err
+
+
+def test_failed_request_reports_and_drops_retained_state(monkeypatch, capsys):
+    forgotten = []
+    monkeypatch.setattr(config, "forget_state", lambda: forgotten.append(True))
+
+    def boom(args):
+        raise RuntimeError("state locked")
+
+    monkeypatch.setattr(cli, "_execute", boom)
+
+    assert cli._serve_request(["build"]) == 1
+    assert "RuntimeError: state locked" in capsys.readouterr().err
+    assert forgotten == [True]
+
+
+@pytest.mark.parametrize(
+    ("exit_code", "expected"), [(None, 0), (0, 0), (2, 2), ("no config", 1)]
+)
+def test_request_exit_status_follows_sys_exit(monkeypatch, capsys, exit_code, expected):
+    monkeypatch.setattr(config, "forget_state", lambda: None)
+
+    def leave(args):
+        raise SystemExit(exit_code)
+
+    monkeypatch.setattr(cli, "_execute", leave)
+
+    assert cli._serve_request(["build"]) == expected
+    if isinstance(exit_code, str):
+        assert exit_code in capsys.readouterr().err
+
+
+def test_stream_to_remote_output_goes_through_sys_stdout(tmp_path: Path, monkeypatch, capsys):
+    from irix_build import ssh
+
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "ssh"
+    script.write_text("#!/bin/sh\ncat > /dev/null\necho unpacked\necho note >&2\n")
+    script.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+
+    # capsys only sees Python-level writes, as the server's client does.
+    ssh.stream_to_remote("irix", "tar xf -", lambda stream: stream.write(b"data"))
+
+    captured = capsys.readouterr()
+    assert captured.out == "unpacked\nnote\n"
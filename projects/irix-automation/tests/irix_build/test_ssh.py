@@ -0,0 +1,189 @@
+import asyncio
+import shlex
+import time
+
+import pytest
+
+from irix_build import ssh
+
+
+def test_session_options_enable_control_master():
+    session = ssh.SSHSession("mario@octane", identity_file="~/.ssh/irix_rsa", persist=300)
+
+    options = session.options()
+
+    assert options[:2] == ["-i", "~/.ssh/irix_rsa"]
+    assert "ControlMaster=auto" in options
+    assert f"ControlPath={ssh.DEFAULT_CONTROL_PATH}" in options
+    assert "ControlPersist=300" in options
+
+
+def test_session_without_persist_is_not_multiplexed():
+    session = ssh.SSHSession("octane", persist=0)
+
+    assert session.options() == []
+
+
+def test_get_session_reuses_pooled_session(monkeypatch):
+    monkeypatch.setattr(ssh, "_SESSIONS", {})
+
+    first = ssh.get_session("octane")
+    second = ssh.get_session("octane")
+
+    assert first is second
+    assert ssh.get_session("o2") is not first
+
+
+def test_run_remote_uses_session_options(capsys):
+    session = ssh.SSHSession("octane")
+
+    ssh.run_remote("octane", "uname -a", dry_run=True, session=session)
+
+    out = capsys.readouterr().out
+    assert "ControlMaster=auto" in out
+    assert out.strip().endswith("octane 'uname -a'")
+
+
+def test_close_sessions_sends_exit(monkeypatch, capsys):
+    monkeypatch.setattr(ssh, "_SESSIONS", {})
+    ssh.get_session("octane")
+
+    ssh.close_sessions(dry_run=True)
+
+    assert "-O exit octane" in capsys.readouterr().out
+    assert ssh._SESSIONS == {}
+
+
+def test_run_command_async_streams_lines_and_captures():
+    lines = []
+
+    result = asyncio.run(
+        ssh.run_command_async(
+            ["sh", "-c", "echo one; echo two 1>&2; echo three"],
+            on_line=lambda stream, line: lines.append((stream, line)),
+        )
+    )
+
+    assert result.stdout == "one\nthree\n"
+    assert result.stderr == "two\n"
+    assert ("stderr", "two\n") in lines
+    assert [line for stream, line in lines if stream == "stdout"] == ["one\n", "three\n"]
+
+
+def test_run_command_async_failure_carries_output():
+    with pytest.raises(ssh.RemoteCommandError) as excinfo:
+        asyncio.run(ssh.run_command_async(["sh", "-c", "echo boom 1>&2; exit 3"], on_line=None))
+
+    assert excinfo.value.returncode == 3
+    assert excinfo.value.stderr == "boom\n"
+
+
+def test_streamed_run_remote_failure_carries_output(tmp_path, monkeypatch, capsys):
+    fake = tmp_path / "ssh"
+    fake.write_text('#!/bin/sh\nfor arg; do last="$arg"; done\nexec sh -c "$last"\n')
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}:/usr/bin:/bin")
+
+    with pytest.raises(ssh.RemoteCommandError) as excinfo:
+        ssh.run_remote("octane", "echo linking; echo 'ld32: ERROR 33' 1>&2; exit 2")
+
+    assert excinfo.value.stdout == "linking\n"
+    assert excinfo.value.stderr == "ld32: ERROR 33\n"
+    captured = capsys.readouterr()
+    assert captured.out == "linking\n"
+    assert captured.err == "ld32: ERROR 33\n"
+
+
+def test_run_command_async_timeout_kills_process():
+    started = time.monotonic()
+    with pytest.raises(ssh.RemoteTimeoutError):
+        asyncio.run(ssh.run_command_async(["sleep", "5"], on_line=None, timeout=0.1))
+
+    assert time.monotonic() - started < 2
+
+
+def test_run_command_async_cancellation_kills_process():
+    async def scenario():
+        task = asyncio.ensure_future(ssh.run_command_async(["sleep", "5"], on_line=None))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    started = time.monotonic()
+    asyncio.run(scenario())
+    assert time.monotonic() - started < 2
+
+
+def test_run_remote_async_dry_run_prints(capsys):
+    result = asyncio.run(ssh.run_remote_async("octane", "uname", dry_run=True))
+
+    assert result.returncode == 0
+    assert capsys.readouterr().out.strip() == "ssh octane uname"
+
+
+def test_relay_async_pipes_between_processes(tmp_path):
+    target = tmp_path / "out.txt"
+    asyncio.run(ssh.relay_async(["printf", "a.o"], ["sh", "-c", f"cat > {target}"]))
+
+    assert target.read_text() == "a.o"
+
+
+def test_relay_async_reports_failing_source():
+    with pytest.raises(ssh.RemoteCommandError) as excinfo:
+        asyncio.run(ssh.relay_async(["sh", "-c", "exit 3"], ["cat"]))
+    assert excinfo.value.returncode == 3
+
+
+def test_choose_compression_skips_precompressed_batches():
+    batch = [("textures.tar.gz", 900_000), ("notes.c", 1_000)]
+    assert ssh.choose_compression(batch, {}) == 0
+
+
+def test_choose_compression_explores_then_keeps_fastest():
+    batch = [("big.c", 1_000_000)]
+    stats: dict = {}
+    tried = []
+    for seconds in (4.0, 1.0, 2.0):
+        level = ssh.choose_compression(batch, stats)
+        tried.append(level)
+        ssh.record_transfer(stats, level, 1_000_000, seconds)
+
+    assert tried == list(ssh.COMPRESSION_LEVELS)
+    assert ssh.choose_compression(batch, stats) == tried[1]
+    assert ssh.choose_compression([("small.c", 100)], stats) == tried[1]
+    assert ssh.choose_compression(batch, stats, forced=9) == 9
+
+
+def test_small_batches_do_not_record_throughput():
+    stats: dict = {}
+    ssh.record_transfer(stats, 6, 1_000, 0.5)
+    assert stats == {}
+
+
+def test_compression_options_leave_multiplexed_sessions_alone():
+    shared = ssh.SSHSession("octane", None, "/tmp/cm-%C", 600)
+    single = ssh.SSHSession("octane", None, "/tmp/cm-%C", 0)
+
+    assert ssh.compression_options(True, shared) == []
+    assert ssh.compression_options(False, single) == ["-o", "Compression=no"]
+    assert ssh.compression_options(None, single) == []
+
+
+def test_sh_command_quotes_script_for_any_login_shell():
+    command = ssh.sh_command("if [ -f 'a b' ]; then cat 'a b'; fi")
+
+    assert shlex.split(command) == ["/bin/sh", "-c", "if [ -f 'a b' ]; then cat 'a b'; fi"]
+    with pytest.raises(ValueError):
+        ssh.sh_command("true\ntrue")
+    with pytest.raises(ValueError):
+        ssh.sh_command("echo hi!")
+
+
+def test_session_options_carry_configured_ciphers():
+    session = ssh.SSHSession("mario@octane", ciphers="aes128-ctr")
+
+    options = session.options()
+
+    assert options[:2] == ["-o", "Ciphers=aes128-ctr"]
+    assert "ControlMaster=auto" in options
@@ -0,0 +1,155 @@
+import json
+import sqlite3
+
+from irix_build import config, state
+
+
+def _cfg(tmp_path):
+    return config.BuildConfig(local_source_dir=tmp_path)
+
+
+def test_state_round_trips_nested_sections(tmp_path):
+    cfg = _cfg(tmp_path)
+    data = config.load_state(cfg)
+    data["digests"] = {"a.c": {"digest": "d1", "inode": 1, "mtime_ns": 2, "size": 3}}
+    data["synced"] = {"mario@octane": {"a.c": "d1"}, "mario@o2": {}}
+    data["objects"] = {"mario@octane": {"a.c": "k1"}}
+    config.save_state(cfg, data)
+
+    loaded = config.load_state(cfg)
+    assert loaded["digests"] == data["digests"]
+    assert loaded["synced"] == {"mario@octane": {"a.c": "d1"}, "mario@o2": {}}
+    assert loaded["objects"] == data["objects"]
+
+
+def test_save_writes_only_changed_rows(tmp_path, monkeypatch):
+    cfg = _cfg(tmp_path)
+    data = config.load_state(cfg)
+    data["digests"] = {f"f{i}.c": {"digest": str(i)} for i in range(100)}
+    config.save_state(cfg, data)
+
+    statements = []
+    connect = state._connect
+
+    class Recording:
+        def __init__(self, connection):
+            self._connection = connection
+
+        def executemany(self, sql, rows):
+            rows = list(rows)
+            statements.append((sql.split()[0], rows))
+            return self._connection.executemany(sql, rows)
+
+        def __getattr__(self, name):
+            return getattr(self._connection, name)
+
+    monkeypatch.setattr(state, "_connect", lambda path: Recording(connect(path)))
+    loaded = config.load_state(cfg)
+    loaded["digests"]["f7.c"] = {"digest": "changed"}
+    del loaded["digests"]["f8.c"]
+    config.save_state(cfg, loaded)
+
+    (_, upserts), (_, deletes) = statements
+    assert [row[2] for row in upserts] == ["f7.c"]
+    assert deletes == [("digests", "", "f8.c")]
+    rows = dict(
+        sqlite3.connect(cfg.state_file).execute(
+            "SELECT key, value FROM entries WHERE section = 'digests'"
+        )
+    )
+    assert json.loads(rows["f7.c"]) == {"digest": "changed"}
+    assert len(rows) == 99
+
+
+def test_legacy_json_state_is_imported(tmp_path):
+    cfg = _cfg(tmp_path)
+    legacy = tmp_path / config.LEGACY_STATE_FILE_NAME
+    legacy.write_text(json.dumps({"version": 2, "synced": {"mario@octane": {"a.c": "d"}}}))
+
+    loaded = config.load_state(cfg)
+
+    assert loaded["synced"] == {"mario@octane": {"a.c": "d"}}
+    assert not legacy.exists()
+    assert cfg.state_file.exists()
+
+
+def test_unknown_layout_starts_from_scratch(tmp_path):
+    cfg = _cfg(tmp_path)
+    data = config.load_state(cfg)
+    data["links"] = {"mario@octane": {"hello": "k"}}
+    config.save_state(cfg, data)
+    connection = sqlite3.connect(cfg.state_file)
+    connection.execute("PRAGMA user_version = 99")
+    connection.close()
+
+    assert config.load_state(cfg) == {"version": config.STATE_VERSION}
+
+
+def test_store_uses_write_ahead_logging(tmp_path):
+    cfg = _cfg(tmp_path)
+    config.save_state(cfg, config.load_state(cfg))
+
+    (mode,) = sqlite3.connect(cfg.state_file).execute("PRAGMA journal_mode").fetchone()
+    assert mode == "wal"
+
+
+def _save_digests(state_file, prefix, count):
+    cfg = config.BuildConfig(local_source_dir=state_file.parent)
+    for index in range(count):
+        data = config.load_state(cfg)
+        data.setdefault("digests", {})[f"{prefix}{index}.c"] = {"digest": str(index)}
+        config.save_state(cfg, data)
+
+
+def test_concurrent_runs_keep_each_others_entries(tmp_path):
+    import multiprocessing
+
+    cfg = _cfg(tmp_path)
+    config.save_state(cfg, config.load_state(cfg))
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_save_digests, args=(cfg.state_file, prefix, 40))
+        for prefix in ("a", "b", "c")
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    assert len(config.load_state(cfg)["digests"]) == 120
+
+
+def test_damaged_store_is_moved_aside_and_salvaged(tmp_path, capsys):
+    cfg = _cfg(tmp_path)
+    data = config.load_state(cfg)
+    data["digests"] = {f"f{i:05}.c": {"digest": "x" * 64} for i in range(5000)}
+    data["synced"] = {"mario@octane": {"a.c": "d1"}}
+    config.save_state(cfg, data)
+    raw = bytearray(cfg.state_file.read_bytes())
+    raw[len(raw) // 2 : len(raw) // 2 + 40000] = b"\xab" * 40000
+    cfg.state_file.write_bytes(bytes(raw))
+
+    loaded = config.load_state(cfg)
+
+    assert 0 < len(loaded["digests"]) < 5000
+    assert "damaged" in capsys.readouterr().err
+    assert (tmp_path / (cfg.state_file.name + ".corrupt")).exists()
+    assert not cfg.state_file.exists()
+
+    loaded["digests"]["new.c"] = {"digest": "n"}
+    config.save_state(cfg, loaded)
+    reloaded = config.load_state(cfg)
+    assert reloaded["digests"] == loaded["digests"]
+
+
+def test_file_that_is_not_a_store_is_replaced(tmp_path, capsys):
+    cfg = _cfg(tmp_path)
+    cfg.state_file.write_bytes(b"not sqlite" * 100)
+
+    data = config.load_state(cfg)
+    data["synced"] = {"mario@octane": {"a.c": "d1"}}
+    config.save_state(cfg, data)
+
+    assert config.load_state(cfg)["synced"] == {"mario@octane": {"a.c": "d1"}}
+    assert "damaged" in capsys.readouterr().err
@@ -1,8 +1,12 @@
+import gzip
+import hashlib
+import io
+import tarfile
 from pathlib import Path
 
 import pytest
 
-from irix_build import config, sync
+from irix_build import config, ssh, sync
 
 
 @pytest.fixture()
@@ -12,13 +16,25 @@ def cfg(tmp_path: Path) -> config.BuildConfig:
     return config.BuildConfig(local_source_dir=local_dir, default_sources=[])
 
 
-def test_determine_files_to_sync_detects_changes(cfg: config.BuildConfig):
+@pytest.fixture()
+def fake_scp(monkeypatch):
+    calls = []
+
+    def fake_scp_files(files, destination, **kwargs):
+        calls.append((list(files), destination))
+
+    monkeypatch.setattr(sync, "scp_files", fake_scp_files)
+    return calls
+
+
+def test_determine_files_to_sync_detects_changes(cfg: config.BuildConfig, fake_scp):
     src = cfg.local_source_dir / "hello.c"
     src.write_text("int main() {return 0;}\n", encoding="utf-8")
     cfg.default_sources = ["hello.c"]
 
     first = sync.determine_files_to_sync(cfg)
     assert first == [src]
+    sync.sync_files(cfg, first)
 
     second = sync.determine_files_to_sync(cfg)
     assert second == []
@@ -28,6 +44,82 @@ def test_determine_files_to_sync_detects_changes(cfg: config.BuildConfig):
     assert third == [src]
 
 
+def test_touch_without_content_change_is_not_resynced(cfg: config.BuildConfig, fake_scp):
+    src = cfg.local_source_dir / "hello.c"
+    src.write_text("int main() {return 0;}\n", encoding="utf-8")
+    cfg.default_sources = ["hello.c"]
+    sync.sync_files(cfg, sync.determine_files_to_sync(cfg))
+
+    src.write_text("int main() {return 0;}\n", encoding="utf-8")
+
+    assert sync.determine_files_to_sync(cfg) == []
+
+
+def test_failed_transfer_does_not_advance_state(cfg: config.BuildConfig, monkeypatch):
+    src = cfg.local_source_dir / "hello.c"
+    src.write_text("int main() {return 0;}\n", encoding="utf-8")
+    cfg.default_sources = ["hello.c"]
+
+    def failing_scp(files, destination, **kwargs):
+        raise ssh.RemoteCommandError(["scp"], 1, "", "lost connection")
+
+    monkeypatch.setattr(sync, "scp_files", failing_scp)
+    with pytest.raises(ssh.RemoteCommandError):
+        sync.sync_files(cfg, sync.determine_files_to_sync(cfg))
+
+    assert sync.determine_files_to_sync(cfg) == [src]
+
+
+def test_sync_files_uploads_manifest_with_batch(cfg: config.BuildConfig, fake_scp):
+    src = cfg.local_source_dir / "hello.c"
+    src.write_text("int main() {return 0;}\n", encoding="utf-8")
+
+    sync.sync_files(cfg, [src])
+
+    (files, destination), = fake_scp
+    assert files[0] == str(src)
+    assert files[-1].endswith(sync.MANIFEST_NAME)
+    assert destination == f"{cfg.remote_host}:{cfg.remote_source_dir}/"
+
+
+def test_reconcile_seeds_state_from_remote_manifest(cfg: config.BuildConfig, monkeypatch):
+    src = cfg.local_source_dir / "hello.c"
+    src.write_text("int main() {return 0;}\n", encoding="utf-8")
+    cfg.default_sources = ["hello.c"]
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()
+    monkeypatch.setattr(
+        sync, "capture_remote", lambda host, command, **kwargs: f"{digest}  hello.c\n"
+    )
+
+    sync.reconcile_manifest(cfg)
+
+    assert sync.determine_files_to_sync(cfg) == []
+
+
+def test_fetch_remote_manifest_runs_under_sh(cfg: config.BuildConfig, monkeypatch):
+    commands = []
+
+    def fake_capture(host, command, **kwargs):
+        commands.append(command)
+        return ""
+
+    monkeypatch.setattr(sync, "capture_remote", fake_capture)
+
+    assert sync.fetch_remote_manifest(cfg) == {}
+    # The login shell on IRIX is tcsh, which does not understand `2>/dev/null || true`.
+    assert commands == ["/bin/sh -c 'cat ~/src/irix_demo/.irix_build_manifest 2>/dev/null || true'"]
+
+
+def test_determine_files_to_sync_includes_local_headers(cfg: config.BuildConfig):
+    (cfg.local_source_dir / "hello.c").write_text('#include "hello.h"\n', encoding="utf-8")
+    (cfg.local_source_dir / "hello.h").write_text("#define HELLO 1\n", encoding="utf-8")
+    (cfg.local_source_dir / "unused.h").write_text("#define UNUSED 1\n", encoding="utf-8")
+
+    changed = sync.determine_files_to_sync(cfg, ["hello.c"])
+
+    assert changed == [cfg.local_source_dir / "hello.c", cfg.local_source_dir / "hello.h"]
+
+
 def test_sync_files_dry_run_prints_commands(cfg: config.BuildConfig, capsys, monkeypatch):
     src = cfg.local_source_dir / "hello.c"
     src.write_text("int main() {return 0;}\n", encoding="utf-8")
@@ -36,3 +128,110 @@ def test_sync_files_dry_run_prints_commands(cfg: config.BuildConfig, capsys, mon
     sync.sync_files(cfg, files, dry_run=True)
     captured = capsys.readouterr()
     assert "scp" in captured.out
+
+
+def test_sync_files_tar_mode_streams_tree_and_manifest(cfg: config.BuildConfig, monkeypatch):
+    (cfg.local_source_dir / "include").mkdir()
+    header = cfg.local_source_dir / "include" / "demo.h"
+    header.write_text("#define DEMO 1\n", encoding="utf-8")
+    src = cfg.local_source_dir / "hello.c"
+    src.write_text("int main() {return 0;}\n", encoding="utf-8")
+    captured = {}
+
+    def fake_stream(host, remote_command, producer, **kwargs):
+        buffer = io.BytesIO()
+        producer(buffer)
+        captured["command"] = remote_command
+        captured["payload"] = buffer.getvalue()
+
+    monkeypatch.setattr(sync, "stream_to_remote", fake_stream)
+
+    sync.sync_files(cfg, [src, header], mode="tar")
+
+    assert captured["command"].endswith("gzip -dc | tar xf -")
+    with tarfile.open(fileobj=io.BytesIO(gzip.decompress(captured["payload"]))) as archive:
+        names = archive.getnames()
+    assert names == ["hello.c", "include/demo.h", sync.MANIFEST_NAME]
+    cfg.default_sources = ["hello.c", "include/demo.h"]
+    assert sync.determine_files_to_sync(cfg) == []
+
+
+def test_default_scp_config_gets_a_compression_decision(
+    cfg: config.BuildConfig, fake_scp, monkeypatch
+):
+    src = cfg.local_source_dir / "big.c"
+    src.write_bytes(b"int x;\n" * ssh.MIN_SAMPLE_BYTES)
+    streamed = []
+
+    def fake_stream(host, command, producer, **kwargs):
+        buffer = io.BytesIO()
+        producer(buffer)
+        streamed.append((command, buffer.getvalue()))
+
+    monkeypatch.setattr(sync, "stream_to_remote", fake_stream)
+
+    sync.sync_files(cfg, [src])
+
+    # The default config: scp over a shared connection, whose master ignores -o Compression.
+    assert cfg.transfer_mode == "scp" and ssh.session_for(cfg).multiplexed
+    (command, payload), = streamed
+    assert command.endswith("gzip -dc | tar xf -")
+    assert len(payload) < src.stat().st_size // 10
+    assert fake_scp == []
+    stats = config.load_state(cfg)["transfers"][cfg.remote_host]["scp"]
+    assert stats[str(ssh.DEFAULT_COMPRESSION_LEVEL)]["samples"] == 1
+
+
+def test_uncompressed_scp_batch_still_uses_scp(cfg: config.BuildConfig, fake_scp):
+    src = cfg.local_source_dir / "big.c"
+    src.write_bytes(b"int x;\n" * ssh.MIN_SAMPLE_BYTES)
+    cfg.compression = 0
+
+    sync.sync_files(cfg, [src])
+
+    assert len(fake_scp) == 1
+
+
+def test_sync_files_scp_mode_streams_subdirectory_files(
+    cfg: config.BuildConfig, fake_scp, monkeypatch
+):
+    (cfg.local_source_dir / "include").mkdir()
+    header = cfg.local_source_dir / "include" / "demo.h"
+    header.write_text("#define DEMO 1\n", encoding="utf-8")
+    streamed = []
+    monkeypatch.setattr(
+        sync, "stream_to_remote", lambda host, command, producer, **kwargs: streamed.append(command)
+    )
+
+    sync.sync_files(cfg, [header], mode="scp")
+
+    assert fake_scp == []
+    assert len(streamed) == 1
+
+
+def test_sync_files_rejects_unknown_mode(cfg: config.BuildConfig):
+    src = cfg.local_source_dir / "hello.c"
+    src.write_text("int main() {return 0;}\n", encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        sync.sync_files(cfg, [src], mode="ftp")
+
+
+def test_precompressed_batch_is_streamed_without_gzip(cfg: config.BuildConfig, monkeypatch):
+    archive_path = cfg.local_source_dir / "assets.tar.gz"
+    archive_path.write_bytes(gzip.compress(b"x" * 1024))
+    captured = {}
+
+    def fake_stream(host, remote_command, producer, **kwargs):
+        buffer = io.BytesIO()
+        producer(buffer)
+        captured["command"] = remote_command
+        captured["payload"] = buffer.getvalue()
+
+    monkeypatch.setattr(sync, "stream_to_remote", fake_stream)
+
+    sync.sync_files(cfg, [archive_path], mode="tar")
+
+    assert captured["command"].endswith("&& tar xf -")
+    with tarfile.open(fileobj=io.BytesIO(captured["payload"])) as archive:
+        assert archive.getnames() == ["assets.tar.gz", sync.MANIFEST_NAME]
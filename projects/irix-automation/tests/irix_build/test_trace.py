@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from irix_build import cli, config, trace
+
+
+@pytest.fixture()
+def recorder():
+    active = trace.enable()
+    yield active
+    trace.disable()
+
+
+def test_span_is_free_when_disabled():
+    with trace.span("sync.scan", files=3) as fields:
+        fields["changed"] = 1
+    assert trace.active() is None
+
+
+def test_span_records_args_and_failures(recorder):
+    with trace.span("sync.transfer", bytes=100) as fields:
+        fields["files"] = 2
+
+    class Failure(Exception):
+        returncode = 2
+
+    with pytest.raises(Failure):
+        with trace.span("compile", lane="octane #0", unit="a.c"):
+            raise Failure()
+
+    transfer, compile_span = recorder.spans
+    assert transfer.args == {"bytes": 100, "files": 2}
+    assert compile_span.lane == "octane #0"
+    assert compile_span.args["exit"] == 2
+
+
+def test_summary_totals_numeric_args(recorder):
+    for size in (100, 50):
+        with trace.span("sync.transfer", bytes=size, mode="tar"):
+            pass
+
+    lines = trace.summary(recorder)
+    row = next(line for line in lines if line.startswith("sync.transfer"))
+    assert row.split()[1] == "2"
+    assert "bytes=150" in row
+    assert "mode" not in row
+
+
+def test_chrome_trace_names_lanes(recorder):
+    with trace.span("compile", lane="octane #1"):
+        pass
+
+    document = trace.chrome_trace(recorder)
+    complete = [event for event in document["traceEvents"] if event["ph"] == "X"]
+    names = [event for event in document["traceEvents"] if event["ph"] == "M"]
+    assert complete[0]["name"] == "compile"
+    assert names[0]["args"] == {"name": "octane #1"}
+    assert names[0]["tid"] == complete[0]["tid"]
+
+
+def test_cli_writes_trace_and_timings(tmp_path, monkeypatch, capsys):
+    local_dir = tmp_path / "src"
+    local_dir.mkdir()
+    (local_dir / "alpha.c").write_text("int main() {return 0;}\n")
+    monkeypatch.setattr(
+        cli, "load_config", lambda path: config.BuildConfig(local_source_dir=local_dir)
+    )
+    trace_path = tmp_path / "trace.json"
+
+    cli.main(
+        ["--dry-run", "--timings", "--trace", str(trace_path), "build", "--sources", "alpha.c"]
+    )
+
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    assert {"cli.build", "config.load", "build.keys", "compile", "link"} <= {
+        event["name"] for event in events
+    }
+    assert "Timings:" in capsys.readouterr().err
+    assert trace.active() is None
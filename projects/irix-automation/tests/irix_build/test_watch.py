@@ -0,0 +1,71 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from irix_build import watch
+
+
+@pytest.fixture()
+def tree(tmp_path: Path) -> Path:
+    (tmp_path / "hello.c").write_text("int main() {return 0;}\n")
+    return tmp_path
+
+
+def _edit_later(path: Path, text: str, delay: float = 0.05) -> threading.Thread:
+    def edit() -> None:
+        time.sleep(delay)
+        path.write_text(text)
+
+    thread = threading.Thread(target=edit)
+    thread.start()
+    return thread
+
+
+def test_polling_watcher_detects_edit(tree: Path):
+    watcher = watch.Watcher(tree, force_polling=True, poll_interval=0.01)
+    assert watcher.backend == "polling"
+
+    editor = _edit_later(tree / "hello.c", "int main() {return 1;}\n")
+    assert watcher.wait(timeout=2.0) is True
+    editor.join()
+    assert watcher.wait(timeout=0.05) is False
+
+
+def test_hidden_files_do_not_trigger(tree: Path):
+    watcher = watch.Watcher(tree, force_polling=True, poll_interval=0.01)
+
+    (tree / ".irix_build_state.json").write_text("{}")
+
+    assert watcher.wait(timeout=0.05) is False
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_watcher_detects_new_file(tree: Path):
+    watcher = watch.Watcher(tree)
+    try:
+        assert watcher.backend == "inotify"
+        editor = _edit_later(tree / "util.c", "int util;\n")
+        assert watcher.wait(timeout=2.0) is True
+        editor.join()
+    finally:
+        watcher.close()
+
+
+def test_watch_debounces_bursts(monkeypatch):
+    # Two waits report changes (a burst of saves), then the tree goes quiet.
+    results = iter([True, True, True, False, True, False])
+    timeouts = []
+
+    class FakeWatcher:
+        def wait(self, timeout=None):
+            timeouts.append(timeout)
+            return next(results)
+
+    cycles = []
+    watch.watch(FakeWatcher(), lambda: cycles.append(len(timeouts)), debounce=0.2, max_cycles=2)
+
+    assert cycles == [4, 6]
+    assert timeouts == [None, 0.2, 0.2, 0.2, None, 0.2]
@@ -0,0 +1,224 @@
+"""Long-lived remote agent that runs build steps over one SSH channel.
+
+The agent is a Bourne shell loop (IRIX ships no Python) started with a single ``ssh`` call
+that runs ``/bin/sh -s`` and is fed the loop on stdin ahead of the requests, since the tcsh
+login shell cannot take a multi-line script as an argument. Requests are single lines
+``<id> <verb> <argument>``; every reply is a byte-counted frame ``<id> <kind> <n>`` followed
+by ``n`` bytes, ending with ``<id> exit <status>``, so compiler output of any shape comes
+back intact with stdout and stderr kept apart. Requests can be written back to back and are
+answered in order, which batches a whole queue of operations into one round trip and skips
+the per-command session setup and login shell start-up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List, Optional
+
+from .ssh import (
+    CommandResult,
+    LineHandler,
+    RemoteCommandError,
+    SSHSession,
+    echo_line,
+    remote_command,
+)
+
+PROTOCOL_VERSION = 1
+
+# One ``{ ... }`` group, so sh has parsed all of it before the banner goes out and the
+# requests written after the banner are left on stdin for ``read``.
+AGENT_SCRIPT = r"""{
+t=${TMPDIR:-/tmp}/irix_agent.$$
+mkdir -p "$t" || exit 1
+trap 'rm -rf "$t"' 0
+frame() {
+  echo "$1 $2 `wc -c < "$3"`"
+  cat "$3"
+}
+echo "irix-agent ready %(version)d"
+while read -r id verb rest; do
+  case "$verb" in
+  run)
+    ( eval "$rest" ) < /dev/null > "$t/out" 2> "$t/err"
+    status=$?
+    frame "$id" out "$t/out"
+    frame "$id" err "$t/err"
+    echo "$id exit $status"
+    ;;
+  quit)
+    exit 0
+    ;;
+  *)
+    echo "unknown verb $verb" > "$t/err"
+    frame "$id" err "$t/err"
+    echo "$id exit 127"
+    ;;
+  esac
+done
+}
+""" % {"version": PROTOCOL_VERSION}
+
+
+class AgentError(RemoteCommandError):
+    """The agent could not be started or its channel broke."""
+
+
+class RemoteAgent:
+    """One agent process on ``host``; requests are answered in the order they were sent."""
+
+    def __init__(self, host: str, *, session: Optional[SSHSession] = None):
+        self.host = host
+        self.session = session
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+        self._starting: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 1
+
+    @property
+    def command(self) -> List[str]:
+        return remote_command(self.host, "/bin/sh -s", session=self.session)
+
+    async def start(self) -> None:
+        self._process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        assert self._process.stdin is not None and self._process.stdout is not None
+        self._process.stdin.write(AGENT_SCRIPT.encode())
+        try:
+            await self._process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # ssh already exited; reported below from its banner and stderr
+        banner = await self._process.stdout.readline()
+        expected = [b"irix-agent", b"ready", str(PROTOCOL_VERSION).encode()]
+        if banner.split() != expected:
+            # EOF on stdin ends an agent of another protocol version as well as a dead channel.
+            self._process.stdin.close()
+            stderr = b""
+            if self._process.stderr is not None:
+                stderr = await self._process.stderr.read()
+            await self._process.wait()
+            raise AgentError(
+                self.command,
+                self._process.returncode or -1,
+                banner.decode("utf-8", "replace"),
+                stderr.decode("utf-8", "replace"),
+            )
+        self._reader = asyncio.create_task(self._read_replies())
+
+    async def _read_replies(self) -> None:
+        assert self._process is not None and self._process.stdout is not None
+        stdout = self._process.stdout
+        streams: Dict[int, Dict[str, str]] = {}
+        try:
+            while True:
+                header = await stdout.readline()
+                if not header:
+                    break
+                request_id, kind, value = header.decode().split()
+                ident = int(request_id)
+                if kind == "exit":
+                    captured = streams.pop(ident, {})
+                    future = self._pending.pop(ident)
+                    if not future.done():
+                        future.set_result(
+                            (int(value), captured.get("out", ""), captured.get("err", ""))
+                        )
+                    continue
+                data = await stdout.readexactly(int(value))
+                streams.setdefault(ident, {})[kind] = data.decode("utf-8", "replace")
+        except (asyncio.IncompleteReadError, ValueError, KeyError):
+            pass
+        # The channel is gone; fail whatever is still waiting.
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(
+                    AgentError(self.command, -1, "", f"agent on {self.host} exited")
+                )
+        self._pending.clear()
+
+    async def run(
+        self, command: str, *, on_line: Optional[LineHandler] = echo_line
+    ) -> CommandResult:
+        """Run ``command`` through the agent's shell; raises ``RemoteCommandError`` on failure."""
+        if "\n" in command:
+            raise ValueError("agent commands must be a single line")
+        if self._starting is None:
+            self._starting = asyncio.ensure_future(self.start())
+        await self._starting
+        assert self._process is not None and self._process.stdin is not None
+        ident = self._next_id
+        self._next_id += 1
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending[ident] = future
+        self._process.stdin.write(f"{ident} run {command}\n".encode())
+        await self._process.stdin.drain()
+        returncode, stdout, stderr = await future
+        if on_line is not None:
+            for line in stdout.splitlines(keepends=True):
+                on_line("stdout", line)
+            for line in stderr.splitlines(keepends=True):
+                on_line("stderr", line)
+        argv = ["irix-agent", self.host, command]
+        if returncode != 0:
+            raise RemoteCommandError(argv, returncode, stdout, stderr)
+        return CommandResult(argv, returncode, stdout, stderr)
+
+    async def stat(self, paths: List[str]) -> List[Optional[int]]:
+        """Sizes of remote ``paths`` (already quoted for the shell), ``None`` where missing."""
+        probes = [
+            f'if [ -f {path} ]; then set -- `ls -ld {path}`; echo "$5"; else echo -; fi'
+            for path in paths
+        ]
+        result = await self.run("; ".join(probes), on_line=None)
+        return [None if line == "-" else int(line) for line in result.stdout.split()]
+
+    async def close(self) -> None:
+        if self._process is None:
+            return
+        if self._process.returncode is None and self._process.stdin is not None:
+            try:
+                self._process.stdin.write(b"0 quit\n")
+                await self._process.stdin.drain()
+                self._process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            await self._process.wait()
+        if self._reader is not None:
+            await self._reader
+        self._process = None
+        self._starting = None
+
+
+class AgentPool:
+    """Up to ``size`` agents on one host, handed out to concurrent callers."""
+
+    def __init__(self, host: str, size: int, *, session: Optional[SSHSession] = None):
+        self.host = host
+        self.session = session
+        self.agents = [RemoteAgent(host, session=session) for _ in range(max(1, size))]
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for agent in self.agents:
+            self._idle.put_nowait(agent)
+
+    async def run(
+        self, command: str, *, on_line: Optional[LineHandler] = echo_line
+    ) -> CommandResult:
+        agent = await self._idle.get()
+        try:
+            return await agent.run(command, on_line=on_line)
+        finally:
+            self._idle.put_nowait(agent)
+
+    async def close(self) -> None:
+        await asyncio.gather(*(agent.close() for agent in self.agents))
+
+    async def __aenter__(self) -> "AgentPool":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.close()
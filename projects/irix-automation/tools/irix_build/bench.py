@@ -0,0 +1,296 @@
+"""Benchmark the sync/build pipeline against a local stand-in for the IRIX host.
+
+The harness writes fake ``ssh``, ``scp`` and ``cc`` executables onto ``PATH``. ``ssh`` runs
+the remote command with ``sh`` in a sandbox directory that plays the remote ``$HOME``,
+``scp`` copies into it, and ``cc`` copies source text into objects. Each fake sleeps for the
+configured round-trip latency, link bandwidth, connection handshake (skipped while a
+ControlMaster "socket" is alive) and compile rate, and logs its traffic, so results are
+reproducible on a laptop::
+
+    python -m irix_build.bench --files 100 1000 --mode scp tar --latency 0.02 --bandwidth 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from . import build as build_module
+from . import ssh as ssh_module
+from . import sync as sync_module
+from .bench_fakes import FAKES, LOG_NAME, SETTINGS_NAME
+from .config import BuildConfig
+
+HOST = "irix-bench"
+
+
+@dataclass
+class LinkModel:
+    """Simulated network and toolchain costs; ``bandwidth`` is in bytes/s (0 = unlimited)."""
+
+    latency: float = 0.0
+    handshake: float = 0.0
+    bandwidth: float = 0.0
+    compile_seconds_per_kib: float = 0.0
+
+
+@dataclass
+class PhaseResult:
+    phase: str
+    files: int
+    mode: str
+    seconds: float
+    round_trips: int
+    handshakes: int
+    bytes_up: int
+    bytes_down: int
+    error: str = ""
+
+
+def install_fakes(root: Path, model: LinkModel) -> Path:
+    """Write the fake tools and their settings under ``root``; return the ``bin`` directory."""
+    bin_dir = root / "bin"
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    (root / "remote").mkdir(exist_ok=True)
+    (root / SETTINGS_NAME).write_text(json.dumps(asdict(model)), encoding="utf-8")
+    package_dir = Path(__file__).resolve().parent
+    for name in FAKES:
+        script = bin_dir / name
+        script.write_text(
+            f"#!{sys.executable}\n"
+            "import sys\n"
+            f"sys.path.insert(0, {str(package_dir)!r})\n"
+            "import bench_fakes\n"
+            f"sys.exit(bench_fakes.main({name!r}, sys.argv[1:]))\n",
+            encoding="utf-8",
+        )
+        script.chmod(0o755)
+    return bin_dir
+
+
+# ---------------------------------------------------------------------------
+# synthetic trees and phases
+# ---------------------------------------------------------------------------
+
+
+def generate_tree(root: Path, files: int, *, seed: int = 0) -> List[str]:
+    """Write ``files`` sources (a quarter units, the rest headers) and return the units."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    unit_count = max(1, files // 4)
+    header_count = files - unit_count
+    units = [f"u{index:05d}.c" for index in range(unit_count)]
+    headers = [f"h{index:05d}.h" for index in range(header_count)]
+    includes: Dict[str, List[str]] = {unit: [] for unit in units}
+    for index, header in enumerate(headers):
+        includes[units[index % unit_count]].append(header)
+    for unit in units:
+        if headers:
+            includes[unit].extend(rng.sample(headers, min(2, len(headers))))
+    for index, header in enumerate(headers):
+        padding = "".join(
+            f"/* {rng.getrandbits(64):016x} */\n" for _ in range(rng.randint(8, 64))
+        )
+        (root / header).write_text(f"#define H{index} {index}\n{padding}", encoding="utf-8")
+    for index, unit in enumerate(units):
+        lines = [f'#include "{header}"' for header in dict.fromkeys(includes[unit])]
+        if index == 0:
+            body = "int main(void) { return 0; }"
+        else:
+            body = f"int f{index}(void) {{ return {index}; }}"
+        (root / unit).write_text("\n".join(lines + [body, ""]), encoding="utf-8")
+    return units
+
+
+def _traffic(root: Path) -> List[dict]:
+    log = root / LOG_NAME
+    if not log.exists():
+        return []
+    return [json.loads(line) for line in log.read_text(encoding="utf-8").splitlines()]
+
+
+@contextlib.contextmanager
+def _on_path(bin_dir: Path) -> Iterator[None]:
+    previous = os.environ.get("PATH", "")
+    previous_bench = os.environ.get("IRIX_BENCH_DIR")
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{previous}"
+    os.environ["IRIX_BENCH_DIR"] = str(bin_dir.parent)
+    try:
+        yield
+    finally:
+        os.environ["PATH"] = previous
+        if previous_bench is None:
+            os.environ.pop("IRIX_BENCH_DIR", None)
+        else:
+            os.environ["IRIX_BENCH_DIR"] = previous_bench
+
+
+def _measure(root: Path, phase: str, files: int, mode: str, action) -> PhaseResult:
+    before = len(_traffic(root))
+    error = ""
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")) as sink:
+        try:
+            action()
+        except (ssh_module.RemoteCommandError, OSError) as exc:
+            error = str(exc)
+        finally:
+            sink.close()
+    elapsed = time.perf_counter() - started
+    entries = _traffic(root)[before:]
+    return PhaseResult(
+        phase=phase,
+        files=files,
+        mode=mode,
+        seconds=elapsed,
+        round_trips=len(entries),
+        handshakes=sum(1 for entry in entries if entry["handshake"]),
+        bytes_up=sum(entry["up"] for entry in entries),
+        bytes_down=sum(entry["down"] for entry in entries),
+        error=error,
+    )
+
+
+def run_scenario(
+    files: int,
+    mode: str,
+    model: LinkModel,
+    *,
+    jobs: int = 4,
+    max_units: int = 200,
+    cache_max_mb: int = 0,
+    seed: int = 0,
+) -> List[PhaseResult]:
+    """Sync and build one synthetic tree through the fakes and measure each phase."""
+    results: List[PhaseResult] = []
+    with tempfile.TemporaryDirectory(prefix="irix-bench-") as tmp:
+        root = Path(tmp)
+        bin_dir = install_fakes(root, model)
+        local_dir = root / "local"
+        units = generate_tree(local_dir, files, seed=seed)
+        build_units = units[:max_units]
+        cfg = BuildConfig(
+            host=HOST,
+            user=None,
+            local_source_dir=local_dir,
+            default_sources=units,
+            jobs=jobs,
+            cache_max_mb=cache_max_mb,
+            control_path=str(root / "cm-%C"),
+            transfer_mode=mode,
+        )
+
+        def sync() -> None:
+            sync_module.reconcile_manifest(cfg)
+            changed = sync_module.determine_files_to_sync(cfg, units)
+            sync_module.sync_files(cfg, changed)
+
+        def build() -> None:
+            build_module.build_target(cfg, build_units, "bench")
+
+        def touch(fraction: float) -> None:
+            rng = random.Random(seed + 1)
+            paths = sorted(local_dir.glob("*.h")) or sorted(local_dir.glob("*.c"))
+            for path in rng.sample(paths, max(1, int(len(paths) * fraction))):
+                with path.open("a", encoding="utf-8") as fh:
+                    fh.write(f"/* edit {rng.getrandbits(32):08x} */\n")
+
+        def header_edit() -> None:
+            # h00000.h is always included by the first unit, so this dirties part of the build.
+            edited = local_dir / ("h00000.h" if files > 1 else units[0])
+            with edited.open("a", encoding="utf-8") as fh:
+                fh.write("/* header edit */\n")
+            sync()
+
+        with _on_path(bin_dir):
+            try:
+                results.append(_measure(root, "sync.cold", files, mode, sync))
+                results.append(_measure(root, "sync.noop", files, mode, sync))
+                touch(0.01)
+                results.append(_measure(root, "sync.touch", files, mode, sync))
+                results.append(_measure(root, "build.cold", files, mode, build))
+                results.append(_measure(root, "build.noop", files, mode, build))
+                header_edit()
+                results.append(_measure(root, "build.header", files, mode, build))
+            finally:
+                ssh_module.close_sessions()
+    return results
+
+
+def format_results(results: List[PhaseResult]) -> List[str]:
+    lines = [
+        f"{'files':>6} {'mode':<4} {'phase':<13} {'seconds':>8} {'trips':>6} "
+        f"{'handsh':>6} {'up KiB':>9} {'down KiB':>9}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result.files:>6} {result.mode:<4} {result.phase:<13} {result.seconds:>8.3f} "
+            f"{result.round_trips:>6} {result.handshakes:>6} {result.bytes_up / 1024:>9.1f} "
+            f"{result.bytes_down / 1024:>9.1f}"
+            + (f"  error: {result.error.splitlines()[0]}" if result.error else "")
+        )
+    return lines
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark irix-build against a fake IRIX host")
+    parser.add_argument("--files", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument(
+        "--mode", nargs="+", choices=sync_module.TRANSFER_MODES, default=["scp", "tar"]
+    )
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per round trip")
+    parser.add_argument("--handshake", type=float, default=0.15, help="Seconds per new connection")
+    parser.add_argument("--bandwidth", type=float, default=2.0, help="MB/s (0 = unlimited)")
+    parser.add_argument("--compile-ms-per-kib", type=float, default=5.0)
+    parser.add_argument("-j", "--jobs", type=int, default=4)
+    parser.add_argument("--max-units", type=int, default=200, help="Units built per scenario")
+    parser.add_argument("--cache-mb", type=int, default=0, help="Remote build cache size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Also write the results as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv if argv is not None else sys.argv[1:])
+    model = LinkModel(
+        latency=args.latency,
+        handshake=args.handshake,
+        bandwidth=args.bandwidth * 1_000_000,
+        compile_seconds_per_kib=args.compile_ms_per_kib / 1000,
+    )
+    results: List[PhaseResult] = []
+    header_printed = False
+    for files in args.files:
+        for mode in args.mode:
+            scenario = run_scenario(
+                files,
+                mode,
+                model,
+                jobs=args.jobs,
+                max_units=args.max_units,
+                cache_max_mb=args.cache_mb,
+                seed=args.seed,
+            )
+            lines = format_results(scenario)
+            for line in lines if not header_printed else lines[1:]:
+                print(line)
+            header_printed = True
+            results.extend(scenario)
+    if args.json:
+        args.json.write_text(
+            json.dumps([asdict(result) for result in results], indent=2) + "\n", encoding="utf-8"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
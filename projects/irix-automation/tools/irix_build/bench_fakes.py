@@ -0,0 +1,170 @@
+"""Stand-ins for ``ssh``, ``scp`` and ``cc`` used by :mod:`irix_build.bench`.
+
+The generated executables import this module directly (not through the package) so each
+fake starts without loading the CLI; keep it to the standard library.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+SETTINGS_NAME = "settings.json"
+LOG_NAME = "traffic.jsonl"
+_CHUNK = 64 * 1024
+
+
+def _settings() -> dict:
+    root = Path(os.environ["IRIX_BENCH_DIR"])
+    settings = json.loads((root / SETTINGS_NAME).read_text(encoding="utf-8"))
+    settings["root"] = root
+    return settings
+
+
+def _log(settings: dict, **entry: object) -> None:
+    line = json.dumps(entry) + "\n"
+    fd = os.open(settings["root"] / LOG_NAME, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def _throttle(settings: dict, size: int) -> None:
+    if settings["bandwidth"] > 0 and size:
+        time.sleep(size / settings["bandwidth"])
+
+
+def _split_options(argv: List[str]) -> tuple[Dict[str, str], List[str]]:
+    """Separate ``-o Key=Value``/``-i file``/``-O cmd`` options from positional arguments."""
+    options: Dict[str, str] = {}
+    positional: List[str] = []
+    args = iter(argv)
+    for arg in args:
+        if arg in ("-o", "-i", "-O"):
+            value = next(args, "")
+            key, _, rest = value.partition("=")
+            options[key if arg == "-o" else arg] = rest if arg == "-o" else value
+        elif arg.startswith("-") and not positional:
+            continue
+        else:
+            positional.append(arg)
+    return options, positional
+
+
+def _connect(settings: dict, options: Dict[str, str], host: str) -> bool:
+    """Sleep for latency (and a handshake without a live master); return True on handshake."""
+    time.sleep(settings["latency"])
+    control = options.get("ControlPath")
+    marker = Path(control.replace("%C", host)) if control else None
+    if marker is not None and marker.exists():
+        return False
+    time.sleep(settings["handshake"])
+    if marker is not None and options.get("ControlMaster") in ("auto", "yes"):
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.touch()
+    return True
+
+
+def _fake_ssh(argv: List[str]) -> int:
+    settings = _settings()
+    options, positional = _split_options(argv)
+    host = positional[0]
+    if options.get("-O") == "exit":
+        control = options.get("ControlPath")
+        if control:
+            Path(control.replace("%C", host)).unlink(missing_ok=True)
+        return 0
+    handshake = _connect(settings, options, host)
+    remote_home = settings["root"] / "remote"
+    env = dict(os.environ, HOME=str(remote_home))
+    process = subprocess.Popen(
+        ["sh", "-c", " ".join(positional[1:])],
+        cwd=remote_home,
+        env=env,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    assert process.stdin is not None and process.stdout is not None
+    sent = [0]
+
+    def pump() -> None:
+        try:
+            while True:
+                chunk = os.read(0, _CHUNK)
+                if not chunk:
+                    break
+                _throttle(settings, len(chunk))
+                sent[0] += len(chunk)
+                process.stdin.write(chunk)
+                process.stdin.flush()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with contextlib.suppress(OSError):
+                process.stdin.close()
+
+    threading.Thread(target=pump, daemon=True).start()
+    received = 0
+    while True:
+        chunk = process.stdout.read(_CHUNK)
+        if not chunk:
+            break
+        _throttle(settings, len(chunk))
+        received += len(chunk)
+        sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    returncode = process.wait()
+    _log(settings, tool="ssh", handshake=handshake, up=sent[0], down=received)
+    return returncode
+
+
+def _fake_scp(argv: List[str]) -> int:
+    settings = _settings()
+    options, positional = _split_options(argv)
+    *sources, destination = positional
+    host, _, remote_path = destination.partition(":")
+    handshake = _connect(settings, options, host)
+    remote_home = settings["root"] / "remote"
+    target = Path(remote_path.replace("~", str(remote_home), 1))
+    if not target.is_absolute():
+        target = remote_home / target
+    target.mkdir(parents=True, exist_ok=True)
+    size = 0
+    for source in sources:
+        size += os.path.getsize(source)
+        shutil.copyfile(source, target / Path(source).name)
+    _throttle(settings, size)
+    _log(settings, tool="scp", handshake=handshake, up=size, down=0)
+    return 0
+
+
+def _fake_cc(argv: List[str]) -> int:
+    settings = _settings()
+    if "-version" in argv or "--version" in argv:
+        print("BenchCC Compilers: Version 1.0")
+        return 0
+    output = argv[argv.index("-o") + 1]
+    if "-c" in argv:
+        inputs = [argv[argv.index("-c") + 1]]
+    else:
+        inputs = [arg for arg in argv if arg.endswith(".o") and arg != output]
+    data = b"".join(Path(path).read_bytes() for path in inputs)
+    time.sleep(len(data) / 1024 * settings["compile_seconds_per_kib"])
+    Path(output).write_bytes(data)
+    return 0
+
+
+FAKES = {"ssh": _fake_ssh, "scp": _fake_scp, "cc": _fake_cc}
+
+
+def main(name: str, argv: List[str]) -> int:
+    return FAKES[name](argv)
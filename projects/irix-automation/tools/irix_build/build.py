@@ -2,30 +2,524 @@
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import shlex
-from typing import Iterable, List
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
 
+from . import cache
+from . import config as config_module
+from . import deps
+from . import diagnostics as diagnostics_module
+from . import farm
+from . import trace
+from .agent import AgentPool
 from .config import BuildConfig
-from .ssh import run_remote
+from .digests import content_digest
+from .ssh import (
+    LineHandler,
+    RemoteCommandError,
+    SSHSession,
+    echo_line,
+    quote_remote_path,
+    relay_async,
+    remote_command,
+    run_remote,
+    run_remote_async,
+    session_for,
+)
 
 
-def build_target(
+# Awaited before a unit is compiled; raises ``RemoteCommandError`` if its inputs never arrive.
+Gate = Callable[[str], Awaitable[None]]
+
+
+def object_name(source: str) -> str:
+    """Object path (relative to ``remote_obj_dir``) for a translation unit."""
+    return str(Path(source).with_suffix(".o"))
+
+
+def _remote_file(directory: str, relative: str) -> str:
+    return f"{quote_remote_path(directory)}/{shlex.quote(relative)}"
+
+
+def compile_command(cfg: BuildConfig, source: str) -> str:
+    obj = object_name(source)
+    obj_parent = str(Path(cfg.remote_obj_dir, obj).parent)
+    flags = "".join(f"{shlex.quote(flag)} " for flag in cfg.cflags)
+    return (
+        f"cd {quote_remote_path(cfg.remote_source_dir)} && "
+        f"mkdir -p {quote_remote_path(obj_parent)} && "
+        f"{shlex.quote(cfg.compiler)} {flags}-c {shlex.quote(source)} "
+        f"-o {_remote_file(cfg.remote_obj_dir, obj)}"
+    )
+
+
+def link_command(cfg: BuildConfig, sources: List[str], target: str) -> str:
+    objects = " ".join(_remote_file(cfg.remote_obj_dir, object_name(src)) for src in sources)
+    return (
+        f"mkdir -p {quote_remote_path(cfg.remote_bin_dir)} && "
+        f"{shlex.quote(cfg.compiler)} -o {_remote_file(cfg.remote_bin_dir, target)} {objects}"
+    )
+
+
+def _header_digests(
+    graph: Dict[str, List[str]],
+    source: str,
+    digests: Dict[str, dict],
+) -> List[str]:
+    closure = deps.header_closure(graph, source)
+    return [f"{header}={digests[header]['digest']}" for header in closure]
+
+
+def unit_key(
     cfg: BuildConfig,
-    sources: Iterable[str],
+    source: str,
+    digests: Dict[str, dict],
+    headers: List[str],
+) -> Optional[str]:
+    """Digest of everything that feeds one object file, or ``None`` if it cannot be known."""
+    path = cfg.local_source_dir / source
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    hasher = hashlib.sha256()
+    hasher.update(compile_command(cfg, source).encode())
+    hasher.update(content_digest(path, st, digests, source).encode())
+    for entry in headers:
+        hasher.update(entry.encode())
+    return hasher.hexdigest()
+
+
+def _link_key(
+    cfg: BuildConfig,
+    sources: List[str],
     target: str,
+    keys: Dict[str, Optional[str]],
+) -> Optional[str]:
+    if any(keys[source] is None for source in sources):
+        return None
+    hasher = hashlib.sha256(link_command(cfg, sources, target).encode())
+    for source in sources:
+        hasher.update(str(keys[source]).encode())
+    return hasher.hexdigest()
+
+
+def _cache_entries(
+    toolchain: str, units: Iterable[str], keys: Dict[str, Optional[str]]
+) -> Dict[str, str]:
+    """Cache entry key -> unit for every unit whose key is known."""
+    return {cache.entry_key(toolchain, str(keys[unit])): unit for unit in units if keys[unit]}
+
+
+def _prefixed(label: str) -> LineHandler:
+    def handle(stream: str, line: str) -> None:
+        echo_line(stream, f"[{label}] {line}")
+
+    return handle
+
+
+async def compile_units(
+    cfg: BuildConfig,
+    stale: List[str],
+    keys: Dict[str, Optional[str]],
+    objects: Dict[str, str],
     *,
+    host: str | None = None,
     dry_run: bool = False,
+    session: SSHSession | None = None,
+    stats: Dict[str, dict] | None = None,
+    diagnostics: Dict[str, List[diagnostics_module.Diagnostic]] | None = None,
+    gate: Gate | None = None,
 ) -> None:
-    quoted_sources = " ".join(shlex.quote(str(source)) for source in sources)
-    remote_cmd = (
-        f"cd {shlex.quote(cfg.remote_source_dir)} && "
-        f"mkdir -p {shlex.quote(cfg.remote_bin_dir)} && "
-        f"cc -o {shlex.quote(cfg.remote_bin_dir)}/{shlex.quote(target)} {quoted_sources}"
+    """Compile ``stale`` on ``host`` with at most ``cfg.jobs`` compilers running at once.
+
+    ``objects`` (the host's object map) is updated as each unit finishes so a failure
+    elsewhere does not discard finished work; the first failure is re-raised once every
+    started compile is done. Wall times are folded into ``stats`` for the farm scheduler.
+    With ``cfg.remote_agent`` the compiles go through one agent per job slot rather than a
+    fresh ssh command each. Compiler output parsed into structured diagnostics, failed units
+    included, is stored per unit in ``diagnostics``. A unit only takes a job slot once
+    ``gate`` (if given) lets it through.
+    """
+    host = host or cfg.remote_host
+    session = session or session_for(cfg, host)
+    limit = asyncio.Semaphore(1 if dry_run else max(1, cfg.jobs))
+    failures: List[RemoteCommandError] = []
+    agents = None
+    if cfg.remote_agent and not dry_run and stale:
+        agents = AgentPool(host, min(len(stale), max(1, cfg.jobs)), session=session)
+
+    free_slots = list(range(max(1, cfg.jobs)))
+
+    async def compile_one(source: str) -> None:
+        if gate is not None:
+            try:
+                await gate(source)
+            except RemoteCommandError as exc:
+                failures.append(exc)
+                objects.pop(source, None)
+                return
+        async with limit:
+            slot = free_slots.pop(0)
+            handler = _prefixed(source) if len(stale) > 1 else echo_line
+            parser = diagnostics_module.Parser(cfg)
+            started = time.monotonic()
+            try:
+                with trace.span("compile", lane=f"{host} #{slot}", unit=source) as fields:
+                    fields["lines"] = 0
+
+                    def on_line(stream: str, line: str) -> None:
+                        fields["lines"] = int(fields["lines"]) + 1
+                        parser.feed(line)
+                        handler(stream, line)
+
+                    if agents is not None:
+                        await agents.run(compile_command(cfg, source), on_line=on_line)
+                    else:
+                        await run_remote_async(
+                            host,
+                            compile_command(cfg, source),
+                            dry_run=dry_run,
+                            session=session,
+                            on_line=on_line,
+                        )
+            except RemoteCommandError as exc:
+                failures.append(exc)
+                objects.pop(source, None)
+                return
+            finally:
+                free_slots.append(slot)
+                if diagnostics is not None and not dry_run:
+                    diagnostics[source] = parser.close()
+            elapsed = time.monotonic() - started
+        if dry_run:
+            return
+        if stats is not None:
+            farm.record_compile(stats, host, farm.unit_weight(cfg, source), elapsed)
+        key = keys[source]
+        if key is not None:
+            objects[source] = key
+
+    try:
+        await asyncio.gather(*(compile_one(source) for source in stale))
+    finally:
+        if agents is not None:
+            await agents.close()
+    if failures:
+        raise failures[0]
+
+
+async def gather_objects(
+    cfg: BuildConfig,
+    host: str,
+    units: List[str],
+    *,
+    dry_run: bool = False,
+    link_session: SSHSession | None = None,
+) -> None:
+    """Copy the objects for ``units`` from ``host`` to the linking host in one tar stream."""
+    obj_dir = quote_remote_path(cfg.remote_obj_dir)
+    names = " ".join(shlex.quote(object_name(unit)) for unit in units)
+    source = remote_command(
+        host, f"cd {obj_dir} && tar cf - {names}", session=session_for(cfg, host)
     )
-    run_remote(
+    sink = remote_command(
         cfg.remote_host,
-        remote_cmd,
-        dry_run=dry_run,
-        identity_file=cfg.identity_file,
-        stream_output=True,
+        f"mkdir -p {obj_dir} && cd {obj_dir} && tar xf -",
+        session=link_session or session_for(cfg),
     )
+    with trace.span("gather", lane=host, units=len(units)):
+        await relay_async(source, sink, dry_run=dry_run)
+
+
+def plan_units(
+    cfg: BuildConfig,
+    units: List[str],
+    keys: Dict[str, Optional[str]],
+    stats: Dict[str, dict],
+) -> Dict[str, List[str]]:
+    """Spread ``units`` over ``cfg.build_hosts``; units without a key stay on the link host."""
+    hosts = cfg.build_hosts
+    if len(hosts) == 1:
+        return {hosts[0]: list(units)}
+    known = [unit for unit in units if keys[unit] is not None]
+    weights = {unit: farm.unit_weight(cfg, unit) for unit in known}
+    plan = farm.schedule(known, weights, hosts, stats, jobs=cfg.jobs)
+    plan[hosts[0]].extend(unit for unit in units if keys[unit] is None)
+    return plan
+
+
+async def _build_units(
+    cfg: BuildConfig,
+    plan: Dict[str, List[str]],
+    gather: Dict[str, List[str]],
+    keys: Dict[str, Optional[str]],
+    objects_by_host: Dict[str, Dict[str, str]],
+    stats: Dict[str, dict],
+    *,
+    dry_run: bool,
+    session: SSHSession,
+    diagnostics: Dict[str, List[diagnostics_module.Diagnostic]] | None = None,
+    gate: Gate | None = None,
+) -> None:
+    primary = cfg.remote_host
+    failures: List[RemoteCommandError] = []
+
+    async def run_host(host: str) -> None:
+        units = plan.get(host, [])
+        objects = objects_by_host.setdefault(host, {})
+        if units:
+            try:
+                await compile_units(
+                    cfg,
+                    units,
+                    keys,
+                    objects,
+                    host=host,
+                    dry_run=dry_run,
+                    session=session if host == primary else None,
+                    stats=stats,
+                    diagnostics=diagnostics,
+                    gate=gate,
+                )
+            except RemoteCommandError as exc:
+                failures.append(exc)
+        if host == primary:
+            return
+        # Ship whatever this host finished, even if some of its units failed.
+        ready = gather.get(host, []) + [
+            unit for unit in units if dry_run or objects.get(unit) == keys[unit]
+        ]
+        if not ready:
+            return
+        try:
+            await gather_objects(cfg, host, ready, dry_run=dry_run, link_session=session)
+        except RemoteCommandError as exc:
+            failures.append(exc)
+            return
+        if not dry_run:
+            for unit in ready:
+                objects_by_host[primary][unit] = str(keys[unit])
+
+    hosts = [host for host in cfg.build_hosts if plan.get(host) or gather.get(host)]
+    if dry_run:
+        for host in hosts:
+            await run_host(host)
+    else:
+        await asyncio.gather(*(run_host(host) for host in hosts))
+    if failures:
+        raise failures[0]
+
+
+def _replay(
+    state: dict,
+    units: Iterable[str],
+    keys: Dict[str, Optional[str]],
+    found: Dict[str, List[diagnostics_module.Diagnostic]],
+) -> List[str]:
+    """Print the recorded diagnostics of units that are not being recompiled."""
+    replayed = []
+    for unit in units:
+        items = diagnostics_module.cached(state, unit, keys[unit])
+        if not items:
+            continue
+        found[unit] = items
+        replayed.append(unit)
+        for item in items:
+            echo_line("stderr", f"[{unit}] {item.format()} (cached)\n")
+    return replayed
+
+
+def build_target(
+    cfg: BuildConfig,
+    sources: Iterable[str],
+    target: str,
+    *,
+    dry_run: bool = False,
+    session: SSHSession | None = None,
+    diagnostics_file: Path | None = None,
+    gate: Gate | None = None,
+) -> None:
+    """Compile stale translation units to remote objects in parallel, then link ``target``.
+
+    With extra ``hosts`` configured, units are spread across the pool by measured
+    throughput and the resulting objects are gathered onto the primary host for linking.
+    Compiler diagnostics are kept per unit key, so units that are not recompiled replay
+    their warnings; ``diagnostics_file`` receives all of them as JSON, even when a unit fails.
+    ``gate`` holds back each compile until its inputs are on the host (see ``pipeline``).
+    """
+    found: Dict[str, List[diagnostics_module.Diagnostic]] = {}
+    replayed: List[str] = []
+    try:
+        _build_target(
+            cfg,
+            list(sources),
+            target,
+            dry_run=dry_run,
+            session=session,
+            found=found,
+            replayed=replayed,
+            gate=gate,
+        )
+    finally:
+        if diagnostics_file is not None and not dry_run:
+            diagnostics_module.write_report(diagnostics_file, found, replayed)
+
+
+def _build_target(
+    cfg: BuildConfig,
+    sources: List[str],
+    target: str,
+    *,
+    dry_run: bool,
+    session: SSHSession | None,
+    found: Dict[str, List[diagnostics_module.Diagnostic]],
+    replayed: List[str],
+    gate: Gate | None = None,
+) -> None:
+    session = session or session_for(cfg)
+    hosts = cfg.build_hosts
+    state = config_module.load_state(cfg)
+    digests = state.setdefault("digests", {})
+    objects_by_host = state.setdefault("objects", {})
+    objects = objects_by_host.setdefault(cfg.remote_host, {})
+    stats = state.setdefault("hosts", {})
+    with trace.span("build.keys", units=len(sources)):
+        graph = deps.update_graph(cfg, state)
+        keys = {
+            source: unit_key(cfg, source, digests, _header_digests(graph, source, digests))
+            for source in sources
+        }
+    stale = [
+        source for source in sources if keys[source] is None or objects.get(source) != keys[source]
+    ]
+
+    links = state.setdefault("links", {}).setdefault(cfg.remote_host, {})
+    link_key = _link_key(cfg, sources, target, keys)
+
+    toolchain: Optional[str] = None
+    if cache.enabled(cfg) and not dry_run and (stale or links.get(target) != link_key):
+        with trace.span("cache.toolchain"):
+            toolchain = cache.toolchain_id(cfg, session=session)
+        entries = _cache_entries(toolchain, stale, keys)
+        wanted = {
+            entry: _remote_file(cfg.remote_obj_dir, object_name(unit))
+            for entry, unit in entries.items()
+        }
+        binary = cache.entry_key(toolchain, link_key) if link_key else None
+        if binary:
+            wanted[binary] = _remote_file(cfg.remote_bin_dir, target)
+        with trace.span("cache.restore", lookups=len(wanted)) as fields:
+            hits = cache.restore(cfg, wanted, session=session)
+            fields["hits"] = len(hits)
+        cache.record_lookups(state, cfg.remote_host, len(hits), len(wanted) - len(hits))
+        for entry in hits & set(entries):
+            objects[entries[entry]] = str(keys[entries[entry]])
+        stale = [source for source in stale if objects.get(source) != keys[source]]
+        if binary in hits:
+            replayed.extend(_replay(state, sources, keys, found))
+            links[target] = str(link_key)
+            config_module.save_state(cfg, state)
+            print(f"Restored {target} from the build cache.")
+            return
+        if hits:
+            print(f"Restored {len(hits)} object(s) from the build cache.")
+
+    # Objects already built elsewhere in the pool only need to be copied to the link host.
+    gather: Dict[str, List[str]] = {}
+    to_compile: List[str] = []
+    for source in stale:
+        holder = next(
+            (
+                host
+                for host in hosts[1:]
+                if keys[source] is not None
+                and objects_by_host.get(host, {}).get(source) == keys[source]
+            ),
+            None,
+        )
+        if holder:
+            gather.setdefault(holder, []).append(source)
+        else:
+            to_compile.append(source)
+    plan = plan_units(cfg, to_compile, keys, stats)
+    current = [source for source in sources if source not in stale]
+    replayed.extend(_replay(state, current, keys, found))
+
+    print(
+        f"Compiling {len(to_compile)} of {len(sources)} unit(s); "
+        f"{len(sources) - len(stale)} up to date."
+    )
+    if len(hosts) > 1 and stale:
+        print(
+            "Distribution: "
+            + ", ".join(f"{host}={len(plan.get(host, []))}" for host in hosts)
+        )
+
+    if stale:
+        try:
+            asyncio.run(
+                _build_units(
+                    cfg,
+                    plan,
+                    gather,
+                    keys,
+                    objects_by_host,
+                    stats,
+                    dry_run=dry_run,
+                    session=session,
+                    diagnostics=found,
+                    gate=gate,
+                )
+            )
+        finally:
+            # Keep the units that did compile so the next attempt only retries the failures.
+            if not dry_run:
+                for unit in stale:
+                    if unit in found and unit not in replayed:
+                        diagnostics_module.record(state, unit, keys[unit], found[unit])
+                config_module.save_state(cfg, state)
+
+    if not dry_run and link_key is not None and links.get(target) == link_key:
+        print(f"{target} is up to date.")
+    else:
+        with trace.span("link", target=target):
+            run_remote(
+                cfg.remote_host,
+                link_command(cfg, sources, target),
+                dry_run=dry_run,
+                stream_output=True,
+                session=session,
+            )
+        if not dry_run:
+            if link_key is not None:
+                links[target] = link_key
+            config_module.save_state(cfg, state)
+
+    if toolchain is not None:
+        built = [source for source in stale if objects.get(source) == keys[source]]
+        produced = {
+            entry: _remote_file(cfg.remote_obj_dir, object_name(unit))
+            for entry, unit in _cache_entries(toolchain, built, keys).items()
+        }
+        if link_key:
+            produced[cache.entry_key(toolchain, link_key)] = _remote_file(
+                cfg.remote_bin_dir, target
+            )
+        with trace.span("cache.store", entries=len(produced)):
+            try:
+                cache.prune(cfg, cache.store(cfg, produced, session=session), session=session)
+            except RemoteCommandError as exc:
+                # The target is already built; a cache that cannot be written only costs hits.
+                print(
+                    f"warning: could not update the build cache on {cfg.remote_host} "
+                    f"(exit code {exc.returncode})",
+                    file=sys.stderr,
+                )
+                if exc.stderr:
+                    print(exc.stderr, end="", file=sys.stderr)
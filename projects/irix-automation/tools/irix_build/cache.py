@@ -0,0 +1,178 @@
+"""Content-addressed cache of build outputs on the IRIX host.
+
+Entries live in ``remote_cache_dir`` named by a digest of the toolchain identity (the
+remote ``cc -version`` banner) and the unit or link key, which already covers the command
+line and every input digest. Restoring an entry is a remote ``cp``, so a hit costs no
+compile and no transfer. Hits ``touch`` their entry and eviction removes the oldest
+entries first, giving LRU order from ``ls -t`` alone.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import shlex
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from .config import BuildConfig
+from .ssh import (
+    SSHSession,
+    capture_remote,
+    quote_remote_path,
+    run_remote,
+    session_for,
+    sh_command,
+)
+
+
+@dataclass
+class CacheEntry:
+    name: str
+    size: int
+
+
+def enabled(cfg: BuildConfig) -> bool:
+    return cfg.cache_max_mb > 0
+
+
+def limit_bytes(cfg: BuildConfig) -> int:
+    return cfg.cache_max_mb * 1024 * 1024
+
+
+def toolchain_id(cfg: BuildConfig, *, session: SSHSession | None = None) -> str:
+    """Version banner of the remote compiler (MIPSpro answers ``-version``, gcc ``--version``)."""
+    compiler = shlex.quote(cfg.compiler)
+    banner = capture_remote(
+        cfg.remote_host,
+        sh_command(f"({compiler} -version || {compiler} --version) 2>&1; true"),
+        session=session or session_for(cfg),
+    )
+    return banner.strip()
+
+
+def entry_key(toolchain: str, key: str) -> str:
+    return hashlib.sha256(f"{toolchain}\0{key}".encode()).hexdigest()
+
+
+def _cache_dir(cfg: BuildConfig) -> str:
+    return quote_remote_path(cfg.remote_cache_dir)
+
+
+def parse_listing(text: str) -> List[CacheEntry]:
+    """Regular files from ``ls -lt`` output, newest first."""
+    entries = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) < 9 or not line.startswith("-"):
+            continue
+        try:
+            size = int(fields[4])
+        except ValueError:
+            continue
+        entries.append(CacheEntry(fields[-1], size))
+    return entries
+
+
+def restore(
+    cfg: BuildConfig,
+    wanted: Dict[str, str],
+    *,
+    session: SSHSession | None = None,
+) -> Set[str]:
+    """Copy cached entries to their destinations in one round trip; return the keys that hit.
+
+    ``wanted`` maps an entry key to the (already quoted) remote path it should be copied to.
+    """
+    if not wanted:
+        return set()
+    cache_dir = _cache_dir(cfg)
+    steps = []
+    for key, destination in wanted.items():
+        entry = f"{cache_dir}/{key}"
+        steps.append(
+            f"if [ -f {entry} ]; then mkdir -p `dirname {destination}` && "
+            f"cp {entry} {destination} && touch {entry} && echo {key}; fi"
+        )
+    output = capture_remote(
+        cfg.remote_host,
+        sh_command("; ".join(steps) + "; true"),
+        session=session or session_for(cfg),
+    )
+    return {line.strip() for line in output.splitlines()} & set(wanted)
+
+
+def store(
+    cfg: BuildConfig,
+    produced: Dict[str, str],
+    *,
+    session: SSHSession | None = None,
+) -> List[CacheEntry]:
+    """Copy freshly built outputs into the cache and return the resulting listing.
+
+    ``produced`` maps an entry key to the (already quoted) remote path of the output.
+    """
+    cache_dir = _cache_dir(cfg)
+    steps = []
+    for key, source in produced.items():
+        # Copy under a temporary name so an interrupted store never leaves a torn entry.
+        partial = f"{cache_dir}/{key}.$$"
+        steps.append(f"cp {source} {partial} && mv {partial} {cache_dir}/{key} || rm -f {partial}")
+    # One output that cannot be copied must not keep the others (or the listing) out.
+    output = capture_remote(
+        cfg.remote_host,
+        f"mkdir -p {cache_dir} && " + "; ".join(steps + [f"cd {cache_dir} && ls -lt"]),
+        session=session or session_for(cfg),
+    )
+    return parse_listing(output)
+
+
+def listing(cfg: BuildConfig, *, session: SSHSession | None = None) -> List[CacheEntry]:
+    cache_dir = _cache_dir(cfg)
+    output = capture_remote(
+        cfg.remote_host,
+        f"mkdir -p {cache_dir} && cd {cache_dir} && ls -lt",
+        session=session or session_for(cfg),
+    )
+    return parse_listing(output)
+
+
+def evictions(entries: List[CacheEntry], limit: int) -> List[CacheEntry]:
+    """Oldest entries to drop so the newest-first ``entries`` fit in ``limit`` bytes."""
+    kept = 0
+    dropped = []
+    for entry in entries:
+        if kept + entry.size <= limit:
+            kept += entry.size
+        else:
+            dropped.append(entry)
+    return dropped
+
+
+def prune(
+    cfg: BuildConfig,
+    entries: List[CacheEntry] | None = None,
+    *,
+    limit: int | None = None,
+    dry_run: bool = False,
+    session: SSHSession | None = None,
+) -> Tuple[int, int]:
+    """Evict least recently used entries beyond ``limit``; return ``(entries, bytes)`` freed."""
+    session = session or session_for(cfg)
+    if entries is None:
+        entries = listing(cfg, session=session)
+    dropped = evictions(entries, limit_bytes(cfg) if limit is None else limit)
+    if dropped:
+        names = " ".join(shlex.quote(entry.name) for entry in dropped)
+        run_remote(
+            cfg.remote_host,
+            f"cd {_cache_dir(cfg)} && rm -f {names}",
+            dry_run=dry_run,
+            session=session,
+        )
+    return len(dropped), sum(entry.size for entry in dropped)
+
+
+def record_lookups(state: dict, host: str, hits: int, misses: int) -> None:
+    counters = state.setdefault("cache", {}).setdefault(host, {"hits": 0, "misses": 0})
+    counters["hits"] += hits
+    counters["misses"] += misses
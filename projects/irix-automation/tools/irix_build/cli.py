@@ -3,33 +3,125 @@
 from __future__ import annotations
 
 import argparse
+import importlib
+import signal
 import sys
 from pathlib import Path
 from typing import List
 
-from .config import BuildConfig, load_config
-from . import build as build_module
+from .config import TRANSFER_MODES, BuildConfig, load_config
 from . import config as config_module
-from . import sync as sync_module
+from . import trace
+
+# Subcommand modules (and through them asyncio, sqlite3 and ctypes) are imported inside the
+# handlers that need them, so ``--help`` and quick hook invocations start fast.
+
+_FORWARDED_COMMANDS = ("sync", "build", "all")
 
 
 def _parse_args(argv: List[str]) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Automation tooling for IRIX demos")
     parser.add_argument("--config", type=Path, help="Path to configuration YAML", default=None)
     parser.add_argument("--dry-run", action="store_true", help="Show commands without executing")
+    parser.add_argument(
+        "--timings", action="store_true", help="Print a per-phase timing summary on exit"
+    )
+    parser.add_argument(
+        "--trace", type=Path, metavar="FILE", help="Write a Chrome trace-event JSON file"
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        help="Forward sync/build/all to a running 'serve' process (runs locally if none)",
+    )
+    parser.add_argument(
+        "--socket", type=Path, metavar="PATH", help="Server socket (default: one per config)"
+    )
+    parser.add_argument(
+        "--diagnostics",
+        type=Path,
+        metavar="FILE",
+        help="Write the build's compiler diagnostics (fresh and replayed) as JSON",
+    )
 
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     sync_parser = subparsers.add_parser("sync", help="Sync local sources to the IRIX host")
     sync_parser.add_argument("sources", nargs="*", help="Specific source files to sync")
+    sync_parser.add_argument(
+        "--mode",
+        choices=TRANSFER_MODES,
+        help=(
+            "Transfer with per-file scp, one compressed tar stream over ssh, "
+            "or a tar stream of block deltas for large changed files"
+        ),
+    )
 
     build_parser = subparsers.add_parser("build", help="Compile sources on the IRIX host")
     build_parser.add_argument("--sources", nargs="*", help="Sources to compile")
     build_parser.add_argument("--target", help="Output target name")
+    build_parser.add_argument(
+        "-j", "--jobs", type=int, help="Number of translation units to compile concurrently"
+    )
+    build_parser.add_argument(
+        "--agent",
+        action="store_true",
+        help="Compile through long-lived remote agents instead of one ssh call per unit",
+    )
 
     all_parser = subparsers.add_parser("all", help="Sync then build in a single run")
     all_parser.add_argument("--sources", nargs="*", help="Sources to sync/build")
     all_parser.add_argument("--target", help="Output target name")
+    all_parser.add_argument(
+        "--mode", choices=TRANSFER_MODES, help="Transfer mode for the sync step"
+    )
+    all_parser.add_argument(
+        "-j", "--jobs", type=int, help="Number of translation units to compile concurrently"
+    )
+    all_parser.add_argument(
+        "--agent",
+        action="store_true",
+        help="Compile through long-lived remote agents instead of one ssh call per unit",
+    )
+
+    watch_parser = subparsers.add_parser(
+        "watch", help="Sync and build whenever local sources change"
+    )
+    watch_parser.add_argument("--sources", nargs="*", help="Sources to sync/build")
+    watch_parser.add_argument("--target", help="Output target name")
+    watch_parser.add_argument("--mode", choices=TRANSFER_MODES, help="Transfer mode")
+    watch_parser.add_argument(
+        "-j", "--jobs", type=int, help="Number of translation units to compile concurrently"
+    )
+    watch_parser.add_argument(
+        "--agent",
+        action="store_true",
+        help="Compile through long-lived remote agents instead of one ssh call per unit",
+    )
+    watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        help="Seconds of quiet required before a burst of saves triggers a cycle",
+    )
+    watch_parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll the tree instead of using kernel file-change notifications",
+    )
+
+    cache_parser = subparsers.add_parser("cache", help="Inspect or trim the remote build cache")
+    cache_parser.add_argument("action", choices=("stats", "prune"))
+    cache_parser.add_argument(
+        "--max-mb", type=int, help="Prune down to this many MiB instead of cache_max_mb"
+    )
+
+    subparsers.add_parser(
+        "disconnect", help="Close the shared SSH master connections to the IRIX build hosts"
+    )
+
+    subparsers.add_parser(
+        "serve", help="Stay resident with warm state and connections for --server clients"
+    )
 
     return parser.parse_args(argv)
 
@@ -41,31 +133,271 @@ def _resolve_sources(cfg: BuildConfig, provided: List[str] | None) -> List[str]:
 
 
 def handle_sync(cfg: BuildConfig, sources: List[str] | None, *, dry_run: bool) -> None:
-    files = sync_module.determine_files_to_sync(cfg, sources)
-    sync_module.sync_files(cfg, files, dry_run=dry_run)
+    from . import sync as sync_module
 
+    for host in cfg.build_hosts:
+        if not dry_run:
+            sync_module.reconcile_manifest(cfg, host=host)
+        files = sync_module.determine_files_to_sync(cfg, sources, host=host)
+        sync_module.sync_files(cfg, files, dry_run=dry_run, host=host)
 
-def handle_build(cfg: BuildConfig, sources: List[str] | None, target: str | None, *, dry_run: bool) -> None:
+
+def handle_build(
+    cfg: BuildConfig,
+    sources: List[str] | None,
+    target: str | None,
+    *,
+    dry_run: bool,
+    diagnostics_file: Path | None = None,
+) -> None:
     resolved_sources = _resolve_sources(cfg, sources)
     if not resolved_sources:
         print("No sources available to build", file=sys.stderr)
         sys.exit(1)
     resolved_target = target or cfg.default_target
-    build_module.build_target(cfg, resolved_sources, resolved_target, dry_run=dry_run)
+    from . import build as build_module
+
+    build_module.build_target(
+        cfg,
+        resolved_sources,
+        resolved_target,
+        dry_run=dry_run,
+        diagnostics_file=diagnostics_file,
+    )
+
+
+def handle_all(
+    cfg: BuildConfig,
+    sources: List[str] | None,
+    target: str | None,
+    *,
+    dry_run: bool,
+    diagnostics_file: Path | None = None,
+) -> None:
+    """Sync then build; a real single-host run overlaps the two (see ``pipeline``)."""
+    resolved_sources = _resolve_sources(cfg, sources)
+    if dry_run or len(cfg.build_hosts) > 1 or not resolved_sources:
+        handle_sync(cfg, resolved_sources, dry_run=dry_run)
+        handle_build(
+            cfg, resolved_sources, target, dry_run=dry_run, diagnostics_file=diagnostics_file
+        )
+        return
+    from . import pipeline
+
+    pipeline.run_all(
+        cfg,
+        resolved_sources,
+        target or cfg.default_target,
+        diagnostics_file=diagnostics_file,
+    )
+
+
+def handle_watch(
+    cfg: BuildConfig,
+    sources: List[str] | None,
+    target: str | None,
+    *,
+    dry_run: bool,
+    debounce: float | None,
+    force_polling: bool,
+    diagnostics_file: Path | None = None,
+) -> None:
+    from . import watch as watch_module
+    from .ssh import RemoteCommandError
+
+    if debounce is None:
+        debounce = watch_module.DEFAULT_DEBOUNCE
+
+    def cycle() -> None:
+        try:
+            handle_sync(cfg, sources, dry_run=dry_run)
+            handle_build(
+                cfg, sources, target, dry_run=dry_run, diagnostics_file=diagnostics_file
+            )
+        except RemoteCommandError as exc:
+            print(f"watch: {exc}", file=sys.stderr)
+            if exc.stderr:
+                print(exc.stderr, end="", file=sys.stderr)
+
+    watcher = watch_module.Watcher(cfg.local_source_dir, force_polling=force_polling)
+    print(f"Watching {cfg.local_source_dir} ({watcher.backend}); press Ctrl+C to stop.")
+    try:
+        cycle()
+        watch_module.watch(watcher, cycle, debounce=debounce)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        watcher.close()
+
+
+def _serve_request(argv: List[str]) -> int:
+    """Run one forwarded command inside the server, reporting failures instead of dying."""
+    from .ssh import RemoteCommandError
+
+    code = 1
+    try:
+        args = _parse_args(argv)
+        code = _execute(args)
+        if args.dry_run:
+            # Dry runs may fill in state they never save; do not let later requests see it.
+            config_module.forget_state()
+    except SystemExit as exc:
+        # As the interpreter treats sys.exit: None is success, an int is the status, and
+        # anything else is printed and fails.
+        if exc.code is None:
+            code = 0
+        elif isinstance(exc.code, int):
+            code = exc.code
+        else:
+            print(exc.code, file=sys.stderr)
+        config_module.forget_state()
+    except RemoteCommandError as exc:
+        print(f"irix-build: {exc}", file=sys.stderr)
+        config_module.forget_state()
+    except Exception as exc:
+        # The server must outlive any one request; report it like the CLI would.
+        print(f"irix-build: {type(exc).__name__}: {exc}", file=sys.stderr)
+        config_module.forget_state()
+    return code
+
+
+def _interrupt(signum: int, frame: object) -> None:
+    raise KeyboardInterrupt
+
+
+def handle_serve(socket_path: Path) -> None:
+    from . import server as server_module
+
+    # Import the lazily loaded heavy modules now, only for their side effect of landing in
+    # sys.modules, so the first forwarded request does not pay for them.
+    for name in ("build", "sync"):
+        importlib.import_module(f".{name}", __package__)
+
+    config_module.retain_state()
+    # Stop cleanly (removing the socket) when a service manager sends SIGTERM.
+    signal.signal(signal.SIGTERM, _interrupt)
+
+    def ready(server: object) -> None:
+        print(f"irix-build server listening on {socket_path}; press Ctrl+C to stop.", flush=True)
+
+    try:
+        server_module.serve(socket_path, _serve_request, ready=ready)
+    finally:
+        config_module.retain_state(False)
+
+
+def handle_cache(cfg: BuildConfig, action: str, *, dry_run: bool, max_mb: int | None) -> None:
+    from . import cache as cache_module
+
+    location = f"{cfg.remote_host}:{cfg.remote_cache_dir}"
+    if action == "prune":
+        limit = None if max_mb is None else max_mb * 1024 * 1024
+        removed, freed = cache_module.prune(cfg, limit=limit, dry_run=dry_run)
+        print(f"Pruned {removed} entries ({freed / 1024 / 1024:.1f} MiB) from {location}.")
+        return
+    entries = cache_module.listing(cfg)
+    used = sum(entry.size for entry in entries)
+    counters = config_module.load_state(cfg).get("cache", {}).get(cfg.remote_host, {})
+    hits = counters.get("hits", 0)
+    lookups = hits + counters.get("misses", 0)
+    print(f"Cache {location}")
+    print(
+        f"  {len(entries)} entries, {used / 1024 / 1024:.1f} MiB "
+        f"of {cfg.cache_max_mb} MiB"
+    )
+    if lookups:
+        print(f"  {hits} of {lookups} lookups hit ({100 * hits / lookups:.0f}%)")
 
 
 def main(argv: List[str] | None = None) -> int:
-    args = _parse_args(argv or sys.argv[1:])
-    cfg = load_config(args.config)
+    argv = list(argv or sys.argv[1:])
+    args = _parse_args(argv)
+    if args.server and args.command in _FORWARDED_COMMANDS:
+        code = _forward(args, argv)
+        if code is not None:
+            return code
+    return _execute(args)
+
+
+def _forward(args: argparse.Namespace, argv: List[str]) -> int | None:
+    from . import server as server_module
+
+    socket_path = args.socket or config_module.server_socket_path(args.config)
+    code = server_module.forward(socket_path, argv)
+    if code is None:
+        print(f"No irix-build server on {socket_path}; running locally.", file=sys.stderr)
+    return code
+
+
+def _execute(args: argparse.Namespace) -> int:
+    recorder = trace.enable() if args.timings or args.trace else None
+    try:
+        with trace.span(f"cli.{args.command}"):
+            return _run(args)
+    finally:
+        if recorder is not None:
+            trace.disable()
+            _report(recorder, timings=args.timings, trace_path=args.trace)
+
+
+def _report(recorder: trace.Recorder, *, timings: bool, trace_path: Path | None) -> None:
+    if timings:
+        print("Timings:", file=sys.stderr)
+        for line in trace.summary(recorder):
+            print(f"  {line}", file=sys.stderr)
+    if trace_path is not None:
+        trace.write_chrome_trace(recorder, trace_path)
+        print(f"Trace written to {trace_path}", file=sys.stderr)
+
+
+def _run(args: argparse.Namespace) -> int:
+    with trace.span("config.load"):
+        cfg = load_config(args.config)
     cfg.local_source_dir = cfg.local_source_dir
+    if getattr(args, "mode", None):
+        cfg.transfer_mode = args.mode
+    if getattr(args, "jobs", None):
+        cfg.jobs = args.jobs
+    if getattr(args, "agent", False):
+        cfg.remote_agent = True
 
     if args.command == "sync":
         handle_sync(cfg, args.sources, dry_run=args.dry_run)
     elif args.command == "build":
-        handle_build(cfg, args.sources, args.target, dry_run=args.dry_run)
+        handle_build(
+            cfg,
+            args.sources,
+            args.target,
+            dry_run=args.dry_run,
+            diagnostics_file=args.diagnostics,
+        )
     elif args.command == "all":
-        handle_sync(cfg, args.sources, dry_run=args.dry_run)
-        handle_build(cfg, args.sources, args.target, dry_run=args.dry_run)
+        handle_all(
+            cfg,
+            args.sources,
+            args.target,
+            dry_run=args.dry_run,
+            diagnostics_file=args.diagnostics,
+        )
+    elif args.command == "watch":
+        handle_watch(
+            cfg,
+            args.sources,
+            args.target,
+            dry_run=args.dry_run,
+            debounce=args.debounce,
+            force_polling=args.poll,
+            diagnostics_file=args.diagnostics,
+        )
+    elif args.command == "cache":
+        handle_cache(cfg, args.action, dry_run=args.dry_run, max_mb=args.max_mb)
+    elif args.command == "serve":
+        handle_serve(args.socket or config_module.server_socket_path(args.config))
+    elif args.command == "disconnect":
+        from . import ssh as ssh_module
+
+        for host in cfg.build_hosts:
+            ssh_module.session_for(cfg, host).close(dry_run=args.dry_run)
     else:
         print(f"Unknown command {args.command}", file=sys.stderr)
         return 1
@@ -2,17 +2,25 @@
 
 from __future__ import annotations
 
+import contextlib
 import dataclasses
 import json
 import os
+import zlib
 from pathlib import Path
-from typing import List, Optional
-
-import yaml
+from typing import Dict, Iterator, List, Optional, Tuple
 
+# PyYAML and the SQLite state store are imported where they are used: the CLI runs from
+# editor save hooks, and most invocations are served by the compiled config cache below.
 
 DEFAULT_CONFIG_PATH = Path(__file__).with_name("config.yml")
-STATE_FILE_NAME = ".irix_build_state.json"
+STATE_FILE_NAME = ".irix_build_state.db"
+LEGACY_STATE_FILE_NAME = ".irix_build_state.json"
+STATE_VERSION = 2
+CONFIG_CACHE_VERSION = 1
+DEFAULT_CONTROL_PATH = "~/.ssh/irix-build-%C"
+DEFAULT_CONNECTION_PERSIST = 600
+TRANSFER_MODES = ("scp", "tar", "delta")
 
 
 @dataclasses.dataclass
@@ -23,8 +31,21 @@ class BuildConfig:
     local_source_dir: Path = Path("projects/irix-automation/irix_demo_local")
     remote_source_dir: str = "~/src/irix_demo"
     remote_bin_dir: str = "~/src/irix_demo/bin"
+    remote_obj_dir: str = "~/src/irix_demo/obj"
     default_sources: List[str] = dataclasses.field(default_factory=list)
     default_target: str = "hello_irix"
+    compiler: str = "cc"
+    cflags: List[str] = dataclasses.field(default_factory=list)
+    jobs: int = 4
+    hosts: List[str] = dataclasses.field(default_factory=list)
+    remote_cache_dir: str = "~/src/irix_demo/.cache"
+    cache_max_mb: int = 256
+    control_path: str = DEFAULT_CONTROL_PATH
+    connection_persist: int = DEFAULT_CONNECTION_PERSIST
+    transfer_mode: str = "scp"
+    compression: Optional[int] = None
+    ciphers: Optional[str] = None
+    remote_agent: bool = False
 
     @property
     def remote_host(self) -> str:
@@ -32,6 +53,16 @@ class BuildConfig:
             return f"{self.user}@{self.host}"
         return self.host
 
+    @property
+    def build_hosts(self) -> List[str]:
+        """The primary (linking) host followed by any extra compile hosts from ``hosts``."""
+        pool = [self.remote_host]
+        for entry in self.hosts:
+            remote = entry if "@" in entry or not self.user else f"{self.user}@{entry}"
+            if remote not in pool:
+                pool.append(remote)
+        return pool
+
     @property
     def state_file(self) -> Path:
         return self.local_source_dir / STATE_FILE_NAME
@@ -44,13 +75,81 @@ def _coerce_path(value: Optional[str]) -> Optional[Path]:
     return Path(expanded)
 
 
+def _stamp(path: Path) -> Optional[List[int]]:
+    """What must stay equal for a cached reading of ``path`` to still be valid."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size, st.st_ino]
+
+
+def _config_id(config_path: Path) -> str:
+    # zlib rather than hashlib: loading OpenSSL alone costs more than the rest of the lookup.
+    return f"{zlib.crc32(str(config_path.resolve()).encode()):08x}"
+
+
+def config_cache_file(config_path: Path) -> Path:
+    root = Path(os.environ.get("XDG_CACHE_HOME") or "~/.cache").expanduser()
+    return root / "irix-build" / f"config-{_config_id(config_path)}.json"
+
+
+def server_socket_path(config_path: Optional[Path] = None) -> Path:
+    """Default socket of the resident server for ``config_path`` (one server per config)."""
+    config_path = config_path or DEFAULT_CONFIG_PATH
+    root = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("XDG_CACHE_HOME") or "~/.cache"
+    return Path(root).expanduser() / "irix-build" / f"server-{_config_id(config_path)}.sock"
+
+
+def _read_cache(cache_file: Path) -> dict:
+    try:
+        with cache_file.open("r", encoding="utf-8") as fh:
+            cached = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cached, dict) or cached.get("version") != CONFIG_CACHE_VERSION:
+        return {}
+    return cached
+
+
+def _write_cache(cache_file: Path, cached: dict) -> None:
+    """Best effort: a read-only or full cache directory only costs the speed-up."""
+    cached["version"] = CONFIG_CACHE_VERSION
+    partial = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with partial.open("w", encoding="utf-8") as fh:
+            json.dump(cached, fh)
+        os.replace(partial, cache_file)
+    except (OSError, TypeError, ValueError):
+        partial.unlink(missing_ok=True)
+
+
 def load_config(path: Optional[Path] = None) -> BuildConfig:
-    """Load the build configuration from YAML, falling back to defaults."""
+    """Load the build configuration from YAML, falling back to defaults.
+
+    The parsed YAML and the discovered sources are kept in a per-user cache, valid while the
+    config file (and the source directory, for discovery) keep their modification stamps.
+    """
     config_path = path or DEFAULT_CONFIG_PATH
     data: dict = {}
-    if config_path.exists():
-        with config_path.open("r", encoding="utf-8") as fh:
-            data = yaml.safe_load(fh) or {}
+    stamp = _stamp(config_path)
+    cache_file = config_cache_file(config_path)
+    cached = _read_cache(cache_file) if stamp is not None else {}
+    dirty = False
+    if stamp is not None:
+        entry = cached.get("config", {})
+        if entry.get("path") == str(config_path.resolve()) and entry.get("stamp") == stamp:
+            data = entry["data"]
+        else:
+            import yaml
+
+            with config_path.open("r", encoding="utf-8") as fh:
+                data = yaml.safe_load(fh) or {}
+            cached = {
+                "config": {"path": str(config_path.resolve()), "stamp": stamp, "data": data}
+            }
+            dirty = True
 
     cfg = BuildConfig()
     for field in dataclasses.fields(BuildConfig):
@@ -65,8 +164,27 @@ def load_config(path: Optional[Path] = None) -> BuildConfig:
 
     # Discover default sources if not provided explicitly
     if not cfg.default_sources:
-        cfg.default_sources = _discover_sources(cfg.local_source_dir)
+        source_dir = str(cfg.local_source_dir)
+        source_stamp = _stamp(cfg.local_source_dir)
+        discovered = cached.get("sources", {})
+        if (
+            source_stamp is not None
+            and discovered.get("dir") == source_dir
+            and discovered.get("stamp") == source_stamp
+        ):
+            cfg.default_sources = list(discovered["names"])
+        else:
+            cfg.default_sources = _discover_sources(cfg.local_source_dir)
+            if stamp is not None and source_stamp is not None:
+                cached["sources"] = {
+                    "dir": source_dir,
+                    "stamp": source_stamp,
+                    "names": cfg.default_sources,
+                }
+                dirty = True
 
+    if dirty:
+        _write_cache(cache_file, cached)
     return cfg
 
 
@@ -76,14 +194,83 @@ def _discover_sources(local_dir: Path) -> List[str]:
     return sorted(str(path.name) for path in local_dir.glob("*.c"))
 
 
+# State kept in memory by a resident server, with the store's stamp when it was last in sync.
+_retained: Optional[Dict[Path, Tuple[Optional[List[int]], dict]]] = None
+
+
+def retain_state(enabled: bool = True) -> None:
+    """Keep loaded state in memory across calls while the store on disk is unchanged."""
+    global _retained
+    _retained = {} if enabled else None
+
+
+def forget_state() -> None:
+    """Drop retained state, e.g. after a failed run may have left unsaved changes in it."""
+    if _retained is not None:
+        _retained.clear()
+
+
+@contextlib.contextmanager
+def unretained() -> Iterator[None]:
+    """Read and write the store directly inside the block, for work split across threads."""
+    global _retained
+    retained, _retained = _retained, None
+    try:
+        yield
+    finally:
+        if retained is not None:
+            retained.clear()
+        _retained = retained
+
+
+def _store_stamp(path: Path) -> Optional[List[int]]:
+    """Stamp of the state store, including its write-ahead log, where commits land first."""
+    stamp = _stamp(path)
+    if stamp is None:
+        return None
+    return stamp + (_stamp(path.with_name(path.name + "-wal")) or [])
+
+
 def load_state(config: BuildConfig) -> dict:
-    if config.state_file.exists():
-        with config.state_file.open("r", encoding="utf-8") as fh:
-            return json.load(fh)
-    return {}
+    """Load the local state; unknown or legacy layouts start from scratch.
+
+    A JSON state file from earlier releases is imported into the SQLite store once.
+    """
+    if _retained is not None:
+        stamp, retained = _retained.get(config.state_file, (None, None))
+        if retained is not None and stamp == _store_stamp(config.state_file):
+            return retained
+    state = _load_state(config)
+    if _retained is not None:
+        _retained[config.state_file] = (_store_stamp(config.state_file), state)
+    return state
+
+
+def _load_state(config: BuildConfig) -> dict:
+    from . import state as state_store
+
+    loaded = state_store.load(config.state_file, STATE_VERSION)
+    if loaded is not None:
+        return loaded
+    legacy = config.local_source_dir / LEGACY_STATE_FILE_NAME
+    if legacy.exists():
+        try:
+            with legacy.open("r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            # Imported by a concurrent run, or cut short while it was being written.
+            data = {}
+        legacy.unlink(missing_ok=True)
+        if data.get("version") == STATE_VERSION:
+            state_store.save(config.state_file, data, STATE_VERSION)
+            return state_store.load(config.state_file, STATE_VERSION) or state_store.State(data)
+    return state_store.State(version=STATE_VERSION)
 
 
 def save_state(config: BuildConfig, state: dict) -> None:
-    config.state_file.parent.mkdir(parents=True, exist_ok=True)
-    with config.state_file.open("w", encoding="utf-8") as fh:
-        json.dump(state, fh, indent=2)
+    from . import state as state_store
+
+    state["version"] = STATE_VERSION
+    state_store.save(config.state_file, state, STATE_VERSION)
+    if _retained is not None:
+        _retained[config.state_file] = (_store_stamp(config.state_file), state)
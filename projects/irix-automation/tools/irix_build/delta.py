@@ -0,0 +1,180 @@
+"""rsync-style block deltas for large files whose previous content is on the host.
+
+IRIX hosts rarely have a usable rsync and no Python, so the host never computes anything:
+block signatures of each large file are recorded locally when it is sent, and the next
+change is expressed against them as runs of old blocks (replayed remotely with ``dd``) and
+literal bytes. The weak checksum is the rsync rolling sum; a short BLAKE2b hash confirms
+each match.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import shlex
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+DEFAULT_MIN_SIZE = 64 * 1024
+MIN_BLOCK = 512
+MAX_BLOCK = 64 * 1024
+_MOD = 1 << 16
+_STRONG_BYTES = 8
+# Send the whole file when the delta would save less than this fraction of it.
+_WORTHWHILE = 0.5
+
+
+@dataclass
+class Copy:
+    """``count`` consecutive old blocks starting at ``block``."""
+
+    block: int
+    count: int
+
+
+Op = Union[Copy, bytes]
+
+
+def block_size_for(size: int) -> int:
+    """About ``sqrt(size)``, rounded up to 512 bytes and clamped like rsync's default."""
+    block = int(math.sqrt(size))
+    block = (block + MIN_BLOCK - 1) // MIN_BLOCK * MIN_BLOCK
+    return max(MIN_BLOCK, min(MAX_BLOCK, block))
+
+
+def _weak(window: bytes) -> Tuple[int, int]:
+    length = len(window)
+    a = sum(window) % _MOD
+    b = sum((length - index) * byte for index, byte in enumerate(window)) % _MOD
+    return a, b
+
+
+def _strong(window: bytes) -> str:
+    return hashlib.blake2b(window, digest_size=_STRONG_BYTES).hexdigest()
+
+
+def signature(data: bytes, digest: str, block: Optional[int] = None) -> dict:
+    """Block signature of ``data`` (full blocks only; the short tail is always resent)."""
+    block = block or block_size_for(len(data))
+    weak: List[int] = []
+    strong: List[str] = []
+    for offset in range(0, len(data) - block + 1, block):
+        window = data[offset : offset + block]
+        a, b = _weak(window)
+        weak.append(a | (b << 16))
+        strong.append(_strong(window))
+    return {
+        "digest": digest,
+        "size": len(data),
+        "block": block,
+        "weak": weak,
+        "strong": "".join(strong),
+    }
+
+
+def compute_delta(data: bytes, sig: dict) -> List[Op]:
+    """Express ``data`` as old-block runs and literals against ``sig``."""
+    block = int(sig["block"])
+    width = _STRONG_BYTES * 2
+    strong = sig["strong"]
+    table: Dict[int, List[int]] = {}
+    for index, weak in enumerate(sig["weak"]):
+        table.setdefault(weak, []).append(index)
+
+    ops: List[Op] = []
+    literal = bytearray()
+
+    def emit_copy(index: int) -> None:
+        if literal:
+            ops.append(bytes(literal))
+            literal.clear()
+        previous = ops[-1] if ops else None
+        if isinstance(previous, Copy) and previous.block + previous.count == index:
+            previous.count += 1
+        else:
+            ops.append(Copy(index, 1))
+
+    length = len(data)
+    position = 0
+    rolling: Optional[Tuple[int, int]] = None
+    expected = 0
+    while position + block <= length:
+        if rolling is None:
+            rolling = _weak(data[position : position + block])
+        a, b = rolling
+        candidates = table.get(a | (b << 16))
+        match = None
+        if candidates:
+            window_hash = _strong(data[position : position + block])
+            # Prefer the block that continues the current run so copies coalesce.
+            ordered = sorted(candidates, key=lambda index: index != expected)
+            for index in ordered:
+                if strong[index * width : (index + 1) * width] == window_hash:
+                    match = index
+                    break
+        if match is not None:
+            emit_copy(match)
+            expected = match + 1
+            position += block
+            rolling = None
+            continue
+        outgoing = data[position]
+        literal.append(outgoing)
+        if position + block < length:
+            incoming = data[position + block]
+            a = (a - outgoing + incoming) % _MOD
+            b = (b - block * outgoing + a) % _MOD
+            rolling = (a, b)
+        position += 1
+    literal.extend(data[position:])
+    if literal:
+        ops.append(bytes(literal))
+    return ops
+
+
+def apply_delta(old: bytes, block: int, ops: List[Op]) -> bytes:
+    """Rebuild the new content locally (what the remote script does with ``dd``)."""
+    parts = []
+    for op in ops:
+        if isinstance(op, Copy):
+            parts.append(old[op.block * block : (op.block + op.count) * block])
+        else:
+            parts.append(op)
+    return b"".join(parts)
+
+
+def literal_size(ops: List[Op]) -> int:
+    return sum(len(op) for op in ops if isinstance(op, bytes))
+
+
+def worthwhile(ops: List[Op], size: int) -> bool:
+    return literal_size(ops) < size * _WORTHWHILE
+
+
+def remote_script(
+    name: str,
+    ops: List[Op],
+    *,
+    block: int,
+    old_size: int,
+    literal_names: List[str],
+) -> str:
+    """POSIX ``sh`` that rewrites ``name`` from its old copy plus shipped literal files.
+
+    The old copy's size is checked first so a file edited on the host is never patched.
+    """
+    target = shlex.quote(name)
+    partial = shlex.quote(f"{name}.irix_delta")
+    parts = []
+    literals = iter(literal_names)
+    for op in ops:
+        if isinstance(op, Copy):
+            parts.append(
+                f"dd if={target} bs={block} skip={op.block} count={op.count} 2>/dev/null"
+            )
+        else:
+            parts.append(f"cat {shlex.quote(next(literals))}")
+    message = shlex.quote(f"irix_build: {name} changed on the host")
+    check = f"[ `wc -c < {target}` -eq {old_size} ] || {{ echo {message} >&2; exit 3; }}"
+    body = "; ".join(parts) or ":"
+    return f"{check}\n{{ {body}; }} > {partial} && mv {partial} {target} || exit 4\n"
@@ -0,0 +1,107 @@
+"""Include dependency graph for the local source tree."""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from .config import BuildConfig
+from .digests import digest_files, scan_tree
+
+INCLUDE_RE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*"([^"\n]+)"', re.MULTILINE)
+SCANNED_SUFFIXES = (".c", ".h")
+
+
+def include_dirs(cfg: BuildConfig) -> List[str]:
+    """Relative ``-I`` directories from ``cflags``; they mirror the remote tree layout."""
+    dirs: List[str] = []
+    flags = iter(cfg.cflags)
+    for flag in flags:
+        if flag == "-I":
+            value = next(flags, "")
+        elif flag.startswith("-I"):
+            value = flag[2:]
+        else:
+            continue
+        if value and not os.path.isabs(value) and not value.startswith("~"):
+            dirs.append(os.path.normpath(value))
+    return dirs
+
+
+def _resolve(name: str, including: str, known: Set[str], search: List[str]) -> Optional[str]:
+    # Quoted includes look beside the including file first, then along -I.
+    candidates = [os.path.join(os.path.dirname(including), name)]
+    candidates.extend(os.path.join(directory, name) for directory in search)
+    for candidate in candidates:
+        normalized = os.path.normpath(candidate)
+        if normalized in known:
+            return normalized
+    return None
+
+
+def update_graph(cfg: BuildConfig, state: dict) -> Dict[str, List[str]]:
+    """Return ``{file: [direct local includes]}`` for ``local_source_dir``.
+
+    Raw ``#include`` names are cached in ``state["includes"]`` per content digest, so only
+    files whose content changed since the last run are re-read. System (``<...>``) includes
+    and headers that do not exist locally are ignored.
+    """
+    local_dir = cfg.local_source_dir
+    cached = state.get("includes", {})
+    stats = scan_tree(local_dir, SCANNED_SUFFIXES)
+    digests = digest_files(local_dir, stats, state.setdefault("digests", {}))
+    known = set(stats)
+    search = include_dirs(cfg)
+
+    scanned: Dict[str, dict] = {}
+    graph: Dict[str, List[str]] = {}
+    for name in sorted(stats):
+        digest = digests[name]
+        entry = cached.get(name)
+        if entry and entry.get("digest") == digest:
+            raw = list(entry["names"])
+        else:
+            matches = INCLUDE_RE.findall((local_dir / name).read_bytes())
+            raw = [match.decode("utf-8", "replace") for match in matches]
+        scanned[name] = {"digest": digest, "names": raw}
+        resolved = (_resolve(include, name, known, search) for include in raw)
+        graph[name] = sorted({header for header in resolved if header})
+
+    state["includes"] = scanned
+    return graph
+
+
+def header_closure(graph: Dict[str, List[str]], source: str) -> List[str]:
+    """Every local header ``source`` includes, directly or transitively."""
+    seen: Set[str] = set()
+    pending = list(graph.get(source, []))
+    while pending:
+        header = pending.pop()
+        if header in seen:
+            continue
+        seen.add(header)
+        pending.extend(graph.get(header, []))
+    seen.discard(source)
+    return sorted(seen)
+
+
+def affected_sources(
+    graph: Dict[str, List[str]],
+    changed: Iterable[str],
+    sources: Iterable[str],
+) -> List[str]:
+    """The subset of ``sources`` that must be rebuilt because something in ``changed`` did."""
+    changed_set = set(changed)
+    return [
+        source
+        for source in sources
+        if source in changed_set or changed_set.intersection(header_closure(graph, source))
+    ]
+
+
+def with_headers(graph: Dict[str, List[str]], sources: Iterable[str]) -> List[str]:
+    """``sources`` followed by the headers they pull in, without duplicates."""
+    ordered = list(dict.fromkeys(sources))
+    headers = sorted({header for source in ordered for header in header_closure(graph, source)})
+    return ordered + [header for header in headers if header not in ordered]
@@ -0,0 +1,186 @@
+"""Parse remote compiler output into structured diagnostics.
+
+MIPSpro reports a problem as a header line followed by an indented message, the offending
+source line and a caret::
+
+    cc-1020 cc: ERROR File = hello.c, Line = 3
+      The identifier "x" is undefined.
+
+        return x;
+               ^
+
+gcc (and the old ``cfe`` front end) use one line each. Paths are printed relative to the
+remote source directory, where compiles run, and are mapped back onto the local tree so an
+editor can jump straight to them.
+"""
+
+from __future__ import annotations
+
+import json
+import posixpath
+import re
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .config import BuildConfig
+
+SEVERITIES = ("error", "warning", "remark", "note")
+
+_MIPSPRO = re.compile(
+    r"^(?P<code>[A-Za-z]+-\d+) \w+: (?P<severity>ERROR|WARNING|REMARK|INFO)\w*"
+    r" File = (?P<file>.+), Line = (?P<line>\d+)\s*$"
+)
+_CFE = re.compile(
+    r"^cfe: (?P<severity>Error|Warning): (?P<file>[^,]+), line (?P<line>\d+): (?P<message>.*)$"
+)
+_GCC = re.compile(
+    r"^(?P<file>[^:\s][^:]*):(?P<line>\d+):(?:(?P<column>\d+):)? "
+    r"(?P<severity>fatal error|error|warning|note): (?P<message>.*)$"
+)
+_CARET = re.compile(r"^\s*\^\s*$")
+# MIPSpro indents the quoted source line and its caret by four columns.
+_EXCERPT_INDENT = 4
+
+
+@dataclass
+class Diagnostic:
+    file: str
+    line: int
+    severity: str
+    message: str
+    column: Optional[int] = None
+    code: Optional[str] = None
+
+    def format(self) -> str:
+        """gcc-style ``file:line:col: severity: message``, which editors already understand."""
+        position = f"{self.line}:{self.column}" if self.column else str(self.line)
+        code = f" [{self.code}]" if self.code else ""
+        return f"{self.file}:{position}: {self.severity}: {self.message}{code}"
+
+
+def _severity(text: str) -> str:
+    text = text.lower()
+    if text == "fatal error":
+        return "error"
+    if text == "info":
+        return "note"
+    return text
+
+
+def local_path(cfg: BuildConfig, reported: str) -> str:
+    """Map a path printed by the remote compiler onto the local source tree when possible."""
+    if not posixpath.isabs(reported):
+        return str(cfg.local_source_dir / posixpath.normpath(reported))
+    # Absolute paths only match when they end in the remote source directory's location
+    # below the (unknown) remote home, e.g. /usr/people/mario/src/irix_demo/x.h.
+    tail = cfg.remote_source_dir
+    if tail.startswith("~/"):
+        tail = tail[2:]
+    marker = "/" + tail.strip("/") + "/"
+    index = reported.find(marker)
+    if index == -1:
+        return reported
+    return str(cfg.local_source_dir / reported[index + len(marker) :])
+
+
+class Parser:
+    """Incremental parser fed one output line at a time, in arrival order."""
+
+    def __init__(self, cfg: BuildConfig) -> None:
+        self.cfg = cfg
+        self.diagnostics: List[Diagnostic] = []
+        self._pending: Optional[Diagnostic] = None
+        self._in_excerpt = False
+
+    def feed(self, line: str) -> None:
+        text = line.rstrip("\r\n")
+        if self._pending is not None and self._continue(text):
+            return
+        match = _MIPSPRO.match(text)
+        if match:
+            self._pending = Diagnostic(
+                file=local_path(self.cfg, match["file"]),
+                line=int(match["line"]),
+                severity=_severity(match["severity"]),
+                message="",
+                code=match["code"],
+            )
+            self._in_excerpt = False
+            return
+        match = _GCC.match(text) or _CFE.match(text)
+        if match:
+            groups = match.groupdict()
+            self.diagnostics.append(
+                Diagnostic(
+                    file=local_path(self.cfg, groups["file"]),
+                    line=int(groups["line"]),
+                    severity=_severity(groups["severity"]),
+                    message=groups["message"].strip(),
+                    column=int(groups["column"]) if groups.get("column") else None,
+                )
+            )
+
+    def _continue(self, text: str) -> bool:
+        """Absorb ``text`` into the pending MIPSpro block; ``False`` if the block has ended."""
+        pending = self._pending
+        assert pending is not None
+        if not self._in_excerpt:
+            if text.startswith(" ") and text.strip():
+                pending.message = f"{pending.message} {text.strip()}".strip()
+                return True
+            if not text.strip():
+                self._in_excerpt = True
+                return True
+        elif text.startswith(" "):
+            if _CARET.match(text):
+                pending.column = text.index("^") - _EXCERPT_INDENT + 1
+                self._finish()
+            return True
+        self._finish()
+        return False
+
+    def _finish(self) -> None:
+        if self._pending is not None:
+            self.diagnostics.append(self._pending)
+        self._pending = None
+        self._in_excerpt = False
+
+    def close(self) -> List[Diagnostic]:
+        self._finish()
+        return self.diagnostics
+
+
+def parse(cfg: BuildConfig, output: Iterable[str]) -> List[Diagnostic]:
+    parser = Parser(cfg)
+    for line in output:
+        parser.feed(line)
+    return parser.close()
+
+
+def record(state: dict, unit: str, key: Optional[str], found: List[Diagnostic]) -> None:
+    """Remember ``unit``'s diagnostics under the key of the inputs that produced them."""
+    section = state.setdefault("diagnostics", {})
+    if key is None:
+        section.pop(unit, None)
+        return
+    section[unit] = {"key": key, "items": [asdict(item) for item in found]}
+
+
+def cached(state: dict, unit: str, key: Optional[str]) -> Optional[List[Diagnostic]]:
+    """Diagnostics from the last compile of exactly these inputs, if they were recorded."""
+    entry = state.get("diagnostics", {}).get(unit)
+    if key is None or not entry or entry.get("key") != key:
+        return None
+    return [Diagnostic(**item) for item in entry["items"]]
+
+
+def write_report(path: Path, by_unit: Dict[str, List[Diagnostic]], replayed: Iterable[str]) -> None:
+    """JSON list of every diagnostic, each tagged with its unit and whether it was replayed."""
+    replayed = set(replayed)
+    entries = [
+        {"unit": unit, "replayed": unit in replayed, **asdict(item)}
+        for unit in sorted(by_unit)
+        for item in by_unit[unit]
+    ]
+    path.write_text(json.dumps(entries, indent=2) + "\n", encoding="utf-8")
@@ -0,0 +1,121 @@
+"""Content digests with a stat-keyed cache shared by sync, deps and build."""
+
+from __future__ import annotations
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+_READ_CHUNK = 1 << 16
+# Hashing releases the GIL, so a few threads overlap disk reads and SHA-256 work.
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+
+def _is_fresh(cached: Optional[dict], st: os.stat_result) -> bool:
+    return bool(
+        cached
+        and cached.get("inode") == st.st_ino
+        and cached.get("mtime_ns") == st.st_mtime_ns
+        and cached.get("size") == st.st_size
+    )
+
+
+def _hash_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(_READ_CHUNK), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _record(cache: Dict[str, dict], key: str, st: os.stat_result, digest: str) -> None:
+    cache[key] = {
+        "inode": st.st_ino,
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "digest": digest,
+    }
+
+
+def content_digest(path: Path, st: os.stat_result, cache: Dict[str, dict], key: str) -> str:
+    """Return the SHA-256 of ``path``, reusing the cached digest while the inode is untouched."""
+    cached = cache.get(key)
+    if _is_fresh(cached, st):
+        return str(cached["digest"])  # type: ignore[index]
+    digest = _hash_file(path)
+    _record(cache, key, st, digest)
+    return digest
+
+
+def scan_tree(root: Path, suffixes: Tuple[str, ...]) -> Dict[str, os.stat_result]:
+    """``{relative path: stat}`` for regular files under ``root`` ending in ``suffixes``.
+
+    Uses ``os.scandir`` so directory entries carry their file type and each file is
+    stat'ed once.
+    """
+    found: Dict[str, os.stat_result] = {}
+    pending = [(str(root), "")]
+    while pending:
+        directory, prefix = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, name + os.sep))
+                    elif entry.name.endswith(suffixes) and entry.is_file():
+                        found[name] = entry.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    return found
+
+
+def stat_files(root: Path, names: Iterable[str]) -> Dict[str, os.stat_result]:
+    """Stat ``names`` (relative to ``root``) with one ``os.scandir`` per directory.
+
+    Missing files are left out of the result.
+    """
+    by_directory: Dict[str, Dict[str, str]] = {}
+    for name in names:
+        directory, base = os.path.split(name)
+        by_directory.setdefault(directory, {})[base] = name
+    found: Dict[str, os.stat_result] = {}
+    for directory, wanted in by_directory.items():
+        try:
+            with os.scandir(root / directory) as entries:
+                for entry in entries:
+                    name = wanted.get(entry.name)
+                    if name is not None and entry.is_file():
+                        found[name] = entry.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+    return found
+
+
+def digest_files(
+    root: Path,
+    stats: Dict[str, os.stat_result],
+    cache: Dict[str, dict],
+    *,
+    workers: int = DEFAULT_WORKERS,
+) -> Dict[str, str]:
+    """Digest every file in ``stats``; only cache misses are read, on a thread pool."""
+    digests: Dict[str, str] = {}
+    misses = []
+    for name, st in stats.items():
+        cached = cache.get(name)
+        if _is_fresh(cached, st):
+            digests[name] = str(cached["digest"])  # type: ignore[index]
+        else:
+            misses.append(name)
+    if len(misses) > 1 and workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            hashed = list(pool.map(lambda name: _hash_file(root / name), misses))
+    else:
+        hashed = [_hash_file(root / name) for name in misses]
+    for name, digest in zip(misses, hashed):
+        _record(cache, name, stats[name], digest)
+        digests[name] = digest
+    return digests
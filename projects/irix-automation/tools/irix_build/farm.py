@@ -0,0 +1,72 @@
+"""Scheduling of compilation units across a pool of IRIX hosts."""
+
+from __future__ import annotations
+
+import statistics
+from typing import Dict, Iterable, List
+
+from .config import BuildConfig
+
+# Assumed cost before a host has been measured; only relative values matter.
+DEFAULT_SECONDS_PER_KIB = 0.5
+_SMOOTHING = 0.3
+
+
+def unit_weight(cfg: BuildConfig, source: str) -> float:
+    """Estimated compile cost of ``source`` in KiB of source text (at least 1)."""
+    try:
+        size = (cfg.local_source_dir / source).stat().st_size
+    except FileNotFoundError:
+        size = 0
+    return max(1.0, size / 1024)
+
+
+def seconds_per_kib(stats: Dict[str, dict], host: str) -> float:
+    """Measured compile rate of ``host``; unmeasured hosts are assumed to be typical."""
+    entry = stats.get(host)
+    if entry and "seconds_per_kib" in entry:
+        return float(entry["seconds_per_kib"])
+    known = [float(e["seconds_per_kib"]) for e in stats.values() if "seconds_per_kib" in e]
+    if known:
+        return statistics.median(known)
+    return DEFAULT_SECONDS_PER_KIB
+
+
+def record_compile(stats: Dict[str, dict], host: str, weight: float, seconds: float) -> None:
+    """Fold one compile timing into the host's exponentially smoothed rate."""
+    sample = seconds / max(weight, 1e-6)
+    entry = stats.setdefault(host, {})
+    previous = entry.get("seconds_per_kib")
+    if previous is None:
+        entry["seconds_per_kib"] = sample
+    else:
+        entry["seconds_per_kib"] = previous + _SMOOTHING * (sample - previous)
+    entry["units"] = int(entry.get("units", 0)) + 1
+
+
+def schedule(
+    units: Iterable[str],
+    weights: Dict[str, float],
+    hosts: List[str],
+    stats: Dict[str, dict],
+    *,
+    jobs: int = 1,
+) -> Dict[str, List[str]]:
+    """Assign ``units`` to ``hosts`` so the projected finish times stay balanced.
+
+    Units are placed largest first on the host that would finish them earliest given its
+    measured rate and ``jobs`` concurrent compiles; ties go to the host listed first, so
+    the linking host keeps work when the pool is idle.
+    """
+    plan: Dict[str, List[str]] = {host: [] for host in hosts}
+    finish = {host: 0.0 for host in hosts}
+    rates = {host: seconds_per_kib(stats, host) for host in hosts}
+    slots = max(1, jobs)
+    for unit in sorted(units, key=lambda name: (-weights[name], name)):
+        host = min(
+            hosts,
+            key=lambda h: (finish[h] + weights[unit] * rates[h] / slots, hosts.index(h)),
+        )
+        finish[host] += weights[unit] * rates[host] / slots
+        plan[host].append(unit)
+    return plan
@@ -0,0 +1,173 @@
+"""``all`` as a pipeline: compile units while the rest of the tree is still uploading.
+
+Changed files are sent to the primary host in batches, ordered so the most expensive units
+and their headers go first. Each batch is twice the size of the one before, so the first
+compile starts after a small transfer and a large sync still takes only a few round trips.
+The build runs on a worker thread at the same time. Each unit waits on an :class:`Arrivals`
+gate until every changed file it depends on has landed, then competes for a job slot as usual.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import build as build_module
+from . import config as config_module
+from . import deps
+from . import farm
+from . import sync as sync_module
+from . import trace
+from .config import BuildConfig
+from .ssh import RemoteCommandError
+
+FIRST_BATCH_BYTES = 64 * 1024
+
+
+class Arrivals:
+    """Tracks which changed files have landed; units wait until all of theirs have.
+
+    ``landed``/``failed`` are called from the syncing thread, ``wait`` from the build's event
+    loop, so waiters are woken with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self, needs: Dict[str, Set[str]]) -> None:
+        self._missing = {unit: set(files) for unit, files in needs.items()}
+        self._waiters: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]] = {}
+        self._error: Optional[RemoteCommandError] = None
+        self._lock = threading.Lock()
+
+    def landed(self, names: Iterable[str]) -> None:
+        arrived = set(names)
+        with self._lock:
+            ready = []
+            for unit, missing in self._missing.items():
+                if missing:
+                    missing -= arrived
+                    if not missing:
+                        ready.append(unit)
+            for unit in ready:
+                for loop, future in self._waiters.pop(unit, []):
+                    loop.call_soon_threadsafe(_resolve, future, None)
+
+    def failed(self, error: RemoteCommandError) -> None:
+        with self._lock:
+            self._error = error
+            waiters = [entry for entries in self._waiters.values() for entry in entries]
+            self._waiters.clear()
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future, error)
+
+    async def wait(self, unit: str) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._missing.get(unit):
+                return
+            if self._error is not None:
+                raise self._error
+            future = loop.create_future()
+            self._waiters.setdefault(unit, []).append((loop, future))
+        await future
+
+
+def _resolve(future: asyncio.Future, error: Optional[BaseException]) -> None:
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+def plan_batches(
+    units: List[str],
+    needs: Dict[str, Set[str]],
+    sizes: Dict[str, int],
+    *,
+    first_bytes: int = FIRST_BATCH_BYTES,
+) -> List[List[str]]:
+    """Group the files ``units`` need into batches that double in size, in unit order."""
+    batches: List[List[str]] = []
+    current: List[str] = []
+    current_bytes = 0
+    target = first_bytes
+    queued: Set[str] = set()
+    for unit in units:
+        for name in sorted(needs.get(unit, ())):
+            if name in queued:
+                continue
+            queued.add(name)
+            current.append(name)
+            current_bytes += sizes.get(name, 0)
+        # Close batches on unit boundaries so a batch never leaves a unit half-sent.
+        if current and current_bytes >= target:
+            batches.append(current)
+            current, current_bytes = [], 0
+            target *= 2
+    leftover = [name for name in sorted(sizes) if name not in queued]
+    current.extend(leftover)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def run_all(
+    cfg: BuildConfig,
+    sources: List[str],
+    target: str,
+    *,
+    diagnostics_file: Path | None = None,
+) -> None:
+    """Sync ``sources`` to the primary host and build ``target``, overlapping the two."""
+    host = cfg.remote_host
+    sync_module.reconcile_manifest(cfg, host=host)
+    changed = sync_module.determine_files_to_sync(cfg, sources, host=host)
+    if not changed:
+        print("No files changed; sync skipped.")
+        build_module.build_target(cfg, sources, target, diagnostics_file=diagnostics_file)
+        return
+
+    local_dir = cfg.local_source_dir
+    sizes = {str(path.relative_to(local_dir)): path.stat().st_size for path in changed}
+    graph = deps.update_graph(cfg, config_module.load_state(cfg))
+    needs = {
+        unit: {name for name in [unit, *deps.header_closure(graph, unit)] if name in sizes}
+        for unit in sources
+    }
+    order = sorted(sources, key=lambda unit: -farm.unit_weight(cfg, unit))
+    batches = plan_batches(order, needs, sizes)
+    arrivals = Arrivals(needs)
+    print(f"Pipelining {len(changed)} changed file(s) in {len(batches)} batch(es) with the build.")
+
+    outcome: List[BaseException] = []
+
+    def build() -> None:
+        try:
+            build_module.build_target(
+                cfg, sources, target, diagnostics_file=diagnostics_file, gate=arrivals.wait
+            )
+        except BaseException as exc:  # re-raised on the calling thread
+            outcome.append(exc)
+
+    # Sync and build each load and save state; keep their copies apart from any retained one.
+    with config_module.unretained():
+        worker = threading.Thread(target=build, name="irix-build-pipeline", daemon=True)
+        worker.start()
+        try:
+            for index, batch in enumerate(batches):
+                with trace.span("pipeline.batch", lane=host, batch=index, files=len(batch)):
+                    sync_module.sync_files(cfg, [local_dir / name for name in batch], host=host)
+                arrivals.landed(batch)
+        except RemoteCommandError as exc:
+            arrivals.failed(exc)
+            worker.join()
+            raise
+        except BaseException as exc:
+            arrivals.failed(RemoteCommandError(["sync"], 1, "", str(exc)))
+            worker.join()
+            raise
+        worker.join()
+    if outcome:
+        raise outcome[0]
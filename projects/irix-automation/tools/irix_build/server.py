@@ -0,0 +1,135 @@
+"""Resident irix-build server and the thin client that forwards commands to it.
+
+``cli serve`` keeps one process alive with its modules imported, the state store retained in
+memory and the pooled SSH sessions open. ``cli --server sync|build|all`` then connects to its
+Unix socket instead of doing the work itself. The request is a single JSON line
+``{"argv": [...], "cwd": ...}``. The server answers with JSON lines: ``{"stream": "stdout" |
+"stderr", "data": ...}`` while the command runs, then ``{"exit": code}``. Requests run one at
+a time, in arrival order, because they share the state and the host.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, List, Optional
+
+Runner = Callable[[List[str]], int]
+
+
+class _FrameStream(io.TextIOBase):
+    """Text stream that forwards every write to the client as one frame.
+
+    Output can arrive from helper threads (see ``ssh._tee``), so writes share a lock.
+    """
+
+    def __init__(self, wfile: BinaryIO, name: str, lock: threading.Lock) -> None:
+        self._wfile = wfile
+        self._name = name
+        self._lock = lock
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: str) -> int:
+        if data:
+            frame = json.dumps({"stream": self._name, "data": data}) + "\n"
+            with self._lock:
+                self._wfile.write(frame.encode("utf-8"))
+                self._wfile.flush()
+        return len(data)
+
+
+def handle_request(rfile: BinaryIO, wfile: BinaryIO, runner: Runner) -> None:
+    """Read one request from ``rfile``, run it with output redirected to ``wfile``."""
+    request = json.loads(rfile.readline() or b"{}")
+    lock = threading.Lock()
+    stdout = _FrameStream(wfile, "stdout", lock)
+    stderr = _FrameStream(wfile, "stderr", lock)
+    previous_cwd = os.getcwd()
+    code = 1
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            os.chdir(request.get("cwd") or previous_cwd)
+            code = runner(list(request.get("argv", [])))
+    finally:
+        os.chdir(previous_cwd)
+        wfile.write((json.dumps({"exit": code}) + "\n").encode("utf-8"))
+        wfile.flush()
+
+
+def serve(
+    socket_path: Path, runner: Runner, *, ready: Optional[Callable[[Any], None]] = None
+) -> None:
+    """Accept requests on ``socket_path`` until interrupted.
+
+    ``ready`` is called with the listening server once the socket exists; calling its
+    ``shutdown()`` from another thread stops the loop.
+    """
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            try:
+                handle_request(self.rfile, self.wfile, runner)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client went away (e.g. Ctrl+C in the editor); the run itself finished.
+                pass
+
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        if _listening(socket_path):
+            raise OSError(f"An irix-build server is already listening on {socket_path}")
+        socket_path.unlink()
+    with socketserver.UnixStreamServer(str(socket_path), Handler) as server:
+        try:
+            if ready is not None:
+                ready(server)
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def _listening(socket_path: Path) -> bool:
+    """Whether something accepts connections on ``socket_path``."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(socket_path))
+        except OSError:
+            return False
+    return True
+
+
+def forward(socket_path: Path, argv: List[str]) -> Optional[int]:
+    """Run ``argv`` on the server and relay its output; ``None`` if no server is listening."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(socket_path))
+    except OSError:
+        client.close()
+        return None
+    # Bound before sending: when the server runs in this same process (as in the tests),
+    # sys.stdout points at the server's client socket while the request runs.
+    stdout, stderr = sys.stdout, sys.stderr
+    with client, client.makefile("rwb") as channel:
+        request = {"argv": argv, "cwd": os.getcwd()}
+        channel.write((json.dumps(request) + "\n").encode("utf-8"))
+        channel.flush()
+        client.shutdown(socket.SHUT_WR)
+        for raw in channel:
+            frame = json.loads(raw)
+            if "exit" in frame:
+                return int(frame["exit"])
+            target = stderr if frame.get("stream") == "stderr" else stdout
+            target.write(frame.get("data", ""))
+            target.flush()
+    print("irix-build server closed the connection early", file=stderr)
+    return 1
@@ -2,9 +2,17 @@
 
 from __future__ import annotations
 
+import asyncio
+import dataclasses
+import os
 import shlex
 import subprocess
-from typing import Iterable, List, Optional
+import sys
+import tempfile
+import threading
+from typing import IO, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .config import DEFAULT_CONNECTION_PERSIST, DEFAULT_CONTROL_PATH, BuildConfig
 
 
 class RemoteCommandError(RuntimeError):
@@ -21,10 +29,152 @@ class RemoteCommandError(RuntimeError):
         self.stderr = stderr
 
 
+class RemoteTimeoutError(RemoteCommandError):
+    """Raised when a remote command exceeds its timeout and is killed."""
+
+    def __init__(self, command: List[str], timeout: float, stdout: str, stderr: str):
+        super().__init__(command, -1, stdout, stderr)
+        self.args = (
+            f"Command {' '.join(shlex.quote(arg) for arg in command)} timed out after "
+            f"{timeout:g}s.",
+        )
+        self.timeout = timeout
+
+
+@dataclasses.dataclass
+class CommandResult:
+    command: List[str]
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+LineHandler = Callable[[str, str], None]
+
+
+@dataclasses.dataclass
+class SSHSession:
+    """A multiplexed OpenSSH connection shared by every ssh/scp call to one host.
+
+    The first command started with these options becomes the ControlMaster; every
+    later ``ssh``/``scp`` rides the master socket instead of repeating the key
+    exchange. The master stays up for ``persist`` idle seconds so back-to-back CLI
+    invocations reuse it too. ``persist <= 0`` disables multiplexing.
+    """
+
+    host: str
+    identity_file: Optional[str] = None
+    control_path: str = DEFAULT_CONTROL_PATH
+    persist: int = DEFAULT_CONNECTION_PERSIST
+    ciphers: Optional[str] = None
+
+    @property
+    def multiplexed(self) -> bool:
+        return self.persist > 0
+
+    def options(self) -> List[str]:
+        opts: List[str] = []
+        if self.identity_file:
+            opts.extend(["-i", self.identity_file])
+        if self.ciphers:
+            # Only the master negotiates; later calls on its socket just carry the option.
+            opts.extend(["-o", f"Ciphers={self.ciphers}"])
+        if self.multiplexed:
+            opts.extend(
+                [
+                    "-o",
+                    "ControlMaster=auto",
+                    "-o",
+                    f"ControlPath={self.control_path}",
+                    "-o",
+                    f"ControlPersist={self.persist}",
+                ]
+            )
+        return opts
+
+    def close(self, *, dry_run: bool = False) -> None:
+        """Ask the master process to exit; a missing master is not an error."""
+        if not self.multiplexed:
+            return
+        command = ["ssh", "-o", f"ControlPath={self.control_path}", "-O", "exit", self.host]
+        if dry_run:
+            print(_format_command(command))
+            return
+        subprocess.run(command, check=False, capture_output=True, text=True)
+
+
+_SESSIONS: Dict[Tuple[str, Optional[str]], SSHSession] = {}
+
+
+def get_session(
+    host: str,
+    *,
+    identity_file: Optional[str] = None,
+    control_path: str = DEFAULT_CONTROL_PATH,
+    persist: int = DEFAULT_CONNECTION_PERSIST,
+    ciphers: Optional[str] = None,
+) -> SSHSession:
+    """Return the pooled session for ``host``, creating it on first use."""
+    key = (host, identity_file)
+    session = _SESSIONS.get(key)
+    if session is None:
+        session = SSHSession(host, identity_file, control_path, persist, ciphers)
+        _SESSIONS[key] = session
+    return session
+
+
+def session_for(cfg: "BuildConfig", host: Optional[str] = None) -> SSHSession:
+    """Return the pooled session for ``host`` (default: the primary host of ``cfg``)."""
+    return get_session(
+        host or cfg.remote_host,
+        identity_file=cfg.identity_file,
+        control_path=cfg.control_path,
+        persist=cfg.connection_persist,
+        ciphers=cfg.ciphers,
+    )
+
+
+def close_sessions(*, dry_run: bool = False) -> None:
+    """Tear down every pooled master connection."""
+    while _SESSIONS:
+        _, session = _SESSIONS.popitem()
+        session.close(dry_run=dry_run)
+
+
 def _format_command(cmd: Iterable[str]) -> str:
     return " ".join(shlex.quote(part) for part in cmd)
 
 
+def quote_remote_path(path: str) -> str:
+    """Shell-quote a remote path while leaving a leading ``~/`` free to expand."""
+    if path == "~":
+        return path
+    if path.startswith("~/"):
+        return "~/" + shlex.quote(path[2:])
+    return shlex.quote(path)
+
+
+def sh_command(script: str) -> str:
+    """Run a one-line Bourne shell ``script`` on the host, whatever the login shell is.
+
+    IRIX accounts log in with tcsh, which rejects ``if [ ... ]; then``, ``2>&1``,
+    ``var=value`` and ``$?``. Anything beyond plain ``&&`` chains goes through here.
+    tcsh cannot take a newline inside quotes, and it expands ``!`` even inside single
+    quotes, so neither is allowed in ``script``.
+    """
+    if "\n" in script or "!" in script:
+        raise ValueError(f"Remote sh script must be one line without '!': {script!r}")
+    return f"/bin/sh -c {shlex.quote(script)}"
+
+
+def _connection_options(identity_file: Optional[str], session: Optional[SSHSession]) -> List[str]:
+    if session is not None:
+        return session.options()
+    if identity_file:
+        return ["-i", identity_file]
+    return []
+
+
 def run_local(command: List[str], dry_run: bool = False) -> None:
     """Run a local command, optionally in dry-run mode."""
     if dry_run:
@@ -48,11 +198,10 @@ def run_remote(
     dry_run: bool = False,
     identity_file: Optional[str] = None,
     stream_output: bool = True,
+    session: Optional[SSHSession] = None,
 ) -> None:
     """Execute an SSH command, streaming output to the console."""
-    command: List[str] = ["ssh"]
-    if identity_file:
-        command.extend(["-i", identity_file])
+    command: List[str] = ["ssh", *_connection_options(identity_file, session)]
     command.append(host)
     command.append(remote_command)
 
@@ -61,10 +210,9 @@ def run_remote(
         return
 
     if stream_output:
-        process = subprocess.Popen(command)
-        returncode = process.wait()
+        returncode, stdout, stderr = _tee(command)
         if returncode != 0:
-            raise RemoteCommandError(command, returncode, "", "")
+            raise RemoteCommandError(command, returncode, stdout, stderr)
         return
 
     completed = subprocess.run(command, check=False, capture_output=True, text=True)
@@ -76,28 +224,112 @@ def run_remote(
         print(completed.stderr, end="")
 
 
+def _tee(command: List[str]) -> Tuple[int, str, str]:
+    """Run ``command``, echoing its output as it arrives while also capturing it."""
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    captured: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+
+    def pump(stream: IO[bytes], name: str) -> None:
+        for raw in stream:
+            line = raw.decode("utf-8", errors="replace")
+            captured[name].append(line)
+            echo_line(name, line)
+
+    assert process.stdout is not None and process.stderr is not None
+    reader = threading.Thread(target=pump, args=(process.stderr, "stderr"), daemon=True)
+    reader.start()
+    pump(process.stdout, "stdout")
+    reader.join()
+    returncode = process.wait()
+    return returncode, "".join(captured["stdout"]), "".join(captured["stderr"])
+
+
+def capture_remote(
+    host: str,
+    remote_command: str,
+    *,
+    identity_file: Optional[str] = None,
+    session: Optional[SSHSession] = None,
+) -> str:
+    """Execute an SSH command and return its stdout instead of printing it."""
+    command: List[str] = ["ssh", *_connection_options(identity_file, session)]
+    command.append(host)
+    command.append(remote_command)
+
+    completed = subprocess.run(command, check=False, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RemoteCommandError(command, completed.returncode, completed.stdout, completed.stderr)
+    return completed.stdout
+
+
+def stream_to_remote(
+    host: str,
+    remote_command: str,
+    producer: Callable[[IO[bytes]], None],
+    *,
+    dry_run: bool = False,
+    identity_file: Optional[str] = None,
+    session: Optional[SSHSession] = None,
+) -> None:
+    """Run an SSH command and feed its stdin from ``producer`` over the same channel."""
+    command: List[str] = ["ssh", *_connection_options(identity_file, session)]
+    command.append(host)
+    command.append(remote_command)
+
+    if dry_run:
+        print(_format_command(command))
+        return
+
+    # Output goes to files rather than the inherited descriptors so it is printed through
+    # sys.stdout, which the resident server relays to its client.
+    with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=stdout_file, stderr=stderr_file
+        )
+        assert process.stdin is not None
+        try:
+            producer(process.stdin)
+            process.stdin.close()
+        except BrokenPipeError:
+            # The remote side went away; its exit status and stderr explain why.
+            pass
+        returncode = process.wait()
+        stdout_file.seek(0)
+        stdout = stdout_file.read().decode("utf-8", errors="replace")
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode("utf-8", errors="replace")
+
+    if returncode != 0:
+        raise RemoteCommandError(command, returncode, stdout, stderr)
+    if stdout:
+        print(stdout, end="")
+    if stderr:
+        print(stderr, end="")
+
+
 def scp_files(
     files: List[str],
     destination: str,
     *,
     identity_file: Optional[str] = None,
     dry_run: bool = False,
+    session: Optional[SSHSession] = None,
+    compress: Optional[bool] = None,
 ) -> None:
     """Copy local files to the remote destination using scp."""
+    cmd = ["scp", *_connection_options(identity_file, session)]
+    cmd.extend(compression_options(compress, session))
+    cmd.extend(files)
+    cmd.append(destination)
     if dry_run:
-        cmd = ["scp"]
-        if identity_file:
-            cmd.extend(["-i", identity_file])
-        cmd.extend(files)
-        cmd.append(destination)
         print(_format_command(cmd))
         return
 
-    cmd = ["scp"]
-    if identity_file:
-        cmd.extend(["-i", identity_file])
-    cmd.extend(files)
-    cmd.append(destination)
     completed = subprocess.run(cmd, check=False, capture_output=True, text=True)
     if completed.returncode != 0:
         raise RemoteCommandError(cmd, completed.returncode, completed.stdout, completed.stderr)
@@ -105,3 +337,236 @@ def scp_files(
         print(completed.stdout, end="")
     if completed.stderr:
         print(completed.stderr, end="")
+
+
+# ---------------------------------------------------------------------------
+# transfer compression policy
+# ---------------------------------------------------------------------------
+
+# Payloads that gzip cannot shrink; compressing them only burns CPU on both ends.
+COMPRESSED_SUFFIXES = frozenset(
+    {".gz", ".tgz", ".z", ".bz2", ".xz", ".zip", ".jpg", ".jpeg", ".png", ".gif", ".mp3"}
+)
+# Candidate gzip levels in exploration order; 0 sends the stream uncompressed.
+COMPRESSION_LEVELS = (6, 1, 0)
+DEFAULT_COMPRESSION_LEVEL = 6
+# Batches smaller than this are dominated by latency and say nothing about throughput.
+MIN_SAMPLE_BYTES = 256 * 1024
+_THROUGHPUT_SMOOTHING = 0.3
+
+
+def compressible_fraction(files: Iterable[Tuple[str, int]]) -> float:
+    """Share of the batch's bytes (``(name, size)`` pairs) that is worth compressing."""
+    total = compressible = 0
+    for name, size in files:
+        total += size
+        if os.path.splitext(name)[1].lower() not in COMPRESSED_SUFFIXES:
+            compressible += size
+    return compressible / total if total else 1.0
+
+
+def choose_compression(
+    files: List[Tuple[str, int]],
+    stats: Dict[str, dict],
+    *,
+    forced: Optional[int] = None,
+) -> int:
+    """gzip level for one batch: 0 for mostly pre-compressed data, otherwise the level with
+    the best measured throughput on this link, trying each candidate once first."""
+    if forced is not None:
+        return forced
+    if compressible_fraction(files) < 0.25:
+        return 0
+    if sum(size for _, size in files) < MIN_SAMPLE_BYTES:
+        measured = [level for level in COMPRESSION_LEVELS if str(level) in stats]
+        if not measured:
+            return DEFAULT_COMPRESSION_LEVEL
+        return max(measured, key=lambda level: stats[str(level)]["bytes_per_second"])
+    for level in COMPRESSION_LEVELS:
+        if str(level) not in stats:
+            return level
+    return max(COMPRESSION_LEVELS, key=lambda level: stats[str(level)]["bytes_per_second"])
+
+
+def record_transfer(stats: Dict[str, dict], level: int, nbytes: int, seconds: float) -> None:
+    """Fold the effective (uncompressed) throughput of one batch into ``stats``."""
+    if nbytes < MIN_SAMPLE_BYTES or seconds <= 0:
+        return
+    sample = nbytes / seconds
+    entry = stats.setdefault(str(level), {})
+    previous = entry.get("bytes_per_second")
+    if previous is None:
+        entry["bytes_per_second"] = sample
+    else:
+        entry["bytes_per_second"] = previous + _THROUGHPUT_SMOOTHING * (sample - previous)
+    entry["samples"] = int(entry.get("samples", 0)) + 1
+
+
+def compression_options(compress: Optional[bool], session: Optional[SSHSession]) -> List[str]:
+    """``-o Compression=...`` for scp; a multiplexed connection keeps the master's setting."""
+    if compress is None or (session is not None and session.multiplexed):
+        return []
+    return ["-o", f"Compression={'yes' if compress else 'no'}"]
+
+
+# ---------------------------------------------------------------------------
+# asyncio backend
+# ---------------------------------------------------------------------------
+
+
+def echo_line(stream: str, line: str) -> None:
+    """Default line handler: forward remote output to the matching local stream."""
+    target = sys.stderr if stream == "stderr" else sys.stdout
+    target.write(line)
+    target.flush()
+
+
+async def run_command_async(
+    command: List[str],
+    *,
+    on_line: Optional[LineHandler] = echo_line,
+    timeout: Optional[float] = None,
+) -> CommandResult:
+    """Run ``command`` without blocking the event loop, streaming output line by line.
+
+    Output is handed to ``on_line`` as it arrives and also captured, so failures raise a
+    ``RemoteCommandError`` that carries stdout and stderr. Timeouts and task cancellation
+    kill the child process before propagating.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    captured: Dict[str, List[str]] = {"stdout": [], "stderr": []}
+
+    async def pump(stream: Optional[asyncio.StreamReader], name: str) -> None:
+        assert stream is not None
+        async for raw in stream:
+            line = raw.decode("utf-8", errors="replace")
+            captured[name].append(line)
+            if on_line is not None:
+                on_line(name, line)
+
+    async def finish() -> int:
+        await asyncio.gather(pump(process.stdout, "stdout"), pump(process.stderr, "stderr"))
+        return await process.wait()
+
+    try:
+        returncode = await asyncio.wait_for(finish(), timeout)
+    except asyncio.TimeoutError:
+        await _kill(process)
+        raise RemoteTimeoutError(
+            command, timeout or 0.0, "".join(captured["stdout"]), "".join(captured["stderr"])
+        ) from None
+    except asyncio.CancelledError:
+        await _kill(process)
+        raise
+
+    stdout = "".join(captured["stdout"])
+    stderr = "".join(captured["stderr"])
+    if returncode != 0:
+        raise RemoteCommandError(command, returncode, stdout, stderr)
+    return CommandResult(command, returncode, stdout, stderr)
+
+
+async def _kill(process: asyncio.subprocess.Process) -> None:
+    if process.returncode is None:
+        process.kill()
+        await process.wait()
+
+
+async def run_remote_async(
+    host: str,
+    remote_command: str,
+    *,
+    dry_run: bool = False,
+    identity_file: Optional[str] = None,
+    session: Optional[SSHSession] = None,
+    on_line: Optional[LineHandler] = echo_line,
+    timeout: Optional[float] = None,
+) -> CommandResult:
+    """Async variant of ``run_remote``."""
+    command: List[str] = ["ssh", *_connection_options(identity_file, session)]
+    command.append(host)
+    command.append(remote_command)
+    if dry_run:
+        print(_format_command(command))
+        return CommandResult(command, 0, "", "")
+    return await run_command_async(command, on_line=on_line, timeout=timeout)
+
+
+async def scp_files_async(
+    files: List[str],
+    destination: str,
+    *,
+    dry_run: bool = False,
+    identity_file: Optional[str] = None,
+    session: Optional[SSHSession] = None,
+    on_line: Optional[LineHandler] = echo_line,
+    timeout: Optional[float] = None,
+) -> CommandResult:
+    """Async variant of ``scp_files``."""
+    command = ["scp", *_connection_options(identity_file, session)]
+    command.extend(files)
+    command.append(destination)
+    if dry_run:
+        print(_format_command(command))
+        return CommandResult(command, 0, "", "")
+    return await run_command_async(command, on_line=on_line, timeout=timeout)
+
+
+async def relay_async(
+    source: List[str],
+    sink: List[str],
+    *,
+    dry_run: bool = False,
+) -> None:
+    """Pipe the stdout of ``source`` into the stdin of ``sink`` (e.g. host-to-host tar)."""
+    if dry_run:
+        print(f"{_format_command(source)} | {_format_command(sink)}")
+        return
+
+    read_fd, write_fd = os.pipe()
+    try:
+        producer = await asyncio.create_subprocess_exec(
+            *source,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=write_fd,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    finally:
+        os.close(write_fd)
+    try:
+        consumer = await asyncio.create_subprocess_exec(
+            *sink,
+            stdin=read_fd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except BaseException:
+        await _kill(producer)
+        raise
+    finally:
+        os.close(read_fd)
+
+    (_, produced_err), (consumed_out, consumed_err) = await asyncio.gather(
+        producer.communicate(), consumer.communicate()
+    )
+    if producer.returncode != 0:
+        raise RemoteCommandError(
+            source, producer.returncode or -1, "", produced_err.decode("utf-8", "replace")
+        )
+    if consumer.returncode != 0:
+        raise RemoteCommandError(
+            sink,
+            consumer.returncode or -1,
+            consumed_out.decode("utf-8", "replace"),
+            consumed_err.decode("utf-8", "replace"),
+        )
+
+
+def remote_command(host: str, command: str, *, session: Optional[SSHSession] = None) -> List[str]:
+    """The ``ssh`` argument vector that runs ``command`` on ``host``."""
+    return ["ssh", *_connection_options(None, session), host, command]
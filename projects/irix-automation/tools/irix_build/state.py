@@ -0,0 +1,230 @@
+"""SQLite store behind ``config.load_state``/``config.save_state``.
+
+Callers keep working with the nested dict layout (``digests``, ``synced[host]``, ...); the
+store flattens it into one row per entry and a save writes only the rows that changed since
+the state was loaded, so a run that touched three files does not rewrite 30k digests.
+
+Concurrent runs (an editor hook and a manual build) are expected. The database uses WAL mode,
+so readers never wait for a writer. Each save is one ``BEGIN IMMEDIATE`` transaction, so
+writers queue up behind each other instead of failing. Because only changed rows are written,
+two runs that touched different files both keep their updates. A store that SQLite reports as
+damaged is moved aside, and whatever rows can still be read are carried over. Rows are
+independent, so a lost row only means that one file is hashed, sent or compiled again.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+Row = Tuple[str, str, str]
+
+# How many dict levels of each section become row keys; other sections are stored whole.
+_SECTION_DEPTH = {
+    "digests": 1,
+    "includes": 1,
+    "hosts": 1,
+    "signatures": 1,
+    "diagnostics": 1,
+    "synced": 2,
+    "objects": 2,
+    "links": 2,
+    "cache": 2,
+    "transfers": 2,
+}
+# Marks a per-host map that exists but is empty (e.g. a host whose manifest was empty).
+_EMPTY_SCOPE = ""
+# Seconds to wait for another run's write transaction before giving up.
+BUSY_TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    section TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (section, scope, key)
+) WITHOUT ROWID
+"""
+
+
+class State(dict):
+    """Nested state dict that remembers the rows it was loaded from."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.rows: Dict[Row, str] = {}
+
+
+def _encode(value: object) -> str:
+    return json.dumps(value, separators=(",", ":"), sort_keys=True)
+
+
+def flatten(state: dict) -> Dict[Row, str]:
+    rows: Dict[Row, str] = {}
+    for section, value in state.items():
+        if section == "version":
+            continue
+        depth = _SECTION_DEPTH.get(section, 0) if isinstance(value, dict) else 0
+        if depth == 0:
+            rows[(section, "", "")] = _encode(value)
+        elif depth == 1:
+            for key, item in value.items():
+                rows[(section, "", str(key))] = _encode(item)
+        else:
+            for scope, inner in value.items():
+                if not inner:
+                    rows[(section, str(scope), _EMPTY_SCOPE)] = "null"
+                for key, item in inner.items():
+                    rows[(section, str(scope), str(key))] = _encode(item)
+    return rows
+
+
+def _unflatten(rows: Dict[Row, str], version: int) -> State:
+    state = State(version=version)
+    for (section, scope, key), text in rows.items():
+        value = json.loads(text)
+        depth = _SECTION_DEPTH.get(section, 0)
+        if depth == 0 or (depth == 1 and key == "" and not isinstance(value, dict)):
+            state[section] = value
+        elif depth == 1:
+            state.setdefault(section, {})[key] = value
+        else:
+            inner = state.setdefault(section, {}).setdefault(scope, {})
+            if key != _EMPTY_SCOPE:
+                inner[key] = value
+    state.rows = rows
+    return state
+
+
+def _connect(path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(path, isolation_level=None, timeout=BUSY_TIMEOUT)
+    try:
+        connection.execute("PRAGMA journal_mode = WAL")
+        # In WAL mode NORMAL cannot corrupt the store; a power cut only loses the last commits.
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute(_SCHEMA)
+    except BaseException:
+        connection.close()
+        raise
+    return connection
+
+
+def _is_damaged(exc: sqlite3.DatabaseError) -> bool:
+    # Locked or busy stores raise OperationalError; corrupt and non-database files do not.
+    return not isinstance(exc, sqlite3.OperationalError)
+
+
+def _salvage(path: Path) -> Dict[Row, str]:
+    """Rows of a damaged store that can still be read, in key order, up to the first bad page."""
+    rows: Dict[Row, str] = {}
+    try:
+        connection = sqlite3.connect(path, isolation_level=None, timeout=BUSY_TIMEOUT)
+    except sqlite3.DatabaseError:
+        return rows
+    try:
+        for section, scope, key, value in connection.execute(
+            "SELECT section, scope, key, value FROM entries"
+        ):
+            try:
+                json.loads(value)
+            except (TypeError, ValueError):
+                continue
+            rows[(str(section), str(scope), str(key))] = value
+    except sqlite3.DatabaseError:
+        pass
+    finally:
+        connection.close()
+    return rows
+
+
+def _quarantine(path: Path, exc: sqlite3.DatabaseError) -> Dict[Row, str]:
+    """Move a damaged store aside, keeping its readable rows, so the next save starts clean."""
+    rows = _salvage(path)
+    damaged = path.with_name(path.name + ".corrupt")
+    try:
+        os.replace(path, damaged)
+    except FileNotFoundError:
+        pass  # another run moved it aside first
+    for suffix in ("-wal", "-shm"):
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+    print(
+        f"State store {path} is damaged ({exc}); moved it to {damaged} "
+        f"and kept {len(rows)} readable entries.",
+        file=sys.stderr,
+    )
+    return rows
+
+
+def load(path: Path, version: int) -> Optional[State]:
+    """Read the store at ``path``; ``None`` if it is missing or from another layout version."""
+    if not path.exists():
+        return None
+    try:
+        connection = _connect(path)
+        try:
+            (stored_version,) = connection.execute("PRAGMA user_version").fetchone()
+            if stored_version != version:
+                return None
+            rows = {
+                (section, scope, key): value
+                for section, scope, key, value in connection.execute(
+                    "SELECT section, scope, key, value FROM entries"
+                )
+            }
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError as exc:
+        if not _is_damaged(exc):
+            raise
+        state = _unflatten(_quarantine(path, exc), version)
+        # None of it is on disk any more; the next save writes every row.
+        state.rows = {}
+        return state
+    return _unflatten(rows, version)
+
+
+def save(path: Path, state: dict, version: int) -> None:
+    """Write the rows of ``state`` that differ from what was loaded, in one transaction."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = flatten(state)
+    try:
+        _write(path, state, rows, version)
+    except sqlite3.DatabaseError as exc:
+        if not _is_damaged(exc) or not path.exists():
+            raise
+        _quarantine(path, exc)
+        _write(path, {}, rows, version)
+    if isinstance(state, State):
+        state.rows = rows
+
+
+def _write(path: Path, state: dict, rows: Dict[Row, str], version: int) -> None:
+    connection = _connect(path)
+    try:
+        # Take the write lock before reading the version, so the diff (or the reset below)
+        # cannot interleave with another run's save. Closing without COMMIT rolls it back.
+        connection.execute("BEGIN IMMEDIATE")
+        (stored_version,) = connection.execute("PRAGMA user_version").fetchone()
+        if isinstance(state, State) and stored_version == version:
+            previous = state.rows
+        else:
+            previous = {}
+            connection.execute("DELETE FROM entries")
+        changed = [(*row, value) for row, value in rows.items() if previous.get(row) != value]
+        removed = [row for row in previous if row not in rows]
+        connection.executemany(
+            "INSERT OR REPLACE INTO entries (section, scope, key, value) VALUES (?, ?, ?, ?)",
+            changed,
+        )
+        connection.executemany(
+            "DELETE FROM entries WHERE section = ? AND scope = ? AND key = ?", removed
+        )
+        connection.execute(f"PRAGMA user_version = {int(version)}")
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
@@ -2,41 +2,287 @@
 
 from __future__ import annotations
 
+import gzip
 import hashlib
+import io
+import tarfile
+import tempfile
+import time
 from pathlib import Path
-from typing import Iterable, List
+from typing import IO, Callable, Dict, Iterable, List, Tuple
 
 from . import config as config_module
-from .ssh import scp_files
+from . import delta
+from . import deps
+from . import trace
+from .config import TRANSFER_MODES
+from .digests import content_digest, digest_files, stat_files
+from .ssh import (
+    DEFAULT_COMPRESSION_LEVEL,
+    MIN_SAMPLE_BYTES,
+    RemoteCommandError,
+    SSHSession,
+    capture_remote,
+    choose_compression,
+    quote_remote_path,
+    record_transfer,
+    scp_files,
+    session_for,
+    sh_command,
+    stream_to_remote,
+)
 
+MANIFEST_NAME = ".irix_build_manifest"
+DELTA_DIR = ".irix_delta"
 
-def _file_signature(path: Path) -> str:
-    hasher = hashlib.sha256()
-    hasher.update(str(path.stat().st_mtime_ns).encode())
-    hasher.update(str(path.stat().st_size).encode())
-    return hasher.hexdigest()
+
+def _synced_for_host(state: dict, host: str) -> Dict[str, str]:
+    return state.setdefault("synced", {}).setdefault(host, {})
 
 
 def determine_files_to_sync(
     cfg: config_module.BuildConfig,
     requested_sources: Iterable[str] | None = None,
+    *,
+    host: str | None = None,
 ) -> List[Path]:
+    """Return the sources, and the local headers they include, whose content differs from
+    what ``host`` (default: the primary host) last confirmed."""
     local_dir = cfg.local_source_dir
     sources = list(requested_sources) if requested_sources else cfg.default_sources
+    host = host or cfg.remote_host
+    with trace.span("sync.scan", lane=host) as fields:
+        state = config_module.load_state(cfg)
+        sources = deps.with_headers(deps.update_graph(cfg, state), sources)
+        synced = _synced_for_host(state, host)
+        stats = stat_files(local_dir, sources)
+        digests = digest_files(local_dir, stats, state.setdefault("digests", {}))
+        changed = [
+            local_dir / source
+            for source in sources
+            if source in digests and synced.get(source) != digests[source]
+        ]
+
+        # Only the digest cache advances here; the synced map moves after a confirmed transfer.
+        config_module.save_state(cfg, state)
+        fields.update(files=len(sources), changed=len(changed))
+    return changed
+
+
+def parse_manifest(text: str) -> Dict[str, str]:
+    """Parse ``<sha256>  <relative path>`` manifest lines."""
+    manifest: Dict[str, str] = {}
+    for line in text.splitlines():
+        digest, _, name = line.partition("  ")
+        if digest and name:
+            manifest[name] = digest
+    return manifest
+
+
+def format_manifest(manifest: Dict[str, str]) -> str:
+    return "".join(f"{digest}  {name}\n" for name, digest in sorted(manifest.items()))
+
+
+def fetch_remote_manifest(
+    cfg: config_module.BuildConfig,
+    *,
+    host: str | None = None,
+    session: SSHSession | None = None,
+) -> Dict[str, str]:
+    host = host or cfg.remote_host
+    manifest_path = f"{cfg.remote_source_dir}/{MANIFEST_NAME}"
+    text = capture_remote(
+        host,
+        sh_command(f"cat {quote_remote_path(manifest_path)} 2>/dev/null || true"),
+        session=session or session_for(cfg, host),
+    )
+    return parse_manifest(text)
+
+
+def reconcile_manifest(
+    cfg: config_module.BuildConfig,
+    *,
+    host: str | None = None,
+    session: SSHSession | None = None,
+) -> None:
+    """Seed the synced map from the remote manifest when no local record exists for the host.
+
+    This keeps a deleted or fresh local state file from forcing a full re-upload.
+    """
+    host = host or cfg.remote_host
     state = config_module.load_state(cfg)
-    changed: List[Path] = []
+    if host in state.get("synced", {}):
+        return
+    with trace.span("sync.manifest", lane=host):
+        manifest = fetch_remote_manifest(cfg, host=host, session=session)
+    state.setdefault("synced", {})[host] = manifest
+    config_module.save_state(cfg, state)
+
+
+def _relative_name(cfg: config_module.BuildConfig, path: Path) -> str:
+    try:
+        return str(path.relative_to(cfg.local_source_dir))
+    except ValueError:
+        return path.name
+
+
+def _tar_producer(
+    cfg: config_module.BuildConfig,
+    files: List[Path],
+    members: List[Tuple[str, bytes]],
+    level: int = DEFAULT_COMPRESSION_LEVEL,
+) -> Callable[[IO[bytes]], None]:
+    def write_archive(stream: IO[bytes]) -> None:
+        # IRIX tar only understands plain ustar headers.
+        with tarfile.open(fileobj=stream, mode="w|", format=tarfile.USTAR_FORMAT) as archive:
+            for path in files:
+                archive.add(str(path), arcname=_relative_name(cfg, path), recursive=False)
+            for name, data in members:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+    def produce(stream: IO[bytes]) -> None:
+        if level == 0:
+            write_archive(stream)
+            return
+        with gzip.GzipFile(fileobj=stream, mode="wb", compresslevel=level) as compressed:
+            write_archive(compressed)  # type: ignore[arg-type]
+
+    return produce
+
+
+def _unpack_command(level: int) -> str:
+    return "gzip -dc | tar xf -" if level else "tar xf -"
+
 
-    for source in sources:
-        path = local_dir / source
-        if not path.exists():
+def _send_tar_stream(
+    cfg: config_module.BuildConfig,
+    files: List[Path],
+    manifest_text: str,
+    *,
+    host: str,
+    dry_run: bool,
+    session: SSHSession,
+    level: int = DEFAULT_COMPRESSION_LEVEL,
+) -> None:
+    remote_dir = quote_remote_path(cfg.remote_source_dir)
+    remote_cmd = f"mkdir -p {remote_dir} && cd {remote_dir} && {_unpack_command(level)}"
+    if dry_run:
+        print(f"# tar stream of {len(files)} file(s) + {MANIFEST_NAME} piped into:")
+    members = [(MANIFEST_NAME, manifest_text.encode("utf-8"))]
+    stream_to_remote(
+        host,
+        remote_cmd,
+        _tar_producer(cfg, files, members, level),
+        dry_run=dry_run,
+        session=session,
+    )
+
+
+Patches = Dict[str, Tuple[List[delta.Op], dict]]
+
+
+def _plan_delta(
+    cfg: config_module.BuildConfig,
+    files: List[Path],
+    previous: Dict[str, str],
+    signatures: Dict[str, dict],
+) -> Tuple[List[Path], Patches]:
+    """Split ``files`` into whole uploads and deltas against the copy already on the host."""
+    whole: List[Path] = []
+    patches: Patches = {}
+    for path in files:
+        name = _relative_name(cfg, path)
+        sig = signatures.get(name)
+        if sig is None or sig.get("digest") != previous.get(name):
+            whole.append(path)
             continue
-        signature = _file_signature(path)
-        if state.get(source) != signature:
-            changed.append(path)
-            state[source] = signature
+        data = path.read_bytes()
+        ops = delta.compute_delta(data, sig)
+        if delta.worthwhile(ops, len(data)):
+            patches[name] = (ops, sig)
+        else:
+            whole.append(path)
+    return whole, patches
 
-    config_module.save_state(cfg, state)
-    return changed
+
+def _send_delta_stream(
+    cfg: config_module.BuildConfig,
+    files: List[Path],
+    patches: Patches,
+    manifest_text: str,
+    *,
+    host: str,
+    dry_run: bool,
+    session: SSHSession,
+    level: int = DEFAULT_COMPRESSION_LEVEL,
+) -> None:
+    """One tar stream with whole files, literal runs and a script that applies the deltas.
+
+    The manifest is only moved into place once every delta applied.
+    """
+    members: List[Tuple[str, bytes]] = []
+    script: List[str] = []
+    for name, (ops, sig) in sorted(patches.items()):
+        literal_names = []
+        for op in ops:
+            if isinstance(op, bytes):
+                literal_names.append(f"{DELTA_DIR}/{len(members)}")
+                members.append((literal_names[-1], op))
+        script.append(
+            delta.remote_script(
+                name, ops, block=sig["block"], old_size=sig["size"], literal_names=literal_names
+            )
+        )
+    script.append(f"mv {DELTA_DIR}/manifest {MANIFEST_NAME}\n")
+    members.append((f"{DELTA_DIR}/manifest", manifest_text.encode("utf-8")))
+    members.append((f"{DELTA_DIR}/apply.sh", "".join(script).encode("utf-8")))
+
+    remote_dir = quote_remote_path(cfg.remote_source_dir)
+    # Saving and re-raising the exit status needs Bourne syntax, not the tcsh login shell.
+    remote_cmd = sh_command(
+        f"mkdir -p {remote_dir} && cd {remote_dir} && rm -rf {DELTA_DIR} && "
+        f"{_unpack_command(level)} && sh {DELTA_DIR}/apply.sh; "
+        f"status=$?; rm -rf {DELTA_DIR}; exit $status"
+    )
+    if dry_run:
+        print(
+            f"# tar stream of {len(files)} file(s) + {len(patches)} delta(s) "
+            f"+ {MANIFEST_NAME} piped into:"
+        )
+    stream_to_remote(
+        host,
+        remote_cmd,
+        _tar_producer(cfg, files, members, level),
+        dry_run=dry_run,
+        session=session,
+    )
+
+
+def _record_signatures(
+    cfg: config_module.BuildConfig,
+    state: dict,
+    files: List[Path],
+    manifest: Dict[str, str],
+) -> None:
+    """Remember block signatures of the large files the host now holds."""
+    signatures = state.setdefault("signatures", {})
+    for path in files:
+        name = _relative_name(cfg, path)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            continue
+        if len(data) < delta.DEFAULT_MIN_SIZE:
+            signatures.pop(name, None)
+            continue
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == manifest.get(name):
+            signatures[name] = delta.signature(data, digest)
+        else:
+            # Edited since it was sent; the next sync ships it whole.
+            signatures.pop(name, None)
 
 
 def sync_files(
@@ -44,10 +290,97 @@ def sync_files(
     files: List[Path],
     *,
     dry_run: bool = False,
+    session: SSHSession | None = None,
+    mode: str | None = None,
+    host: str | None = None,
 ) -> None:
+    """Upload ``files`` plus a refreshed manifest to ``host`` (default: the primary host)
+    using ``scp``, a single tar stream, or a tar stream of block deltas for large files."""
     if not files:
         print("No files changed; sync skipped.")
         return
 
-    destination = f"{cfg.remote_host}:{cfg.remote_source_dir}/"
-    scp_files([str(path) for path in files], destination, identity_file=cfg.identity_file, dry_run=dry_run)
+    mode = mode or cfg.transfer_mode
+    if mode not in TRANSFER_MODES:
+        raise ValueError(f"Unknown transfer mode {mode!r}; expected one of {TRANSFER_MODES}")
+    if mode == "scp" and any("/" in _relative_name(cfg, path) for path in files):
+        # scp drops every file into one directory; the manifest keys them by relative path.
+        print("Files in subdirectories changed; sending this batch as a tar stream.")
+        mode = "tar"
+    host = host or cfg.remote_host
+    session = session or session_for(cfg, host)
+    destination = f"{host}:{cfg.remote_source_dir}/"
+    state = config_module.load_state(cfg)
+    digests = state.setdefault("digests", {})
+    previous = dict(_synced_for_host(state, host))
+    manifest = dict(previous)
+    for path in files:
+        name = _relative_name(cfg, path)
+        manifest[name] = content_digest(path, path.stat(), digests, name)
+
+    manifest_text = format_manifest(manifest)
+    whole, patches = files, {}
+    if mode == "delta":
+        whole, patches = _plan_delta(cfg, files, previous, state.get("signatures", {}))
+    batch = [(path.name, path.stat().st_size) for path in whole]
+    batch.extend((name, delta.literal_size(ops)) for name, (ops, _) in patches.items())
+    payload = sum(size for _, size in batch) + len(manifest_text)
+    transfers = state.setdefault("transfers", {}).setdefault(host, {}).setdefault(mode, {})
+    level = choose_compression(batch, transfers, forced=cfg.compression)
+    # scp over a shared connection keeps the master's Compression setting, so a batch big
+    # enough for compression to matter goes as a gzip'd tar stream, which applies the level.
+    stream_scp = mode == "scp" and level > 0 and session.multiplexed and payload >= MIN_SAMPLE_BYTES
+    started = time.monotonic()
+    with trace.span(
+        "sync.transfer", lane=host, mode=mode, files=len(files), bytes=payload, level=level
+    ):
+        if mode == "delta":
+            try:
+                _send_delta_stream(
+                    cfg,
+                    whole,
+                    patches,
+                    manifest_text,
+                    host=host,
+                    dry_run=dry_run,
+                    session=session,
+                    level=level,
+                )
+            except RemoteCommandError:
+                if not patches:
+                    raise
+                # The host copy no longer matches what we recorded; resend those files whole.
+                print(f"Delta rejected by {host}; resending {len(files)} file(s) whole.")
+                _send_tar_stream(
+                    cfg,
+                    files,
+                    manifest_text,
+                    host=host,
+                    dry_run=dry_run,
+                    session=session,
+                    level=level,
+                )
+        elif mode == "tar" or stream_scp:
+            _send_tar_stream(
+                cfg, files, manifest_text, host=host, dry_run=dry_run, session=session, level=level
+            )
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                manifest_path = Path(tmp) / MANIFEST_NAME
+                manifest_path.write_text(manifest_text, encoding="utf-8")
+                scp_files(
+                    [str(path) for path in files] + [str(manifest_path)],
+                    destination,
+                    dry_run=dry_run,
+                    session=session,
+                    compress=level > 0,
+                )
+
+    if dry_run:
+        return
+    record_transfer(transfers, level, payload, time.monotonic() - started)
+    # The transfer raised on failure, so everything in this batch (and the manifest) has landed.
+    state.setdefault("synced", {})[host] = manifest
+    if mode == "delta":
+        _record_signatures(cfg, state, files, manifest)
+    config_module.save_state(cfg, state)
@@ -0,0 +1,128 @@
+"""Lightweight span recording for irix-build runs.
+
+Recording is off unless :func:`enable` has been called (``--timings`` / ``--trace``), in
+which case every :func:`span` appends one timed entry. Spans carry free-form arguments such
+as byte or file counts; numeric ones are totalled in the summary and all of them appear in
+the Chrome trace-event export (load it in ``chrome://tracing`` or Perfetto).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+
+@dataclass
+class Span:
+    name: str
+    start: float
+    duration: float
+    lane: str = "main"
+    args: Dict[str, object] = field(default_factory=dict)
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+
+
+_recorder: Optional[Recorder] = None
+
+
+def enable() -> Recorder:
+    global _recorder
+    _recorder = Recorder()
+    return _recorder
+
+
+def disable() -> None:
+    global _recorder
+    _recorder = None
+
+
+def active() -> Optional[Recorder]:
+    return _recorder
+
+
+@contextlib.contextmanager
+def span(name: str, *, lane: str = "main", **args: object) -> Iterator[Dict[str, object]]:
+    """Time the ``with`` block; the yielded dict can be filled with extra arguments."""
+    fields: Dict[str, object] = dict(args)
+    recorder = _recorder
+    if recorder is None:
+        yield fields
+        return
+    start = time.perf_counter()
+    try:
+        yield fields
+    except BaseException as exc:
+        returncode = getattr(exc, "returncode", None)
+        if returncode is not None:
+            fields["exit"] = returncode
+        fields.setdefault("error", type(exc).__name__)
+        raise
+    finally:
+        end = time.perf_counter()
+        recorder.spans.append(Span(name, start - recorder.origin, end - start, lane, fields))
+
+
+def summary(recorder: Recorder) -> List[str]:
+    """One line per span name: count, total and longest duration, summed numeric args."""
+    groups: Dict[str, List[Span]] = {}
+    for entry in recorder.spans:
+        groups.setdefault(entry.name, []).append(entry)
+    lines = [f"{'phase':<24} {'count':>5} {'total s':>9} {'max s':>8}  details"]
+    for name, entries in sorted(groups.items(), key=lambda item: min(s.start for s in item[1])):
+        totals: Dict[str, float] = {}
+        for entry in entries:
+            for key, value in entry.args.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    totals[key] = totals.get(key, 0) + value
+        details = " ".join(f"{key}={value:g}" for key, value in sorted(totals.items()))
+        total = sum(entry.duration for entry in entries)
+        longest = max(entry.duration for entry in entries)
+        lines.append(f"{name:<24} {len(entries):>5} {total:>9.3f} {longest:>8.3f}  {details}")
+    wall = time.perf_counter() - recorder.origin
+    lines.append(f"{'wall clock':<24} {'':>5} {wall:>9.3f}")
+    return lines
+
+
+def chrome_trace(recorder: Recorder) -> dict:
+    """The recorded spans as a Chrome trace-event document (complete ``X`` events)."""
+    pid = os.getpid()
+    lanes: Dict[str, int] = {}
+    events: List[dict] = []
+    for entry in recorder.spans:
+        tid = lanes.setdefault(entry.lane, len(lanes) + 1)
+        events.append(
+            {
+                "name": entry.name,
+                "ph": "X",
+                "ts": round(entry.start * 1e6),
+                "dur": round(entry.duration * 1e6),
+                "pid": pid,
+                "tid": tid,
+                "args": {key: _jsonable(value) for key, value in entry.args.items()},
+            }
+        )
+    for lane, tid in lanes.items():
+        events.append(
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane}}
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(recorder: Recorder, path: Path) -> None:
+    path.write_text(json.dumps(chrome_trace(recorder), indent=1) + "\n", encoding="utf-8")
+
+
+def _jsonable(value: object) -> object:
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
@@ -0,0 +1,246 @@
+"""Event-driven watch loop for the irix-build CLI.
+
+Kernel notifications (inotify on Linux, kqueue on macOS/BSD) only wake the loop; every
+wake-up is confirmed against a stat snapshot of the tree so editor temp files, dotfiles and
+the CLI's own state writes never trigger a rebuild. Without a usable kernel facility the
+loop falls back to polling that snapshot.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Protocol, Tuple
+
+Snapshot = Dict[str, Tuple[int, int, int]]
+
+DEFAULT_DEBOUNCE = 0.3
+DEFAULT_POLL_INTERVAL = 1.0
+
+
+def snapshot(root: Path) -> Snapshot:
+    """``{relative path: (inode, mtime_ns, size)}`` for every non-hidden file under ``root``."""
+    entries: Snapshot = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        for name in filenames:
+            if name.startswith("."):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries[os.path.relpath(path, root)] = (st.st_ino, st.st_mtime_ns, st.st_size)
+    return entries
+
+
+def _directories(root: Path) -> List[str]:
+    dirs = [str(root)]
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        dirs.extend(os.path.join(dirpath, name) for name in dirnames)
+    return dirs
+
+
+class _Backend(Protocol):
+    name: str
+
+    def wait(self, timeout: Optional[float]) -> bool: ...
+
+    def rearm(self, root: Path) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class _PollBackend:
+    name = "polling"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        delay = self.interval if timeout is None else min(self.interval, timeout)
+        time.sleep(max(0.0, delay))
+        return True
+
+    def rearm(self, root: Path) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class _InotifyBackend:
+    name = "inotify"
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    MASK = (
+        IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    )
+
+    def __init__(self, root: Path):
+        libc_name = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watched: set[str] = set()
+        self.rearm(root)
+
+    def rearm(self, root: Path) -> None:
+        for directory in _directories(root):
+            if directory in self._watched:
+                continue
+            if self._libc.inotify_add_watch(self._fd, directory.encode(), self.MASK) >= 0:
+                self._watched.add(directory)
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        while True:
+            try:
+                if not os.read(self._fd, 64 * 1024):
+                    break
+            except BlockingIOError:
+                break
+        return True
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _KqueueBackend:
+    name = "kqueue"
+
+    def __init__(self, root: Path):
+        self._kq = select.kqueue()
+        self._fds: List[int] = []
+        self.rearm(root)
+
+    def rearm(self, root: Path) -> None:
+        # Editors replace files on save, so re-open every vnode after each change.
+        self._release()
+        paths = _directories(root) + [str(root / name) for name in snapshot(root)]
+        fflags = (
+            select.KQ_NOTE_WRITE
+            | select.KQ_NOTE_EXTEND
+            | select.KQ_NOTE_DELETE
+            | select.KQ_NOTE_RENAME
+            | select.KQ_NOTE_ATTRIB
+        )
+        events = []
+        for path in paths:
+            try:
+                fd = os.open(path, getattr(os, "O_EVTONLY", os.O_RDONLY))
+            except OSError:
+                continue
+            self._fds.append(fd)
+            events.append(
+                select.kevent(
+                    fd,
+                    filter=select.KQ_FILTER_VNODE,
+                    flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                    fflags=fflags,
+                )
+            )
+        if events:
+            self._kq.control(events, 0, 0)
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        return bool(self._kq.control(None, 64, timeout))
+
+    def _release(self) -> None:
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+
+    def close(self) -> None:
+        self._release()
+        self._kq.close()
+
+
+class Watcher:
+    """Blocks until the non-hidden contents of ``root`` change."""
+
+    def __init__(
+        self,
+        root: Path,
+        *,
+        force_polling: bool = False,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        self.root = root
+        self._snapshot = snapshot(root)
+        self._backend = _create_backend(root, force_polling, poll_interval)
+
+    @property
+    def backend(self) -> str:
+        return self._backend.name
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Return ``True`` once a change is confirmed, ``False`` if ``timeout`` expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._backend.wait(remaining):
+                return False
+            current = snapshot(self.root)
+            if current != self._snapshot:
+                self._snapshot = current
+                self._backend.rearm(self.root)
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self) -> None:
+        self._backend.close()
+
+
+def _create_backend(root: Path, force_polling: bool, poll_interval: float) -> _Backend:
+    if not force_polling:
+        if sys.platform.startswith("linux"):
+            try:
+                return _InotifyBackend(root)
+            except (OSError, AttributeError):
+                pass
+        if hasattr(select, "kqueue"):
+            try:
+                return _KqueueBackend(root)
+            except OSError:
+                pass
+    return _PollBackend(poll_interval)
+
+
+def wait_for_burst(watcher: Watcher, debounce: float = DEFAULT_DEBOUNCE) -> None:
+    """Wait for a change, then until the tree has been quiet for ``debounce`` seconds."""
+    watcher.wait()
+    while watcher.wait(debounce):
+        pass
+
+
+def watch(
+    watcher: Watcher,
+    on_change: Callable[[], None],
+    *,
+    debounce: float = DEFAULT_DEBOUNCE,
+    max_cycles: Optional[int] = None,
+) -> None:
+    """Run ``on_change`` after every debounced burst of edits until interrupted."""
+    cycles = 0
+    while max_cycles is None or cycles < max_cycles:
+        wait_for_burst(watcher, debounce)
+        on_change()
+        cycles += 1
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""Convert whole directories of SGI icon sources in one run.
+
+Inputs are directories (searched recursively for `.fti`, `.ftr` and `.icon`
+files) or manifest files listing one source per line (blank lines and `#`
+comments are ignored; relative entries are resolved against the manifest's
+directory). Each source is written below the output directory, mirroring its
+path relative to the directory or manifest it was found in (sources given
+directly, or listed from outside the manifest's directory, go to the top).
+Two sources that would produce the same output are an error:
+
+* `.fti` files become `<name>.svg` (via `fti_to_svg`)
+* every source can also become a `<name>.appiconset` directory (via
+  `generate_irix_app_icons`)
+
+Sources are converted on a process pool, so the interpreter and Pillow are
+loaded once per worker instead of once per icon. A source that fails is
+reported and skipped, and the run continues; the exit status is 1 if any
+source failed. If a worker process dies, the sources it may have taken down
+are retried one at a time, so only the one that kills its worker fails.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import fti_to_svg
+
+SOURCE_SUFFIXES = (".fti", ".ftr", ".icon")
+FORMATS = ("svg", "iconset")
+
+
+@dataclass(frozen=True)
+class Job:
+    source: Path
+    output_base: Path  # output path without suffix, e.g. out/iconlib/generic.exec.closed
+    formats: Tuple[str, ...]
+    ftr_type: str | None = None
+    opened: bool = False
+    keying: str = "global"
+    overwrite: bool = True
+    sizes: Tuple[int, ...] | None = None
+
+
+@dataclass
+class Result:
+    source: Path
+    written: List[Path] = field(default_factory=list)
+    error: str | None = None
+    seconds: float = 0.0
+
+
+# ---------------------------------------------------------------------------
+# Source discovery
+# ---------------------------------------------------------------------------
+
+def _is_source(path: Path) -> bool:
+    return path.is_file() and path.suffix.lower() in SOURCE_SUFFIXES
+
+
+def read_manifest(path: Path) -> List[Path]:
+    sources: List[Path] = []
+    for raw in path.read_text().splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        entry = Path(line).expanduser()
+        sources.append(entry if entry.is_absolute() else path.parent / entry)
+    return sources
+
+
+def _relative_to(path: Path, root: Path) -> Path:
+    """`path` below `root`, or just its name when it lies elsewhere."""
+    try:
+        relative = path.relative_to(root)
+    except ValueError:
+        return Path(path.name)
+    return Path(path.name) if ".." in relative.parts else relative
+
+
+def collect_sources(inputs: Iterable[Path]) -> List[Tuple[Path, Path]]:
+    """`(source, path relative to its input)` pairs, without duplicates, in a stable order.
+
+    Raises `ValueError` when two different sources would be written to the same output.
+    """
+    found: Dict[Path, Path] = {}
+    for item in inputs:
+        if item.is_dir():
+            for path in sorted(item.rglob("*")):
+                if _is_source(path):
+                    found.setdefault(path.resolve(), path.relative_to(item))
+        elif _is_source(item):
+            found.setdefault(item.resolve(), Path(item.name))
+        elif item.is_file():
+            for path in read_manifest(item):
+                # Missing manifest entries are kept so they are reported as failures.
+                found.setdefault(path.resolve(), _relative_to(path, item.parent))
+        else:
+            raise FileNotFoundError(f"No such input: {item}")
+
+    outputs: Dict[Path, Path] = {}
+    for source, relative in found.items():
+        other = outputs.setdefault(relative.with_suffix(""), source)
+        if other != source:
+            raise ValueError(f"{other} and {source} would both be written as {relative.with_suffix('')}")
+    return list(found.items())
+
+
+def plan_jobs(sources: Sequence[Tuple[Path, Path]], output_dir: Path, args: argparse.Namespace) -> List[Job]:
+    jobs = []
+    for source, relative in sources:
+        formats = tuple(f for f in args.formats if f != "svg" or source.suffix.lower() == ".fti")
+        if not formats:
+            continue
+        jobs.append(
+            Job(
+                source=source,
+                output_base=output_dir / relative.with_suffix(""),
+                formats=formats,
+                ftr_type=args.ftr_type,
+                opened=args.opened,
+                keying=args.keying,
+                overwrite=not args.no_overwrite,
+                sizes=tuple(args.sizes) if args.sizes else None,
+            )
+        )
+    return jobs
+
+
+# ---------------------------------------------------------------------------
+# Conversion (runs in the worker processes)
+# ---------------------------------------------------------------------------
+
+def _write_svg(job: Job) -> Path:
+    target = job.output_base.with_name(job.output_base.name + ".svg")
+    if job.overwrite or not target.exists():
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(fti_to_svg.shapes_to_svg(fti_to_svg.parse_fti(job.source)))
+    return target
+
+
+def _write_iconset(job: Job) -> Path:
+    # Imported here so SVG-only runs do not need Pillow.
+    import generate_irix_app_icons as icons
+
+    target = job.output_base.with_name(job.output_base.name + ".appiconset")
+    suffix = job.source.suffix.lower()
+    icons.export_icons(
+        target,
+        source_icon=job.source if suffix == ".icon" else None,
+        fti_path=job.source if suffix == ".fti" else None,
+        ftr_path=job.source if suffix == ".ftr" else None,
+        ftr_type=job.ftr_type,
+        opened=job.opened,
+        overwrite=job.overwrite,
+        keying=job.keying,
+        sizes=job.sizes,
+    )
+    return target
+
+
+def convert(job: Job) -> Result:
+    """Convert one source; errors are returned in the result instead of raised."""
+    result = Result(job.source)
+    started = time.perf_counter()
+    try:
+        if not job.source.exists():
+            raise FileNotFoundError(f"No such file: {job.source}")
+        if "svg" in job.formats:
+            result.written.append(_write_svg(job))
+        if "iconset" in job.formats:
+            result.written.append(_write_iconset(job))
+    except Exception as exc:  # reported per source; the batch continues
+        result.error = f"{type(exc).__name__}: {exc}"
+        if os.environ.get("IRIX_ICONS_TRACEBACK"):
+            result.error += "\n" + traceback.format_exc()
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def _report(result: Result, done: int, total: int) -> None:
+    width = len(str(total))
+    prefix = f"[{done:>{width}}/{total}]"
+    if result.error:
+        print(f"{prefix} FAILED {result.source}: {result.error}", file=sys.stderr, flush=True)
+    else:
+        print(f"{prefix} ok {result.source} ({result.seconds:.2f}s)", flush=True)
+
+
+def _run_pool(
+    jobs: Sequence[Job], workers: int, finish: Callable[[Result], None]
+) -> Tuple[List[Job], List[Job]]:
+    """Convert `jobs` on one pool, at most `workers` at a time, passing each result to `finish`.
+
+    When a worker dies (e.g. killed for memory) the pool fails every job still in flight, so
+    this returns `(in_flight, not_started)`: any of the former may have killed it.
+    """
+    waiting = deque(jobs)
+    in_flight: Dict[Future, Job] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while waiting or in_flight:
+            try:
+                while waiting and len(in_flight) < workers:
+                    in_flight[pool.submit(convert, waiting[0])] = waiting[0]
+                    waiting.popleft()
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future.result())
+                    del in_flight[future]
+            except BrokenProcessPool:
+                break
+        else:
+            return [], []
+    # The pool is shut down, so every future left has either finished or failed.
+    lost = []
+    for future, job in in_flight.items():
+        if future.exception() is None:
+            finish(future.result())
+        else:
+            lost.append(job)
+    return lost, list(waiting)
+
+
+def run_batch(jobs: Sequence[Job], workers: int) -> List[Result]:
+    """Convert `jobs` on `workers` processes (inline when 1), reporting each as it finishes."""
+    results: List[Result] = []
+
+    def finish(result: Result) -> None:
+        results.append(result)
+        _report(result, len(results), len(jobs))
+
+    if workers <= 1:
+        for job in jobs:
+            finish(convert(job))
+        return results
+
+    pending: List[Job] = list(jobs)
+    while pending:
+        suspects, pending = _run_pool(pending, workers, finish)
+        if suspects:
+            print(
+                f"A worker process died; retrying {len(suspects)} source(s) one at a time",
+                file=sys.stderr,
+                flush=True,
+            )
+        for job in suspects:
+            # Alone in its own pool, a source that kills its worker takes nothing else with it.
+            lost, _ = _run_pool([job], 1, finish)
+            if lost:
+                finish(Result(job.source, error="worker process died while converting it"))
+    return results
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "inputs",
+        type=Path,
+        nargs="+",
+        help="Directories of .fti/.ftr/.icon sources, individual sources, or manifest files",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        required=True,
+        help="Directory to write the converted icons into",
+    )
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        choices=FORMATS,
+        default=list(FORMATS),
+        help="What to produce: SVG (for .fti sources) and/or macOS iconsets",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes (default: CPU count; 1 converts in this process)",
+    )
+    parser.add_argument(
+        "--ftr-type",
+        type=str,
+        default=None,
+        help="TYPE block to render from .ftr sources (default: the first one)",
+    )
+    parser.add_argument(
+        "--opened",
+        action="store_true",
+        help="Render the opened state for icons with conditionals",
+    )
+    parser.add_argument(
+        "--keying",
+        choices=("global", "flood"),
+        default="global",
+        help="Background removal for .icon sources (see generate_irix_app_icons.py)",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Only export these iconset pixel sizes (e.g. 16 32 64)",
+    )
+    parser.add_argument(
+        "--no-overwrite",
+        action="store_true",
+        help="Skip writing files that already exist",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    try:
+        sources = collect_sources(args.inputs)
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    jobs = plan_jobs(sources, args.output, args)
+    if not jobs:
+        print("No .fti, .ftr or .icon sources found for the requested formats.")
+        return 0
+
+    workers = max(1, min(args.jobs, len(jobs)))
+    print(f"Converting {len(jobs)} source(s) with {workers} worker(s) into {args.output}")
+    started = time.perf_counter()
+    results = run_batch(jobs, workers)
+    failed = [result for result in results if result.error]
+    print(
+        f"Converted {len(results) - len(failed)} of {len(results)} source(s) "
+        f"in {time.perf_counter() - started:.1f}s; {len(failed)} failed"
+    )
+    for result in sorted(failed, key=lambda item: str(item.source)):
+        print(f"  {result.source}: {result.error.splitlines()[0]}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
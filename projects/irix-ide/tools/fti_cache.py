@@ -0,0 +1,229 @@
+"""Cache of parsed IconSmith `.fti` geometry, shared by the icon tools.
+
+Parsing an `.fti` file means running regexes over every line, and FTR rules
+include the same layers (e.g. the `generic.exec` bodies) over and over. Parsed
+shapes are therefore kept at two levels:
+
+* in process, in an LRU keyed by file content, so a batch worker parses each
+  shared layer once;
+* on disk, in a compact binary form keyed by a SHA-256 of the file content,
+  so later runs and other workers skip the text parser entirely.
+
+Each tool resolves colours differently, so cache entries are also keyed by a
+parser *flavor* (e.g. `"svg-1"`). Bump the flavor's version whenever that
+parser's output changes.
+
+On-disk format (little-endian)::
+
+    header   4s magic "FTIC", H format version, H reserved, I shape count
+    strings  I count, then per string: H byte length + UTF-8 bytes
+    shapes   per shape: B kind (0 polygon, 1 polyline), B close,
+             i fill string index, i stroke string index (-1 = none),
+             d stroke width, I vertex count
+    vertices d[2 * total vertices], x/y pairs for all shapes in order
+
+The cache directory is `$IRIX_FTI_CACHE_DIR`, or `irix-ide/fti` under
+`$XDG_CACHE_HOME` (default `~/.cache`). Setting `IRIX_FTI_CACHE_DIR` to an
+empty string turns the disk cache off.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+FORMAT_VERSION = 1
+MAGIC = b"FTIC"
+LRU_SIZE = 512
+
+_HEADER = struct.Struct("<4sHHI")
+_COUNT = struct.Struct("<I")
+_LENGTH = struct.Struct("<H")
+_SHAPE = struct.Struct("<BBiidI")
+_KINDS = ("polygon", "polyline")
+
+S = TypeVar("S")
+
+# (flavor, digest) -> shape fields, most recently used last.
+_lru: "OrderedDict[Tuple[str, str], List[Tuple[Any, ...]]]" = OrderedDict()
+# (resolved path, mtime_ns, size) -> content digest, so unchanged files are not re-hashed.
+_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+def cache_dir() -> Optional[Path]:
+    configured = os.environ.get("IRIX_FTI_CACHE_DIR")
+    if configured is not None:
+        return Path(configured).expanduser() if configured else None
+    base = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    return Path(base) / "irix-ide" / "fti"
+
+
+# ---------------------------------------------------------------------------
+# Binary format
+# ---------------------------------------------------------------------------
+
+def pack(shapes: Sequence[Tuple[Any, ...]]) -> bytes:
+    """Encode `(kind, points, fill, stroke, stroke_width, close)` tuples."""
+    strings: Dict[str, int] = {}
+
+    def index(value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        return strings.setdefault(value, len(strings))
+
+    headers = []
+    vertices = array("d")
+    for kind, points, fill, stroke, stroke_width, close in shapes:
+        headers.append(
+            _SHAPE.pack(_KINDS.index(kind), bool(close), index(fill), index(stroke), stroke_width, len(points))
+        )
+        for x, y in points:
+            vertices.append(x)
+            vertices.append(y)
+    if sys.byteorder == "big":
+        vertices.byteswap()
+
+    parts = [_HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(shapes)), _COUNT.pack(len(strings))]
+    for value in strings:  # dicts keep insertion order, which is index order
+        encoded = value.encode("utf-8")
+        parts.append(_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    parts.extend(headers)
+    parts.append(vertices.tobytes())
+    return b"".join(parts)
+
+
+def unpack(data: bytes) -> List[Tuple[Any, ...]]:
+    """Decode `pack` output; raises `ValueError` for anything malformed or from another version."""
+    try:
+        magic, version, _, shape_count = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("not a compiled FTI file of this version")
+        offset = _HEADER.size
+        (string_count,) = _COUNT.unpack_from(data, offset)
+        offset += _COUNT.size
+        strings = []
+        for _ in range(string_count):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            strings.append(data[offset : offset + length].decode("utf-8"))
+            offset += length
+        headers = []
+        for _ in range(shape_count):
+            headers.append(_SHAPE.unpack_from(data, offset))
+            offset += _SHAPE.size
+        total = sum(header[5] for header in headers)
+        vertices = array("d")
+        vertices.frombytes(data[offset : offset + 16 * total])
+    except (struct.error, UnicodeDecodeError) as exc:
+        raise ValueError(f"corrupt compiled FTI data: {exc}") from exc
+    if len(vertices) != 2 * total or offset + 16 * total != len(data):
+        raise ValueError("corrupt compiled FTI data: wrong vertex count")
+    if sys.byteorder == "big":
+        vertices.byteswap()
+
+    shapes = []
+    start = 0
+    for kind, close, fill, stroke, stroke_width, count in headers:
+        coords = vertices[start : start + 2 * count]
+        start += 2 * count
+        shapes.append(
+            (
+                _KINDS[kind],
+                list(zip(coords[0::2], coords[1::2])),
+                strings[fill] if fill >= 0 else None,
+                strings[stroke] if stroke >= 0 else None,
+                stroke_width,
+                bool(close),
+            )
+        )
+    return shapes
+
+
+# ---------------------------------------------------------------------------
+# Lookup
+# ---------------------------------------------------------------------------
+
+def _fields(shape: Any) -> Tuple[Any, ...]:
+    return (shape.kind, list(shape.points), shape.fill, shape.stroke, shape.stroke_width, shape.close)
+
+
+def _build(shape_type: Callable[..., S], fields: List[Tuple[Any, ...]]) -> List[S]:
+    # Fresh objects (and point lists) every time: callers are free to modify what they get.
+    return [
+        shape_type(kind=kind, points=list(points), fill=fill, stroke=stroke, stroke_width=stroke_width, close=close)
+        for kind, points, fill, stroke, stroke_width, close in fields
+    ]
+
+
+def _remember(key: Tuple[str, str], fields: List[Tuple[Any, ...]]) -> None:
+    _lru[key] = fields
+    _lru.move_to_end(key)
+    while len(_lru) > LRU_SIZE:
+        _lru.popitem(last=False)
+
+
+def _read_disk(path: Path) -> Optional[List[Tuple[Any, ...]]]:
+    try:
+        return unpack(path.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_disk(path: Path, fields: List[Tuple[Any, ...]]) -> None:
+    partial = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial.write_bytes(pack(fields))
+        # Atomic, so concurrent batch workers never see a half-written entry.
+        os.replace(partial, path)
+    except (OSError, struct.error):
+        partial.unlink(missing_ok=True)
+
+
+def load(
+    path: Path,
+    flavor: str,
+    parse_text: Callable[[str], List[S]],
+    shape_type: Callable[..., S],
+) -> List[S]:
+    """The shapes `parse_text` would return for `path`, from the caches when possible."""
+    stat = path.stat()
+    stamp = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+    digest = _digests.get(stamp)
+    data: Optional[bytes] = None
+    if digest is None:
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        if len(_digests) >= 8 * LRU_SIZE:
+            _digests.clear()
+        _digests[stamp] = digest
+
+    key = (flavor, digest)
+    fields = _lru.get(key)
+    if fields is not None:
+        _lru.move_to_end(key)
+        return _build(shape_type, fields)
+
+    directory = cache_dir()
+    entry = directory / f"{flavor}-{digest}.ftic" if directory is not None else None
+    fields = _read_disk(entry) if entry is not None else None
+    if fields is None:
+        if data is None:
+            data = path.read_bytes()
+        fields = [_fields(shape) for shape in parse_text(data.decode("utf-8"))]
+        if entry is not None:
+            _write_disk(entry, fields)
+    _remember(key, fields)
+    return _build(shape_type, fields)
+
+
+def clear() -> None:
+    """Forget everything cached in this process (the disk cache is left alone)."""
+    _lru.clear()
+    _digests.clear()
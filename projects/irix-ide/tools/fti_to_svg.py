@@ -15,6 +15,11 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional, Sequence, Tuple
 
+import fti_cache
+
+# Parsed-geometry cache flavor; bump the number whenever parse_fti_text output changes.
+CACHE_FLAVOR = "svg-1"
+
 # Default coordinate system is 0..100 (IconSmith grid)
 VIEW_BOX_SIZE = 100.0
 
@@ -57,12 +62,18 @@ def resolve_colour(token: str, base_fill: str | None = None) -> str:
     return f"#{channel:02x}{channel:02x}{channel:02x}"
 
 
-def parse_fti(path: Path) -> List[Shape]:
+def parse_fti(path: Path, use_cache: bool = True) -> List[Shape]:
+    if use_cache:
+        return fti_cache.load(path, CACHE_FLAVOR, parse_fti_text, Shape)
+    return parse_fti_text(path.read_text())
+
+
+def parse_fti_text(text: str) -> List[Shape]:
     shapes: List[Shape] = []
     stack: List[Shape] = []
     current_colour = "#cfd4e5"
 
-    for raw_line in path.read_text().splitlines():
+    for raw_line in text.splitlines():
         line = raw_line.strip()
         if not line or line.startswith("#"):
             continue
@@ -14,15 +14,19 @@ appearance overrides that only affect the icon-color regions.
 from __future__ import annotations
 
 import argparse
+import io
 import json
-from collections import Counter
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Sequence, Tuple
 
 import re
 
-from PIL import Image, ImageColor, ImageDraw, ImageEnhance, ImageFilter, ImageOps
+from PIL import Image, ImageChops, ImageColor, ImageDraw, ImageEnhance, ImageFilter, ImageOps
+
+import fti_cache
 
 # Target output directory relative to repo root.
 DEFAULT_ICONSET_PATH = Path(
@@ -44,6 +48,18 @@ DEFAULT_SGI_ICON = Path("/Volumes/Irix/usr/lib/images/development.icon")
 DEFAULT_FTI_PATH = Path("/Volumes/Irix/usr/lib/filetype/iconlib/generic.exec.closed.fti")
 DEFAULT_FTR_PATH = Path("/Volumes/Irix/usr/lib/filetype/default/sgidefault.ftr")
 
+# Parsed-geometry cache flavor; bump the number whenever parse_fti_text output changes.
+FTI_CACHE_FLAVOR = "icons-1"
+
+# Vector sources are rasterized directly at each output size, supersampled by up to this
+# factor (but never beyond a MASTER_SIZE canvas) and box-filtered down.
+MASTER_SIZE = 1024
+MAX_SUPERSAMPLE = 4
+
+# Background keying for `.icon` bitmaps: "global" clears every pixel close to a background
+# colour, "flood" only the background-coloured regions connected to the image corners.
+KEYING_MODES = ("global", "flood")
+
 
 @dataclass
 class FtiShape:
@@ -145,33 +161,80 @@ def create_background(size: int) -> Image.Image:
     return base
 
 
-def load_sgi_icon(path: Path, tolerance: int = 8) -> Image.Image:
+def background_colours(icon: Image.Image, count: int = 2) -> List[Tuple[int, int, int]]:
+    """The corner colours plus the `count` most common colours of an RGB image."""
+    width, height = icon.size
+    corners = [(0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1)]
+    histogram = icon.getcolors(maxcolors=width * height) or []
+    most_common = [colour for _, colour in sorted(histogram, key=lambda item: item[0], reverse=True)[:count]]
+    colours: List[Tuple[int, int, int]] = []
+    for colour in [icon.getpixel(xy) for xy in corners] + most_common:
+        if colour not in colours:
+            colours.append(colour)
+    return colours
+
+
+def key_mask(icon: Image.Image, colours: Sequence[Tuple[int, int, int]], tolerance: int) -> Image.Image:
+    """`L` mask, 255 where every channel is within `tolerance` of one of `colours`."""
+    mask = Image.new("L", icon.size, 0)
+    for colour in colours:
+        red, green, blue = ImageChops.difference(icon, Image.new("RGB", icon.size, colour)).split()
+        distance = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+        mask = ImageChops.lighter(mask, distance.point(lambda value: 255 if value <= tolerance else 0))
+    return mask
+
+
+def _shifted(mask: Image.Image, dx: int, dy: int) -> Image.Image:
+    # Unlike ImageChops.offset this does not wrap around; uncovered pixels are 0.
+    moved = Image.new("L", mask.size, 0)
+    moved.paste(mask, (dx, dy))
+    return moved
+
+
+def flood_from_corners(mask: Image.Image) -> Image.Image:
+    """The parts of `mask` that are 4-connected to a masked corner pixel.
+
+    Seeds are grown along rows and columns with a log-step scan: at step `2**k` a seed jumps
+    `2**k` pixels when the whole run it crosses is masked. One round in all four directions
+    follows any straight run, and rounds repeat until nothing changes, so the cost grows with
+    the number of turns around the artwork rather than with its size in pixels.
+    """
+    width, height = mask.size
+    seed = Image.new("L", mask.size, 0)
+    for xy in [(0, 0), (width - 1, 0), (0, height - 1), (width - 1, height - 1)]:
+        if mask.getpixel(xy):
+            seed.putpixel(xy, 255)
+
+    scans = []
+    for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]:
+        levels = []
+        run = mask  # 255 where the `step` pixels ending here are all masked
+        step = 1
+        while step < (width if dx else height):
+            levels.append((dx * step, dy * step, run))
+            run = ImageChops.darker(run, _shifted(run, dx * step, dy * step))
+            step *= 2
+        scans.append(levels)
+
+    while True:
+        previous = seed
+        for levels in scans:
+            for dx, dy, run in levels:
+                seed = ImageChops.lighter(seed, ImageChops.darker(_shifted(seed, dx, dy), run))
+        if ImageChops.difference(previous, seed).getbbox() is None:
+            return seed
+
+
+def load_sgi_icon(path: Path, tolerance: int = 8, keying: str = "global") -> Image.Image:
     """Load an SGI `.icon` (SGI RGB) image and punch out its flat background."""
+    if keying not in KEYING_MODES:
+        raise ValueError(f"Unknown keying mode {keying!r}; expected one of {KEYING_MODES}")
     icon = Image.open(path).convert("RGBA")
-    pixels = list(icon.getdata())
-    width, height = icon.size
-
-    corners = [
-        pixels[0],
-        pixels[width - 1],
-        pixels[(height - 1) * width],
-        pixels[-1],
-    ]
-    most_common = Counter(pixels).most_common(2)
-    background_candidates = {color for color, _ in most_common[:2]} | set(corners)
-
-    cleaned = []
-    for (r, g, b, a) in pixels:
-        transparent = False
-        for cr, cg, cb, _ in background_candidates:
-            if abs(r - cr) <= tolerance and abs(g - cg) <= tolerance and abs(b - cb) <= tolerance:
-                transparent = True
-                break
-        if transparent:
-            cleaned.append((r, g, b, 0))
-        else:
-            cleaned.append((r, g, b, 255))
-    icon.putdata(cleaned)
+    rgb = icon.convert("RGB")
+    background = key_mask(rgb, background_colours(rgb), tolerance)
+    if keying == "flood":
+        background = flood_from_corners(background)
+    icon.putalpha(ImageChops.invert(background))
     return icon
 
 
@@ -222,12 +285,18 @@ def resolve_fti_colour(token: str, base_fill: str | None = None) -> str:
     return f"#{channel:02x}{channel:02x}{channel:02x}"
 
 
-def parse_fti(path: Path) -> List[FtiShape]:
+def parse_fti(path: Path, use_cache: bool = True) -> List[FtiShape]:
+    if use_cache:
+        return fti_cache.load(path, FTI_CACHE_FLAVOR, parse_fti_text, FtiShape)
+    return parse_fti_text(path.read_text())
+
+
+def parse_fti_text(text: str) -> List[FtiShape]:
     shapes: List[FtiShape] = []
     stack: List[FtiShape] = []
     current_colour = "#cfd4e5"
 
-    for raw_line in path.read_text().splitlines():
+    for raw_line in text.splitlines():
         line = raw_line.strip()
         if not line or line.startswith("#"):
             continue
@@ -278,27 +347,43 @@ def parse_fti(path: Path) -> List[FtiShape]:
     return shapes
 
 
-def render_fti_shapes(shapes: List[FtiShape], size: int, margin_ratio: float = 0.72) -> Tuple[Image.Image, Image.Image]:
+def supersample_for(size: int) -> int:
+    return max(1, min(MAX_SUPERSAMPLE, MASTER_SIZE // size))
+
+
+def render_fti_shapes(
+    shapes: List[FtiShape], size: int, margin_ratio: float = 0.72, supersample: int = 1
+) -> Tuple[Image.Image, Image.Image]:
+    """Rasterize `shapes` into a `size` px layer and its alpha mask.
+
+    With `supersample` > 1 the shapes are drawn on a canvas that many times larger and
+    box-filtered down. Stroke widths are snapped to whole output pixels (at least one), so
+    outlines stay crisp at 16px instead of fading into the fill.
+    """
     if not shapes:
         empty = Image.new("RGBA", (size, size), (0, 0, 0, 0))
         return empty, Image.new("L", (size, size), 0)
 
+    canvas = size * supersample
     xs = [x for shape in shapes for x, _ in shape.points]
     ys = [y for shape in shapes for _, y in shape.points]
     min_x, max_x = min(xs), max(xs)
     min_y, max_y = min(ys), max(ys)
     width = max(1e-4, max_x - min_x)
     height = max(1e-4, max_y - min_y)
-    scale = margin_ratio * size / max(width, height)
+    scale = margin_ratio * canvas / max(width, height)
 
     content_w = width * scale
     content_h = height * scale
-    offset_x = (size - content_w) / 2
-    offset_y = (size - content_h) / 2
+    offset_x = (canvas - content_w) / 2
+    offset_y = (canvas - content_h) / 2
 
-    layer = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+    layer = Image.new("RGBA", (canvas, canvas), (0, 0, 0, 0))
     draw = ImageDraw.Draw(layer, "RGBA")
 
+    def stroke_px(stroke_width: float) -> int:
+        return max(1, int(stroke_width * scale / supersample / 40)) * supersample
+
     for shape in shapes:
         if not shape.points:
             continue
@@ -307,20 +392,22 @@ def render_fti_shapes(shapes: List[FtiShape], size: int, margin_ratio: float = 0
         for x, y in shape.points:
             tx = offset_x + (x - min_x) * scale
             ty = offset_y + (y - min_y) * scale
-            transformed.append((tx, size - ty))
+            transformed.append((tx, canvas - ty))
 
         if shape.kind == "polygon" or shape.close:
             if shape.fill:
                 draw.polygon(transformed, fill=shape.fill)
             if shape.stroke:
                 pts = transformed + [transformed[0]] if shape.close else transformed
-                draw.line(pts, fill=shape.stroke, width=max(1, int(shape.stroke_width * scale / 40)))
+                draw.line(pts, fill=shape.stroke, width=stroke_px(shape.stroke_width))
         else:
             pts = transformed + [transformed[0]] if shape.close else transformed
             stroke = shape.stroke or "#000000"
-            width_px = max(1, int(shape.stroke_width * scale / 40))
-            draw.line(pts, fill=stroke, width=width_px)
+            draw.line(pts, fill=stroke, width=stroke_px(shape.stroke_width))
 
+    if supersample > 1:
+        # reduce() averages premultiplied colour, so edges do not pick up dark fringes.
+        layer = layer.reduce(supersample)
     mask = layer.split()[3]
     return layer, mask
 
@@ -455,7 +542,8 @@ def compose_icon(canvas: Image.Image, icon: Image.Image) -> Tuple[Image.Image, I
 def compose_layer_with_shadow(base: Image.Image, layer: Image.Image, mask: Image.Image, offset: Tuple[int, int]) -> Tuple[Image.Image, Image.Image]:
     composed = base.copy()
     if mask is not None:
-        blur_radius = max(12, base.size[0] // 70)
+        size = base.size[0]
+        blur_radius = max(12 * size // MASTER_SIZE, size // 70, 1)
         shadow_alpha = mask.filter(ImageFilter.GaussianBlur(blur_radius))
         shadow = Image.new("RGBA", base.size, (0, 0, 0, 0))
         shadow.paste((0, 0, 0, 150), mask=shadow_alpha)
@@ -464,16 +552,13 @@ def compose_layer_with_shadow(base: Image.Image, layer: Image.Image, mask: Image
     return composed, mask
 
 
-def create_master_icon(
-    size: int = 1024,
-    source_icon: Path | None = None,
+def load_shapes(
     fti_path: Path | None = None,
     ftr_path: Path | None = None,
     ftr_type: str | None = None,
     opened: bool = False,
-) -> Tuple[Image.Image, Image.Image]:
-    background = create_background(size)
-
+) -> List[FtiShape] | None:
+    """The vector shapes to render, or None when there is no usable `.ftr`/`.fti` source."""
     if ftr_path and ftr_path.exists():
         include_paths = resolve_ftr_includes(ftr_path, ftr_type=ftr_type, opened=opened)
         all_shapes: List[FtiShape] = []
@@ -482,19 +567,36 @@ def create_master_icon(
             if target.exists():
                 all_shapes.extend(parse_fti(target))
         if all_shapes:
-            layer, mask = render_fti_shapes(all_shapes, size)
-            composed, mask = compose_layer_with_shadow(background, layer, mask, (size // 90, size // 90))
-            return composed, mask
+            return all_shapes
 
     if fti_path and fti_path.exists():
-        shapes = parse_fti(fti_path)
-        layer, mask = render_fti_shapes(shapes, size)
-        composed, mask = compose_layer_with_shadow(background, layer, mask, (size // 90, size // 90))
-        return composed, mask
+        return parse_fti(fti_path)
+    return None
+
+
+def render_vector_icon(shapes: List[FtiShape], size: int, supersample: int = 1) -> Tuple[Image.Image, Image.Image]:
+    """Compose `shapes` onto the backdrop at exactly `size` px."""
+    layer, mask = render_fti_shapes(shapes, size, supersample=supersample)
+    offset = max(1, size // 90)
+    return compose_layer_with_shadow(create_background(size), layer, mask, (offset, offset))
+
+
+def create_master_icon(
+    size: int = MASTER_SIZE,
+    source_icon: Path | None = None,
+    fti_path: Path | None = None,
+    ftr_path: Path | None = None,
+    ftr_type: str | None = None,
+    opened: bool = False,
+    keying: str = "global",
+) -> Tuple[Image.Image, Image.Image]:
+    shapes = load_shapes(fti_path=fti_path, ftr_path=ftr_path, ftr_type=ftr_type, opened=opened)
+    if shapes is not None:
+        return render_vector_icon(shapes, size)
 
     if source_icon and source_icon.exists():
-        icon = load_sgi_icon(source_icon)
-        composed, mask = compose_icon(background, icon)
+        icon = load_sgi_icon(source_icon, keying=keying)
+        composed, mask = compose_icon(create_background(size), icon)
         return composed, mask
 
     raise FileNotFoundError("Provide either --fti or --source-icon for icon generation")
@@ -514,6 +616,27 @@ def apply_variant(image: Image.Image, icon_mask: Image.Image, variant: str) -> I
     return Image.alpha_composite(image, Image.composite(neutral_overlay, Image.new("RGBA", image.size, (0, 0, 0, 0)), icon_mask))
 
 
+def mip_chain(master: Image.Image, pixel_sizes: Sequence[int]) -> dict[int, Image.Image]:
+    """Resize `master` to every size in `pixel_sizes`, each from the nearest larger level.
+
+    Every step only reads the level above it, so the total work stays close to a single
+    full-size resize, rather than one full-size resize per size.
+    """
+    levels = {master.width: master}
+    current = master
+    for pixel_size in sorted(set(pixel_sizes), reverse=True):
+        if pixel_size not in levels:
+            levels[pixel_size] = current.resize((pixel_size, pixel_size), Image.Resampling.LANCZOS)
+        current = levels[pixel_size]
+    return levels
+
+
+def encode_png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
 def export_icons(
     output_dir: Path,
     source_icon: Path | None,
@@ -522,37 +645,68 @@ def export_icons(
     ftr_type: str | None,
     opened: bool,
     overwrite: bool = True,
+    keying: str = "global",
+    sizes: Sequence[int] | None = None,
 ) -> None:
-    output_dir.mkdir(parents=True, exist_ok=True)
-    master, icon_mask = create_master_icon(
-        1024,
-        source_icon=source_icon,
-        fti_path=fti_path,
-        ftr_path=ftr_path,
-        ftr_type=ftr_type,
-        opened=opened,
-    )
+    """Write the iconset PNGs (only those `sizes` in pixels, if given) and Contents.json.
 
-    variants = {
-        "regular": apply_variant(master, icon_mask, "regular"),
-        "dark": apply_variant(master, icon_mask, "dark"),
-        "tinted": apply_variant(master, icon_mask, "tinted"),
-    }
+    Vector sources are rendered directly at every output size; `.icon` bitmaps are composed
+    once at MASTER_SIZE and downscaled through a mip chain.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
 
+    # Specs with the same variant and pixel size (e.g. 32px@1x and 16px@2x) share one image
+    # and one encoded PNG.
+    outputs: dict[Tuple[str, int], List[Path]] = {}
     for spec in ICON_SPECS:
         if "Dark" in spec.filename:
-            source = variants["dark"]
+            variant = "dark"
         elif "Tinted" in spec.filename:
-            source = variants["tinted"]
+            variant = "tinted"
         else:
-            source = variants["regular"]
+            variant = "regular"
 
         pixel_size = spec.size * spec.scale
-        icon = source.resize((pixel_size, pixel_size), Image.Resampling.LANCZOS)
         filepath = output_dir / spec.filename
+        if sizes is not None and pixel_size not in sizes:
+            continue
         if not overwrite and filepath.exists():
             continue
-        icon.save(filepath, format="PNG")
+        outputs.setdefault((variant, pixel_size), []).append(filepath)
+
+    shapes = load_shapes(fti_path=fti_path, ftr_path=ftr_path, ftr_type=ftr_type, opened=opened)
+    if shapes is None:
+        master, icon_mask = create_master_icon(MASTER_SIZE, source_icon=source_icon, keying=keying)
+
+    def render_bitmap(variant: str) -> dict[Tuple[str, int], Image.Image]:
+        pixel_sizes = [pixel_size for name, pixel_size in outputs if name == variant]
+        levels = mip_chain(apply_variant(master, icon_mask, variant), pixel_sizes)
+        return {(variant, pixel_size): levels[pixel_size] for pixel_size in pixel_sizes}
+
+    def render_vector(pixel_size: int) -> dict[Tuple[str, int], Image.Image]:
+        composed, mask = render_vector_icon(shapes, pixel_size, supersample_for(pixel_size))
+        return {
+            (variant, size): apply_variant(composed, mask, variant)
+            for variant, size in outputs
+            if size == pixel_size
+        }
+
+    # Resizing and PNG encoding release the GIL, so the renders and the encodes run in
+    # parallel on threads.
+    keys = list(outputs)
+    with ThreadPoolExecutor(max_workers=min(len(keys), os.cpu_count() or 1) or 1) as pool:
+        if shapes is None:
+            rendered = pool.map(render_bitmap, sorted({variant for variant, _ in outputs}))
+        else:
+            # Largest first, so the expensive renders start before the cheap ones.
+            pixel_sizes = sorted({pixel_size for _, pixel_size in outputs}, reverse=True)
+            rendered = pool.map(render_vector, pixel_sizes)
+        images: dict[Tuple[str, int], Image.Image] = {}
+        for group in rendered:
+            images.update(group)
+        for key, data in zip(keys, pool.map(encode_png, [images[key] for key in keys])):
+            for filepath in outputs[key]:
+                filepath.write_bytes(data)
 
     write_contents_json(output_dir)
 
@@ -602,6 +756,20 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Render the opened state for icons with conditionals",
     )
+    parser.add_argument(
+        "--keying",
+        choices=KEYING_MODES,
+        default="global",
+        help="Background removal for .icon sources: every background-coloured pixel (global) "
+        "or only regions connected to the corners (flood)",
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=None,
+        help="Only export these pixel sizes (e.g. 16 32 64); other files are left as they are",
+    )
     parser.add_argument(
         "--no-overwrite",
         action="store_true",
@@ -643,6 +811,8 @@ def main() -> None:
         ftr_type=ftr_type,
         opened=args.opened,
         overwrite=not args.no_overwrite,
+        keying=args.keying,
+        sizes=args.sizes,
     )
     print(f"Generated IRIX-themed app icons in {args.iconset}")
 